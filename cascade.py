@@ -0,0 +1,171 @@
+# Standard libraries
+import logging
+
+# Third-party libraries
+import numpy as np
+
+# Project modules
+from clearing import MAX_ITERATIONS, payment_ratios, total_liabilities
+from lazyimport import lazy_import
+
+# Imported when a cascade is first set up, not with `eisenbergnoe`
+sp = lazy_import('scipy.sparse')
+
+
+class Cascade:
+    """
+    Round-by-round default cascades for batches of initial shocks on one network.
+
+    Each round every node pays min(p-bar, e + what it received last round), starting
+    from full payment: the Jacobi iteration of `clearing.iterate_clearing`, which
+    converges to the clearing vector. A node defaults in the first round it cannot pay
+    in full. A scenario shocks external equity and/or fails nodes outright (a failed
+    node pays nothing). All scenarios of a batch advance together as one sparse
+    matrix product per round.
+    """
+    def __init__(self, equity, debtor, creditor, amount, tolerance=1e-9):
+        """
+        Args:
+            equity, debtor, creditor, amount (array-like): The pre-shock state, as `Network.to_arrays`.
+            tolerance (float): A node paying less than its liabilities minus this is in default.
+        """
+        self.equity = np.asarray(equity, dtype=np.float64)
+        self.size = len(self.equity)
+        debtor = np.asarray(debtor, dtype=np.int64)
+        creditor = np.asarray(creditor, dtype=np.int64)
+        amount = np.asarray(amount, dtype=np.float64)
+        self.tolerance = tolerance
+        self.liabilities = total_liabilities(self.size, debtor, amount)
+        # owed_to[v, u]: what u owes v, so owed_to @ ratios.T is what every node receives
+        self.owed_to = sp.csr_matrix((amount, (creditor, debtor)), shape=(self.size, self.size))
+
+    @classmethod
+    def from_network(cls, network, tolerance=1e-9):
+        return cls(*network.to_arrays(), tolerance=tolerance)
+
+    def run(self, shocks=None, failed=None, max_rounds=MAX_ITERATIONS, batch_size=256, keep_payments=True):
+        """
+        Propagates a batch of scenarios until no payment changes or `max_rounds` rounds.
+
+        Args:
+            shocks (array-like): Equity lost by every node, one row per scenario (equity
+                does not fall below 0).
+            failed (array-like): Boolean mask of nodes failed outright, one row per scenario.
+            batch_size (int): Scenarios propagated together.
+            keep_payments (bool): Also return every scenario's final payments.
+
+        Returns:
+            dict: Per scenario: 'payments' (final payments, with `keep_payments`),
+            'default_round' (round in which each node defaulted, -1 if it never did;
+            failed and directly shocked nodes default in round 0), 'losses' (drop in
+            total payments in each round, zero-padded), 'cascade_size' (nodes in
+            default at the end), 'rounds' and 'converged'. A scenario whose
+            'converged' is False stopped at `max_rounds` before its cascade ended.
+        """
+        shocks, failed = self.scenarios(shocks, failed)
+        return self.run_batches(len(shocks), lambda batch: (shocks[batch], failed[batch]), max_rounds, batch_size,
+                                keep_payments)
+
+    def run_batches(self, count, scenario_rows, max_rounds, batch_size, keep_payments):
+        """
+        Propagates `count` scenarios, a batch at a time.
+
+        Args:
+            scenario_rows (callable): Maps a slice of scenarios to their (shocks, failed)
+                rows, so only one batch of them needs to exist at a time.
+
+        Returns:
+            dict: As `run`.
+        """
+        payments = np.empty((count, self.size)) if keep_payments else None
+        default_round = np.full((count, self.size), -1, dtype=np.int32)
+        rounds = np.zeros(count, dtype=np.int64)
+        converged = np.zeros(count, dtype=bool)
+        losses = []
+        for start in range(0, count, batch_size):
+            batch = slice(start, min(start + batch_size, count))
+            batch_losses = self.propagate(*scenario_rows(batch), max_rounds,
+                                          payments[batch] if keep_payments else None,
+                                          default_round[batch], rounds[batch], converged[batch])
+            losses.append(batch_losses)
+        width = max((part.shape[1] for part in losses), default=0)
+        losses = np.vstack([np.pad(part, ((0, 0), (0, width - part.shape[1]))) for part in losses]) if losses \
+            else np.zeros((0, 0))
+        logging.info(f"Propagated {count} cascade scenarios over {self.size} nodes.")
+        result = {
+            'default_round': default_round,
+            'losses': losses,
+            'cascade_size': (default_round >= 0).sum(axis=1),
+            'rounds': rounds,
+            'converged': converged,
+        }
+        if keep_payments:
+            result['payments'] = payments
+        return result
+
+    def scenarios(self, shocks, failed):
+        """Returns the shocks and failures as matching (scenarios x nodes) arrays."""
+        if shocks is None and failed is None:
+            shocks = np.zeros((1, self.size))
+        if shocks is not None:
+            shocks = np.atleast_2d(np.asarray(shocks, dtype=np.float64))
+        if failed is not None:
+            failed = np.atleast_2d(np.asarray(failed, dtype=bool))
+        count = len(shocks) if shocks is not None else len(failed)
+        shocks = np.zeros((count, self.size)) if shocks is None else shocks
+        failed = np.zeros((count, self.size), dtype=bool) if failed is None else failed
+        if shocks.shape != (count, self.size) or failed.shape != (count, self.size):
+            raise ValueError(f"Shocks and failures need one row of {self.size} nodes per scenario.")
+        return shocks, failed
+
+    def propagate(self, shocks, failed, max_rounds, payments, default_round, rounds, converged):
+        """
+        Runs one batch of scenarios, filling the output views in place (`payments` may be None).
+
+        Returns:
+            np.ndarray: The batch's losses per round.
+        """
+        equity = np.maximum(self.equity - shocks, 0.0)
+        liabilities = np.broadcast_to(self.liabilities, equity.shape)
+        current = np.where(failed, 0.0, liabilities)
+        active = np.ones(len(equity), dtype=bool) # Scenarios whose payments still change
+        losses = []
+        for round_number in range(max_rounds):
+            ratios = payment_ratios(current, liabilities)
+            received = np.asarray(self.owed_to @ ratios.T).T
+            new = np.where(failed, 0.0, np.minimum(liabilities, equity + received))
+            # Round 0 also counts the shortfall of the failed nodes against full payment
+            previous = liabilities if round_number == 0 else current
+            losses.append((previous - new).sum(axis=1))
+            newly = (new < liabilities - self.tolerance) & (default_round < 0)
+            default_round[newly] = round_number
+            change = np.abs(new - current).max(axis=1, initial=0.0)
+            rounds[active] = round_number + 1
+            active &= change > self.tolerance
+            current = new
+            if not active.any():
+                break
+        converged[:] = ~active
+        if payments is not None:
+            payments[:] = current
+        if active.any():
+            logging.warning(f"{int(active.sum())} cascade scenarios did not settle after {max_rounds} rounds.")
+        return np.column_stack(losses) if losses else np.zeros((len(equity), 0))
+
+    def single_node_failures(self, max_rounds=MAX_ITERATIONS, batch_size=256, keep_payments=False):
+        """
+        Fails every node on its own, one scenario per node, as batched rounds.
+
+        The failure masks are built one batch at a time. Without `keep_payments`, the
+        per-scenario outputs are only the default rounds, losses and sizes.
+
+        Returns:
+            dict: As `run`, scenario i being the failure of node i.
+        """
+        def scenario_rows(batch):
+            nodes = np.arange(batch.start, batch.stop)
+            failed = np.zeros((len(nodes), self.size), dtype=bool)
+            failed[np.arange(len(nodes)), nodes] = True
+            return np.zeros((len(nodes), self.size)), failed
+
+        return self.run_batches(self.size, scenario_rows, max_rounds, batch_size, keep_payments)
@@ -0,0 +1,308 @@
+# Standard libraries
+import logging
+
+# Third-party libraries
+import numpy as np
+
+# Project modules
+from lazyimport import lazy_import
+
+# Only the sparse solvers need SciPy; the iterative engines run on NumPy alone
+sp = lazy_import('scipy.sparse')
+linalg = lazy_import('scipy.sparse.linalg')
+
+# Totals (in minor units) below this keep every float64 partial sum exact
+MAX_EXACT_UNITS = 2 ** 53
+# Default sweep cap of the iterative engines. Iterating from full payment converges
+# geometrically, in 60 to 150 sweeps on generated 50-150 node networks, so the cap
+# only stops runs that are not converging at all
+MAX_ITERATIONS = 10000
+# Default sweep cap of the exact engine. Its integer payments can only fall, so it
+# always stops at the fixed point; this only bounds the run time
+EXACT_MAX_ITERATIONS = 100000
+
+
+class ClearingNotConverged(RuntimeError):
+    """Raised when an engine stops before reaching the clearing vector, instead of writing back a partial clearing."""
+
+
+def total_liabilities(size, debtor, amount):
+    """Returns the total amount each node owes (the Eisenberg-Noe p-bar vector)."""
+    return np.bincount(debtor, weights=amount, minlength=size).astype(np.float64, copy=False)
+
+
+def payment_ratios(payments, liabilities):
+    """Returns the fraction of its liabilities each node pays (1 for nodes without liabilities)."""
+    ratio = np.ones_like(liabilities)
+    np.divide(payments, liabilities, out=ratio, where=liabilities > 0)
+    return ratio
+
+
+def received_payments(ratio, debtor, creditor, amount, size):
+    """Returns what every node receives when each debtor pays `ratio` of every debt pro rata."""
+    return np.bincount(creditor, weights=amount * ratio[debtor], minlength=size)
+
+
+def iterate_clearing(equity, liabilities, received_fn, max_iterations=MAX_ITERATIONS, tolerance=1e-9, on_iteration=None):
+    """
+    Runs the Jacobi fixed-point iteration p = min(p-bar, e + received(p)) from full payment.
+
+    Args:
+        equity (np.ndarray): External equity of every node.
+        liabilities (np.ndarray): Total liabilities of every node.
+        received_fn (callable): Maps payment ratios to the amount each node receives.
+        max_iterations (int): Maximum number of sweeps.
+        tolerance (float): Convergence tolerance for payment changes.
+        on_iteration (callable): Called with the payments after every sweep.
+
+    Returns:
+        tuple: (payments, iterations, converged)
+    """
+    payments = liabilities.copy()
+    max_change = 0.0
+    for iteration in range(1, max_iterations + 1):
+        received = received_fn(payment_ratios(payments, liabilities))
+        new_payments = np.minimum(liabilities, equity + received)
+        max_change = float(np.max(np.abs(new_payments - payments))) if len(payments) else 0.0
+        payments = new_payments
+        if on_iteration is not None:
+            on_iteration(payments)
+        if max_change <= tolerance:
+            logging.info(f"Clearing vector converged after {iteration} iterations.")
+            return payments, iteration, True
+    logging.warning(f"Clearing vector did not converge after {max_iterations} iterations. Max change: {max_change}")
+    return payments, max_iterations, False
+
+
+def clearing_vector(equity, debtor, creditor, amount, max_iterations=MAX_ITERATIONS, tolerance=1e-9, on_iteration=None):
+    """
+    Computes the Eisenberg-Noe clearing vector of an in-memory edge list.
+
+    Edge k means `debtor[k]` owes `creditor[k]` the amount `amount[k]`.
+
+    Returns:
+        tuple: (payments, iterations, converged)
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    size = len(equity)
+    liabilities = total_liabilities(size, debtor, amount)
+    return iterate_clearing(
+        equity, liabilities,
+        lambda ratio: received_payments(ratio, debtor, creditor, amount, size),
+        max_iterations, tolerance, on_iteration)
+
+
+def relative_liabilities(size, debtor, creditor, amount, liabilities=None):
+    """
+    Returns the sparse matrix A with A[j, i] = share of i's liabilities owed to j.
+
+    For a payment vector p, `A @ p` is what every node receives.
+    """
+    if liabilities is None:
+        liabilities = total_liabilities(size, debtor, amount)
+    shares = amount / liabilities[debtor]
+    return sp.csr_matrix((shares, (creditor, debtor)), shape=(size, size))
+
+
+def fictitious_default(equity, debtor, creditor, amount, tolerance=1e-9):
+    """
+    Computes the clearing vector with Eisenberg & Noe's fictitious default algorithm.
+
+    Each round assumes the nodes defaulted so far pay what they can, solves the
+    resulting sparse linear system exactly and adds the nodes that can no longer
+    pay in full. It stops after at most n rounds.
+
+    Returns:
+        tuple: (payments, default_round) where default_round[i] is the round in
+        which node i defaulted, or -1 if it pays in full.
+    """
+    payments, default_round, _ = default_rounds(equity, debtor, creditor, amount, 1.0, 1.0, tolerance)
+    return payments, default_round
+
+
+def default_rounds(equity, debtor, creditor, amount, alpha=1.0, beta=1.0, tolerance=1e-9):
+    """
+    Runs the Rogers-Veraart greatest clearing vector algorithm for pro-rata debts.
+
+    A defaulted node pays `alpha` of its external equity plus `beta` of what it
+    receives. With alpha = beta = 1 this is the fictitious default algorithm.
+
+    Returns:
+        tuple: (payments, default_round, rounds)
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    size = len(equity)
+    liabilities = total_liabilities(size, debtor, amount)
+    relative = relative_liabilities(size, debtor, creditor, amount, liabilities)
+    payments = liabilities.copy()
+    default_round = np.full(size, -1, dtype=np.int64)
+    defaulted = np.zeros(size, dtype=bool)
+
+    rounds = 0
+    for round_number in range(size + 1):
+        shortfall = equity + relative @ payments < liabilities - tolerance
+        new_defaults = shortfall & ~defaulted
+        if not new_defaults.any():
+            break
+        rounds += 1
+        default_round[new_defaults] = round_number
+        defaulted |= new_defaults
+        payments = solve_defaulted_payments(equity, liabilities, relative, defaulted, alpha, beta)
+
+    logging.info(f"Default rounds finished after {rounds} rounds with {int(defaulted.sum())} defaults.")
+    return payments, default_round, rounds
+
+
+def solve_defaulted_payments(equity, liabilities, relative, defaulted, alpha=1.0, beta=1.0):
+    """Returns the payments when the `defaulted` nodes pay what they can recover and the rest pay in full."""
+    payments = liabilities.copy()
+    index = np.flatnonzero(defaulted)
+    if len(index):
+        solvent = np.flatnonzero(~defaulted)
+        a_dd = relative[index][:, index]
+        rhs = alpha * equity[index] + beta * (relative[index][:, solvent] @ liabilities[solvent])
+        system = (sp.identity(len(index), format='csc') - beta * a_dd).tocsc()
+        payments[index] = np.clip(np.atleast_1d(linalg.spsolve(system, rhs)), 0.0, liabilities[index])
+    return payments
+
+
+def edge_payments(payments, debtor, amount, liabilities, seniority=None):
+    """
+    Splits each node's total payment over its debts.
+
+    Without `seniority`, debts are paid pro rata. Otherwise `seniority[k]` is the
+    priority class of edge k (0 is most senior). Each class is paid in full before
+    the next, pro rata within a class.
+    """
+    if seniority is None:
+        return amount * payment_ratios(payments, liabilities)[debtor]
+    size = len(liabilities)
+    classes = int(seniority.max()) + 1 if len(seniority) else 1
+    key = debtor * classes + seniority
+    class_total = np.bincount(key, weights=amount, minlength=size * classes).reshape(size, classes)
+    senior_total = np.cumsum(class_total, axis=1) - class_total
+    class_paid = np.clip(payments[:, None] - senior_total, 0.0, class_total)
+    fraction = np.ones_like(class_total)
+    np.divide(class_paid, class_total, out=fraction, where=class_total > 0)
+    return amount * fraction.ravel()[key]
+
+
+def greatest_clearing_vector(equity, debtor, creditor, amount, alpha=1.0, beta=1.0, seniority=None,
+                             max_iterations=MAX_ITERATIONS, tolerance=1e-9):
+    """
+    Computes the greatest clearing vector with default costs and seniority classes.
+
+    A node that cannot pay in full pays `alpha` of its external equity plus `beta`
+    of what it receives (Rogers & Veraart, 2013). The rest is lost to default costs.
+    Pro-rata networks use the exact round-based algorithm. With `seniority`, the
+    monotone iteration descends from full payment, allocating every payment by
+    priority class in one vectorized pass per sweep.
+
+    Returns:
+        tuple: (payments, iterations, converged)
+    """
+    if not (0 < alpha <= 1 and 0 < beta <= 1):
+        raise ValueError(f"Recovery rates must lie in (0, 1], got alpha={alpha}, beta={beta}")
+    equity = np.asarray(equity, dtype=np.float64)
+    size = len(equity)
+    if seniority is None:
+        payments, _, rounds = default_rounds(equity, debtor, creditor, amount, alpha, beta, tolerance)
+        return payments, rounds, True
+
+    seniority = np.asarray(seniority, dtype=np.int64)
+    if len(seniority) != len(debtor) or (len(seniority) and seniority.min() < 0):
+        raise ValueError("Seniority must give a non-negative class for every edge.")
+    liabilities = total_liabilities(size, debtor, amount)
+    payments = liabilities.copy()
+    max_change = 0.0
+    for iteration in range(1, max_iterations + 1):
+        received = np.bincount(creditor, weights=edge_payments(payments, debtor, amount, liabilities, seniority),
+                               minlength=size)
+        solvent = equity + received >= liabilities - tolerance
+        new_payments = np.where(solvent, liabilities,
+                                np.minimum(liabilities, alpha * equity + beta * received))
+        max_change = float(np.max(np.abs(new_payments - payments))) if size else 0.0
+        payments = new_payments
+        if max_change <= tolerance:
+            logging.info(f"Greatest clearing vector converged after {iteration} iterations.")
+            return payments, iteration, True
+    logging.warning(f"Greatest clearing vector did not converge after {max_iterations} iterations. Max change: {max_change}")
+    return payments, max_iterations, False
+
+
+def to_minor_units(values, unit=1e-6):
+    """Converts currency amounts to integer multiples of `unit`."""
+    return np.rint(np.asarray(values, dtype=np.float64) / unit).astype(np.int64)
+
+
+def exact_edge_payments(payments, liabilities, debtor, amount):
+    """
+    Splits integer payments over integer debts pro rata, rounding every share down.
+
+    Every share is floor(amount * payment / liabilities) computed exactly, so shares
+    never rise when payments fall. Each share depends only on its own edge, so the
+    result does not depend on node or edge order. Any remainder of less than one unit
+    per debt stays with the debtor.
+    """
+    owed = liabilities[debtor]
+    paying = payments[debtor]
+    shares = amount.copy()
+    partial = np.flatnonzero(paying < owed)
+    if len(partial):
+        amount, paying, owed = amount[partial], paying[partial], owed[partial]
+        # Estimate in floating point, then correct it with the exact remainder
+        # amount * paying - share * owed. The products wrap around in int64, but the
+        # remainder itself is within a few units of [0, owed), so it comes out exact
+        share = np.floor(amount * (paying / owed)).astype(np.int64)
+        remainder = amount * paying - share * owed
+        while True:
+            low, high = remainder < 0, remainder >= owed
+            if not (low.any() or high.any()):
+                break
+            step = high.astype(np.int64) - low
+            share += step
+            remainder -= step * owed
+        shares[partial] = share
+    return shares
+
+
+def exact_clearing_vector(equity, debtor, creditor, amount, unit=1e-6, max_iterations=EXACT_MAX_ITERATIONS):
+    """
+    Computes the clearing vector by Jacobi sweeps in integer minor units.
+
+    Every sweep uses only the previous sweep's payments, and all sums are exact
+    integers, so the result is reproducible bit for bit in any order or partition.
+    The payments start at p-bar and never increase, and every sweep that is not the
+    last lowers at least one of them by a whole unit. The sweeps therefore stop
+    exactly at a fixed point rather than at a float tolerance. The only general bound
+    is the total of p-bar in minor units (10^11 sweeps for 100,000 of debt at
+    unit=1e-6), far too loose to be useful. In practice the payments fall
+    geometrically and it takes about as many sweeps as the float iteration.
+
+    Args:
+        unit (float): Size of one minor unit (1e-6 matches the loop engine's rounding).
+        max_iterations (int): Cap on the number of sweeps; `converged` is False if it
+            is reached.
+
+    Returns:
+        tuple: (payments, paid, iterations, converged) with node payments and
+        per-edge payments as int64 minor units.
+    """
+    equity = to_minor_units(equity, unit)
+    amount = to_minor_units(amount, unit)
+    size = len(equity)
+    if int(equity.sum()) + int(amount.sum()) >= MAX_EXACT_UNITS:
+        raise ValueError(f"Network too large for exact accumulation at unit={unit}; use a larger unit.")
+    liabilities = np.bincount(debtor, weights=amount, minlength=size).astype(np.int64)
+
+    payments = liabilities.copy()
+    for iteration in range(1, max_iterations + 1):
+        paid = exact_edge_payments(payments, liabilities, debtor, amount)
+        received = np.bincount(creditor, weights=paid, minlength=size).astype(np.int64)
+        new_payments = np.minimum(liabilities, equity + received)
+        if np.array_equal(new_payments, payments):
+            logging.info(f"Exact clearing vector reached after {iteration} iterations.")
+            return payments, paid, iteration, True
+        payments = new_payments
+    logging.warning(f"Exact clearing vector not reached after {max_iterations} iterations.")
+    return payments, exact_edge_payments(payments, liabilities, debtor, amount), max_iterations, False
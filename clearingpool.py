@@ -0,0 +1,116 @@
+# Standard libraries
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Third-party libraries
+import numpy as np
+
+# Project modules
+from clearing import MAX_ITERATIONS, clearing_vector, greatest_clearing_vector
+from sharedarrays import SharedArrays
+
+# Shared arrays a pool worker attached to when it started
+_worker_arrays = None
+
+
+def attach_worker(specs):
+    """Pool initializer: attaches the worker to the shared network once, for all its tasks."""
+    global _worker_arrays
+    _worker_arrays = SharedArrays.attach(specs)
+
+
+def clear_scenarios(start, stop, engine, max_iterations, tolerance, alpha, beta):
+    """
+    Clears scenarios `start` to `stop` of the shared batch in a pool worker.
+
+    The network is read in place from shared memory; only the clearing vectors are returned.
+
+    Returns:
+        tuple: (payments, iterations, converged), one row or entry per scenario.
+    """
+    debtor, creditor, amount = _worker_arrays['debtor'], _worker_arrays['creditor'], _worker_arrays['amount']
+    scenarios = _worker_arrays['scenarios']
+    payments = np.empty((stop - start, scenarios.shape[1]))
+    iterations = np.empty(stop - start, dtype=np.int64)
+    converged = np.empty(stop - start, dtype=bool)
+    for row, scenario in enumerate(range(start, stop)):
+        if engine == 'greatest':
+            result = greatest_clearing_vector(scenarios[scenario], debtor, creditor, amount, alpha, beta,
+                                              max_iterations=max_iterations, tolerance=tolerance)
+        else:
+            result = clearing_vector(scenarios[scenario], debtor, creditor, amount, max_iterations, tolerance)
+        payments[row], iterations[row], converged[row] = result
+    return payments, iterations, converged
+
+
+class ClearingPool:
+    """
+    Worker pool that clears batches of equity scenarios on one network held in shared memory.
+
+    The edge arrays and the scenario matrix are copied once into shared memory. Each
+    worker attaches to them by name when it starts. A task then carries only a
+    scenario range and the solver options, so dispatch cost does not grow with the
+    network, and only clearing vectors come back.
+    """
+    def __init__(self, debtor, creditor, amount, scenarios, workers=None):
+        """
+        Args:
+            debtor, creditor, amount (array-like): Edge k means `debtor[k]` owes `creditor[k]` `amount[k]`.
+            scenarios (array-like): External equities, one row per scenario (a single row is allowed).
+            workers (int): Worker processes (the CPU count if None).
+        """
+        scenarios = np.atleast_2d(np.asarray(scenarios, dtype=np.float64))
+        self.shared = SharedArrays.create({
+            'debtor': np.asarray(debtor, dtype=np.int64),
+            'creditor': np.asarray(creditor, dtype=np.int64),
+            'amount': np.asarray(amount, dtype=np.float64),
+            'scenarios': scenarios,
+        })
+        self.scenario_count = scenarios.shape[0]
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.executor = ProcessPoolExecutor(self.workers, initializer=attach_worker, initargs=(self.shared.specs(),))
+
+    @classmethod
+    def from_network(cls, network, scenarios=None, workers=None):
+        """Shares a `Network`'s current debts; the scenarios default to its current equities."""
+        equity, debtor, creditor, amount = network.to_arrays()
+        return cls(debtor, creditor, amount, equity if scenarios is None else scenarios, workers)
+
+    def clear(self, engine='vectorized', max_iterations=MAX_ITERATIONS, tolerance=1e-9, alpha=1.0, beta=1.0, batch_size=None):
+        """
+        Clears every scenario.
+
+        Args:
+            engine (str): 'vectorized' (Eisenberg-Noe) or 'greatest' (with `alpha`/`beta` default costs).
+            batch_size (int): Scenarios per task; by default they are spread evenly over the workers.
+
+        Returns:
+            tuple: (payments, iterations, converged), payments having one row per scenario.
+            Rows whose `converged` entry is False are not clearing vectors.
+        """
+        if engine not in ('vectorized', 'greatest'):
+            raise ValueError(f"Unknown clearing pool engine: {engine}")
+        if batch_size is None:
+            batch_size = max(1, -(-self.scenario_count // self.workers))
+        starts = range(0, self.scenario_count, batch_size)
+        futures = [self.executor.submit(clear_scenarios, start, min(start + batch_size, self.scenario_count),
+                                        engine, max_iterations, tolerance, alpha, beta) for start in starts]
+        results = [future.result() for future in futures]
+        logging.info(f"Cleared {self.scenario_count} scenarios in {len(futures)} tasks.")
+        payments, iterations, converged = (np.concatenate(parts) for parts in zip(*results))
+        if not converged.all():
+            logging.warning(f"{int((~converged).sum())} of {self.scenario_count} scenarios did not converge "
+                            f"after {max_iterations} iterations.")
+        return payments, iterations, converged
+
+    def close(self):
+        """Stops the workers and frees the shared memory."""
+        self.executor.shutdown(wait=True)
+        self.shared.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
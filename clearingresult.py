@@ -0,0 +1,74 @@
+# Third-party libraries
+import numpy as np
+
+# Project modules
+from lazyimport import lazy_import
+
+# The payment matrix is built on request only
+sp = lazy_import('scipy.sparse')
+
+
+def format_equity_changes(initial_equity, final_equity, limit=None):
+    """Returns a per-node table of initial, final and changed equity (first `limit` nodes)."""
+    count = len(final_equity) if limit is None else min(limit, len(final_equity))
+    lines = ["--- Equity Changes Post Eisenberg-Noe ---"]
+    for i in range(count):
+        lines.append(f'Node {i}: Initial Equity={initial_equity[i]:.2f}, '
+                     f'Final Equity={final_equity[i]:.2f}, Change={final_equity[i] - initial_equity[i]:+.2f}')
+    if count < len(final_equity):
+        lines.append(f"... {len(final_equity) - count} more nodes")
+    lines.append("----------------------------------------")
+    return "\n".join(lines)
+
+
+class ClearingResult:
+    """Outcome of one Eisenberg-Noe run, held as NumPy arrays."""
+    def __init__(self, initial_equity, final_equity, defaulted, payments, iterations, converged,
+                 tolerance=1e-9):
+        self.initial_equity = initial_equity
+        self.final_equity = final_equity
+        self.change = final_equity - initial_equity
+        self.defaulted = defaulted # Boolean mask of nodes that end in default
+        self.payments = payments # Sparse (debtor x creditor) matrix of amounts paid
+        self.iterations = iterations
+        self.converged = converged
+        self.worse_off = self.change < -tolerance # Boolean mask of nodes that lost equity
+        self.pareto_improvement = not self.worse_off.any()
+
+    @classmethod
+    def from_network(cls, network, initial_equity, initial_state, paid, iterations, converged, tolerance=1e-9):
+        """Builds the result from a cleared network, its pre-clearing arrays and the amount paid per edge."""
+        _, debtor, creditor, _ = initial_state
+        size = len(network.nodes)
+        final_equity = np.fromiter((node.equity for node in network.nodes), dtype=np.float64, count=size)
+        defaulted = np.fromiter((node.defaulted for node in network.nodes), dtype=bool, count=size)
+        payments = sp.csr_matrix((paid, (debtor, creditor)), shape=(size, size))
+        payments.eliminate_zeros()
+        return cls(initial_equity, final_equity, defaulted, payments, iterations, converged, tolerance)
+
+    def summary(self):
+        """Returns network-level totals of the result."""
+        return {
+            'nodes': len(self.final_equity),
+            'defaulted': int(self.defaulted.sum()),
+            'survived': int((~self.defaulted).sum()),
+            'worse_off': int(self.worse_off.sum()),
+            'total_initial_equity': float(self.initial_equity.sum()),
+            'total_final_equity': float(self.final_equity.sum()),
+            'total_change': float(self.change.sum()),
+            'total_paid': float(self.payments.sum()),
+            'pareto_improvement': self.pareto_improvement,
+            'iterations': self.iterations,
+            'converged': self.converged,
+        }
+
+    def format_changes(self, limit=None):
+        """Returns a per-node table of initial, final and changed equity (first `limit` nodes)."""
+        return format_equity_changes(self.initial_equity, self.final_equity, limit)
+
+    def __str__(self):
+        summary = self.summary()
+        return (f"ClearingResult: {summary['nodes']} nodes, {summary['defaulted']} defaulted, "
+                f"equity change {summary['total_change']:+.2f}, "
+                f"Pareto improvement {'Yes' if summary['pareto_improvement'] else 'No'}, "
+                f"{summary['iterations']} iterations ({'converged' if summary['converged'] else 'not converged'})")
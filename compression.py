@@ -3,16 +3,22 @@ import logging
 import copy
 
 # Project modules
-# from network import Network # Not strictly needed
+import kernels
 
 class Compression:
     """Applies bilateral debt netting/compression to the network."""
+    # Bump whenever a change alters compression results, so cached outcomes are recomputed
+    VERSION = 1
+
     def __init__(self, network):
         self.network = network
 
     def apply(self):
         """Simplifies mutual debts for all pairs of nodes in the network."""
         logging.info("Applying debt compression/netting...")
+        if kernels.USE_KERNELS:
+            self.apply_kernel()
+            return
         nodes = self.network.nodes
         processed_pairs = set() # Track processed pairs
 
@@ -47,17 +53,32 @@ class Compression:
             # Update Node A's debts
             if new_a_owes_b <= 1e-9:
                 if node_b.id in node_a.debts: del node_a.debts[node_b.id]
-                if self.network.graph.has_edge(node_a.id, node_b.id):
-                    self.network.graph.remove_edge(node_a.id, node_b.id)
-                    logging.debug(f"Removed edge {node_a.id}->{node_b.id}")
+                self.network.remove_debt_edge(node_a.id, node_b.id)
+                logging.debug(f"Removed edge {node_a.id}->{node_b.id}")
             else:
                 node_a.debts[node_b.id] = new_a_owes_b
 
             # Update Node B's debts
             if new_b_owes_a <= 1e-9:
                 if node_a.id in node_b.debts: del node_b.debts[node_a.id]
-                if self.network.graph.has_edge(node_b.id, node_a.id):
-                    self.network.graph.remove_edge(node_b.id, node_a.id)
-                    logging.debug(f"Removed edge {node_b.id}->{node_a.id}")
+                self.network.remove_debt_edge(node_b.id, node_a.id)
+                logging.debug(f"Removed edge {node_b.id}->{node_a.id}")
+            else:
+                node_b.debts[node_a.id] = new_b_owes_a
+
+    def apply_kernel(self):
+        """Nets all mutual debts in a compiled kernel over CSR arrays and writes the result back."""
+        _, debtor, creditor, amount = self.network.to_arrays()
+        debt = amount.copy()
+        netted = kernels.bilateral_netting(kernels.csr_indptr(debtor, len(self.network.nodes)), creditor, debt)
+        for k in (debt != amount).nonzero()[0].tolist():
+            node = self.network.nodes[debtor[k]]
+            creditor_id = int(creditor[k])
+            if debt[k] == 0.0:
+                del node.debts[creditor_id]
+                self.network.remove_debt_edge(node.id, creditor_id)
             else:
-                node_b.debts[node_a.id] = new_b_owes_a
\ No newline at end of file
+                node.debts[creditor_id] = float(debt[k])
+        for node in self.network.nodes:
+            node.update_color()
+        logging.info(f"Compression finished; {netted} mutual debt pairs netted.")
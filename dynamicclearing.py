@@ -0,0 +1,188 @@
+# Standard libraries
+import itertools
+import logging
+
+# Third-party libraries
+import numpy as np
+
+# Project modules
+from clearing import default_rounds, total_liabilities
+from lazyimport import lazy_import
+
+# SciPy is loaded on the first period's solve, not when the module is imported
+sp = lazy_import('scipy.sparse')
+linalg = lazy_import('scipy.sparse.linalg')
+
+
+class DynamicClearing:
+    """
+    Multi-period Eisenberg-Noe clearing on a fixed set of counterparty edges.
+
+    Each period, new obligations arrive on the edges and each node's external equity
+    changes by its income. The period's debts are cleared. Unpaid debts of defaulted
+    nodes are written off, as `EisenbergNoe` does. The post-clearing equity carries
+    forward to the next period.
+
+    The solver state is kept between periods. This covers the CSR layout of the
+    relative-liability matrix, the previous default set, the previous clearing vector
+    and the last LU factorisation of I - A_DD. Each period starts from the previous
+    default set. Its linear systems are solved iteratively from the previous payments,
+    or with the kept factorisation while the default set and relative liabilities
+    stay unchanged.
+    """
+    def __init__(self, equity, debtor, creditor, tolerance=1e-9):
+        """
+        Args:
+            equity (array-like): Initial external equity of every node.
+            debtor, creditor (array-like): Edge k lets `debtor[k]` owe `creditor[k]`.
+            tolerance (float): Tolerance of the default test.
+        """
+        self.equity = np.array(equity, dtype=np.float64)
+        self.size = len(self.equity)
+        self.debtor = np.asarray(debtor, dtype=np.int64)
+        self.creditor = np.asarray(creditor, dtype=np.int64)
+        self.tolerance = tolerance
+        self.period = 0
+        self.payments = None # Clearing vector of the last period
+        self.defaulted = np.zeros(self.size, dtype=bool) # Default set of the last period
+        self.stats = {'warm_starts': 0, 'cold_starts': 0, 'iterative_solves': 0,
+                      'factorisations': 0, 'factor_reuses': 0}
+
+        # CSR layout of A (A[j, i] = share of i's liabilities owed to j), built once
+        self._order = np.lexsort((self.debtor, self.creditor))
+        self._indices = self.debtor[self._order]
+        self._indptr = np.zeros(self.size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.creditor, minlength=self.size), out=self._indptr[1:])
+        self._factor = None
+        self._factor_set = None
+        self._factor_shares = None
+
+    @classmethod
+    def from_network(cls, network, tolerance=1e-9):
+        """Starts from a `Network`'s current equities, on the edges it currently has."""
+        equity, debtor, creditor, _ = network.to_arrays()
+        return cls(equity, debtor, creditor, tolerance)
+
+    def relative_liabilities(self, amount, liabilities):
+        """Returns the period's A matrix on the precomputed CSR layout, and its share per edge."""
+        shares = np.zeros(len(amount))
+        np.divide(amount, liabilities[self.debtor], out=shares, where=liabilities[self.debtor] > 0)
+        relative = sp.csr_matrix((shares[self._order], self._indices, self._indptr), shape=(self.size, self.size))
+        return relative, shares
+
+    def solve(self, liabilities, relative, shares, defaulted):
+        """
+        Returns the payments when the `defaulted` nodes pay what they can and the rest pay in full.
+
+        The kept factorisation is reused when the default set and the relative
+        liabilities are unchanged. Otherwise BiCGSTAB runs from the previous period's
+        payments, and the system is factorised only if that does not converge.
+        """
+        payments = liabilities.copy()
+        index = np.flatnonzero(defaulted)
+        if not len(index):
+            return payments
+        solvent = np.flatnonzero(~defaulted)
+        rows = relative[index]
+        rhs = self.equity[index] + rows[:, solvent] @ liabilities[solvent]
+
+        if (self._factor is not None and np.array_equal(self._factor_set, defaulted)
+                and np.array_equal(self._factor_shares, shares)):
+            self.stats['factor_reuses'] += 1
+            solution = self._factor.solve(rhs)
+        else:
+            system = (sp.identity(len(index), format='csr') - rows[:, index]).tocsr()
+            guess = None if self.payments is None else np.minimum(self.payments[index], liabilities[index])
+            solution, info = linalg.bicgstab(system, rhs, x0=guess, rtol=1e-12, atol=0.0)
+            if info == 0:
+                self.stats['iterative_solves'] += 1
+            else:
+                self._factor = linalg.splu(system.tocsc())
+                self._factor_set = defaulted.copy()
+                self._factor_shares = shares.copy()
+                self.stats['factorisations'] += 1
+                solution = self._factor.solve(rhs)
+        payments[index] = np.clip(solution, 0.0, liabilities[index])
+        return payments
+
+    def clearing_vector(self, amount, liabilities):
+        """
+        Returns the period's clearing vector, starting from the previous default set.
+
+        The default set is updated until it reproduces itself, which makes the payments
+        a clearing vector. If that does not settle within a few rounds, or the system
+        is singular, the cold fictitious default algorithm runs instead.
+        """
+        relative, shares = self.relative_liabilities(amount, liabilities)
+        defaulted = self.defaulted & (liabilities > 0)
+        for _ in range(min(self.size, 50) + 1):
+            try:
+                payments = self.solve(liabilities, relative, shares, defaulted)
+            except RuntimeError: # Singular I - A_DD: a closed cycle of defaulted nodes
+                break
+            shortfall = self.equity + relative @ payments < liabilities - self.tolerance
+            if np.array_equal(shortfall, defaulted):
+                self.stats['warm_starts'] += 1
+                return payments, defaulted
+            defaulted = shortfall
+
+        self.stats['cold_starts'] += 1
+        due = amount > 0
+        payments, default_round, _ = default_rounds(self.equity, self.debtor[due], self.creditor[due], amount[due],
+                                                    tolerance=self.tolerance)
+        self._factor = None
+        return payments, default_round >= 0
+
+    def step(self, amount, income=None):
+        """
+        Clears one period.
+
+        Args:
+            amount (array-like): Obligation due on every edge this period.
+            income (array-like): Change of every node's external equity before clearing
+                (negative for shocks); equity is floored at 0.
+
+        Returns:
+            dict: The period's 'payments', 'defaulted' mask, post-clearing 'equity' and 'paid' per edge.
+        """
+        amount = np.asarray(amount, dtype=np.float64)
+        if income is not None:
+            self.equity = np.maximum(self.equity + income, 0.0)
+        liabilities = total_liabilities(self.size, self.debtor, amount)
+        payments, defaulted = self.clearing_vector(amount, liabilities)
+
+        ratio = np.ones(self.size)
+        np.divide(payments, liabilities, out=ratio, where=liabilities > 0)
+        paid = amount * ratio[self.debtor]
+        received = np.bincount(self.creditor, weights=paid, minlength=self.size)
+        self.equity = np.maximum(self.equity + received - payments, 0.0)
+        self.equity[defaulted] = 0.0 # Defaulted nodes hand over everything they have
+
+        self.period += 1
+        self.payments = payments
+        self.defaulted = defaulted
+        return {'payments': payments, 'defaulted': defaulted, 'equity': self.equity.copy(), 'paid': paid}
+
+    def run(self, obligations, incomes=None):
+        """
+        Clears a sequence of periods.
+
+        Args:
+            obligations (iterable): One array of per-edge obligations per period.
+            incomes (iterable): One array of equity changes per period, or None.
+
+        Returns:
+            dict: Per-period arrays 'defaults' (number of defaulted nodes), 'total_equity'
+            and 'total_paid'. The last period's state stays on the instance.
+        """
+        incomes = incomes if incomes is not None else itertools.repeat(None)
+        defaults, total_equity, total_paid = [], [], []
+        for amount, income in zip(obligations, incomes):
+            outcome = self.step(amount, income)
+            defaults.append(int(outcome['defaulted'].sum()))
+            total_equity.append(float(outcome['equity'].sum()))
+            total_paid.append(float(outcome['paid'].sum()))
+        logging.info(f"Cleared {len(defaults)} periods: {self.stats}")
+        return {'defaults': np.array(defaults, dtype=np.int64),
+                'total_equity': np.array(total_equity),
+                'total_paid': np.array(total_paid)}
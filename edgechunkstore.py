@@ -0,0 +1,124 @@
+# Standard libraries
+import json
+import logging
+import os
+
+# Third-party libraries
+import numpy as np
+
+# Project modules
+from clearing import MAX_ITERATIONS, iterate_clearing
+
+MANIFEST_NAME = 'manifest.json'
+SPILL_DTYPE = np.dtype([('debtor', '<i8'), ('creditor', '<i8'), ('amount', '<f8')])
+
+
+class EdgeChunkStore:
+    """
+    Liabilities stored on disk as memory-mapped chunk files sorted by creditor.
+
+    Chunk k holds every edge whose creditor lies in [lo_k, hi_k), so a sweep only
+    needs the O(n) node vectors in memory while chunks are streamed one at a time.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        self.size = manifest['size']
+        self.edge_count = manifest['edge_count']
+        self.chunk_bounds = [(chunk['lo'], chunk['hi']) for chunk in manifest['chunks']]
+
+    @classmethod
+    def create(cls, directory, size, batches, chunk_edges=1_000_000):
+        """
+        Writes a store from edge batches without holding all edges in memory.
+
+        Args:
+            directory (str): Target directory (created if missing).
+            size (int): Number of nodes.
+            batches: Re-iterable of (debtor, creditor, amount) array triples; it is read twice.
+            chunk_edges (int): Target number of edges per chunk.
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        # Pass 1: per-creditor edge counts and per-debtor liabilities (both O(n))
+        in_degree = np.zeros(size, dtype=np.int64)
+        liabilities = np.zeros(size, dtype=np.float64)
+        for debtor, creditor, amount in batches:
+            in_degree += np.bincount(creditor, minlength=size)
+            liabilities += np.bincount(debtor, weights=amount, minlength=size)
+
+        # Cut the creditor range so each chunk holds about `chunk_edges` edges
+        chunk_of_creditor = (np.cumsum(in_degree) - in_degree) // max(1, chunk_edges)
+        lows = np.flatnonzero(np.diff(chunk_of_creditor, prepend=-1)) if size else np.array([], dtype=np.int64)
+        highs = np.append(lows[1:], size)
+
+        # Pass 2: append each edge to its chunk's spill file
+        spill_paths = [os.path.join(directory, f"chunk_{k:05d}.spill") for k in range(len(lows))]
+        for path in spill_paths:
+            open(path, 'wb').close()
+        for debtor, creditor, amount in batches:
+            records = np.empty(len(creditor), dtype=SPILL_DTYPE)
+            records['debtor'] = debtor
+            records['creditor'] = creditor
+            records['amount'] = amount
+            chunk_ids = np.searchsorted(lows, records['creditor'], side='right') - 1
+            order = np.argsort(chunk_ids, kind='stable')
+            records, chunk_ids = records[order], chunk_ids[order]
+            starts = np.searchsorted(chunk_ids, np.arange(len(lows)), side='left')
+            ends = np.searchsorted(chunk_ids, np.arange(len(lows)), side='right')
+            for k in np.flatnonzero(ends > starts):
+                with open(spill_paths[k], 'ab') as f:
+                    records[starts[k]:ends[k]].tofile(f)
+
+        # Sort each chunk by creditor and store its columns as separate .npy files
+        chunks = []
+        for k, (lo, hi) in enumerate(zip(lows.tolist(), highs.tolist())):
+            records = np.fromfile(spill_paths[k], dtype=SPILL_DTYPE)
+            records = records[np.argsort(records['creditor'], kind='stable')]
+            for column in SPILL_DTYPE.names:
+                np.save(os.path.join(directory, f"chunk_{k:05d}_{column}.npy"), records[column])
+            os.remove(spill_paths[k])
+            chunks.append({'lo': lo, 'hi': hi, 'edges': len(records)})
+
+        np.save(os.path.join(directory, 'liabilities.npy'), liabilities)
+        with open(os.path.join(directory, MANIFEST_NAME), 'w') as f:
+            json.dump({'size': size, 'edge_count': int(in_degree.sum()), 'chunks': chunks}, f)
+        logging.info(f"Wrote edge chunk store with {len(chunks)} chunks to {directory}")
+        return cls(directory)
+
+    @classmethod
+    def from_network(cls, network, directory, chunk_edges=1_000_000):
+        """Writes a store holding the current debts of `network`."""
+        _, debtor, creditor, amount = network.to_arrays()
+        return cls.create(directory, len(network.nodes), [(debtor, creditor, amount)], chunk_edges)
+
+    def liabilities(self):
+        """Returns the total liabilities of every node."""
+        return np.load(os.path.join(self.directory, 'liabilities.npy'))
+
+    def chunks(self):
+        """Yields (lo, hi, debtor, creditor, amount) for every chunk, memory-mapped read-only."""
+        for k, (lo, hi) in enumerate(self.chunk_bounds):
+            columns = [np.load(os.path.join(self.directory, f"chunk_{k:05d}_{column}.npy"), mmap_mode='r')
+                       for column in SPILL_DTYPE.names]
+            yield (lo, hi, *columns)
+
+    def received_payments(self, ratio):
+        """Streams every chunk once and returns what each node receives at payment `ratio`."""
+        received = np.zeros(self.size, dtype=np.float64)
+        for lo, hi, debtor, creditor, amount in self.chunks():
+            if len(creditor):
+                received[lo:hi] = np.bincount(creditor - lo, weights=amount * ratio[debtor], minlength=hi - lo)
+        return received
+
+    def clearing_vector(self, equity, max_iterations=MAX_ITERATIONS, tolerance=1e-9):
+        """
+        Computes the Eisenberg-Noe clearing vector, streaming the chunks once per sweep.
+
+        Returns:
+            tuple: (payments, iterations, converged)
+        """
+        equity = np.asarray(equity, dtype=np.float64)
+        return iterate_clearing(equity, self.liabilities(), self.received_payments,
+                                max_iterations, tolerance)
@@ -1,35 +1,210 @@
 # Standard libraries
 import logging
+import contextlib
 import copy
+import tempfile
+
+# Third-party libraries
+import numpy as np
 
 # Project modules
 from network import Network
+from clearing import (EXACT_MAX_ITERATIONS, MAX_ITERATIONS, ClearingNotConverged, clearing_vector, edge_payments,
+                      exact_clearing_vector, greatest_clearing_vector, to_minor_units, total_liabilities)
+from edgechunkstore import EdgeChunkStore
+from partitionedclearing import PartitionedClearing
+from systemicrisk import systemic_risk_metrics
+from clearingresult import ClearingResult, format_equity_changes
+from paymentrecord import IterationDeltas, PaymentRecord
+import kernels
 
 class EisenbergNoe:
     """Implements the Eisenberg & Noe (2001) clearing algorithm."""
-    def __init__(self, network):
+    # Bump whenever a change alters clearing results, so cached outcomes are recomputed
+    VERSION = 3
+    # Sweep cap of each engine when `apply` is not given one; the loop engine's
+    # Gauss-Seidel sweeps converge much faster than the Jacobi iteration
+    MAX_ITERATIONS = {
+        'loop': 100,
+        'vectorized': MAX_ITERATIONS,
+        'out_of_core': MAX_ITERATIONS,
+        'distributed': MAX_ITERATIONS,
+        'greatest': MAX_ITERATIONS,
+        'exact': EXACT_MAX_ITERATIONS,
+    }
+
+    def __init__(self, network, alpha=1.0, beta=1.0, seniority=None):
+        """
+        Args:
+            network (Network): The network to clear.
+            alpha (float): Fraction of external equity a defaulted node can pay (Rogers-Veraart).
+            beta (float): Fraction of received payments a defaulted node can pay on.
+            seniority (dict): {(debtor_id, creditor_id): priority class}, 0 being most
+                senior; debts not listed are class 0.
+        """
         if not isinstance(network, Network):
             raise TypeError("EisenbergNoe requires a Network object.")
         self.network = network
+        self.alpha = alpha
+        self.beta = beta
+        self.seniority = seniority
         # Store initial equities for Pareto check and change calculation
-        self.initial_equities = {node.id: node.equity for node in network.nodes}
+        self.initial_equity = np.fromiter((node.equity for node in network.nodes), dtype=np.float64,
+                                          count=len(network.nodes))
+        # Pre-clearing (equity, debtor, creditor, amount) arrays, captured by apply()
+        self.initial_state = None
+        self.result = None
+        self.record = None # PaymentRecord of the last run, when recording
+        self.iteration_deltas = None # IterationDeltas of the run in progress, when tracked
+
+    @property
+    def initial_equities(self):
+        """Gets the pre-clearing equities as a {node_id: equity} dict."""
+        return {node.id: equity for node, equity in zip(self.network.nodes, self.initial_equity.tolist())}
+
+    def current_equity(self):
+        """Returns the current equity of every node as an array."""
+        return np.fromiter((node.equity for node in self.network.nodes), dtype=np.float64,
+                           count=len(self.network.nodes))
 
-    def apply(self, max_iterations=100, tolerance=1e-9):
+    def apply(self, max_iterations=None, tolerance=1e-9, engine=None, chunk_dir=None, chunk_edges=1_000_000,
+              unit=1e-6, workers=2, record=False, record_iterations=False):
         """
         Applies the Eisenberg Noe model iteratively until convergence or max iterations.
 
         Args:
-            max_iterations (int): Maximum number of iterations to prevent infinite loops.
+            max_iterations (int): Maximum number of iterations to prevent infinite loops
+                (the engine's own cap in `MAX_ITERATIONS` if None). The array engines
+                raise `ClearingNotConverged` when they reach it, leaving the network
+                unchanged; the loop engine clears in place and reports
+                `converged=False`.
             tolerance (float): Convergence tolerance for equity changes.
+            engine (str): 'loop' settles node by node over the debt dicts (in a compiled
+                kernel over CSR arrays when numba is installed), 'vectorized'
+                iterates on NumPy arrays, 'out_of_core' streams memory-mapped edge
+                chunks from `chunk_dir` (a temporary directory if None) and 'greatest'
+                computes the greatest clearing vector with default costs and seniority.
+                'exact' runs order-independent Jacobi sweeps in integer minor units.
+                'distributed' splits the 'vectorized' iteration over `workers`
+                processes that share the edges in shared memory. Defaults to 'greatest' when those are set and 'loop' otherwise.
+            chunk_edges (int): Edges per chunk for the 'out_of_core' engine.
+            unit (float): Minor unit of the 'exact' engine.
+            workers (int): Worker processes of the 'distributed' engine.
+            record (bool): Keep a `PaymentRecord` of who paid whom in `self.record`.
+            record_iterations (bool): Also record the payment changes of every iteration
+                (the 'loop' and 'vectorized' engines only).
+
+        Returns:
+            ClearingResult: Equities, default mask, payments matrix and convergence info.
+        """
+        has_frictions = self.alpha != 1.0 or self.beta != 1.0 or self.seniority is not None
+        if engine is None:
+            engine = 'greatest' if has_frictions else 'loop'
+        elif has_frictions and engine != 'greatest':
+            raise ValueError(f"Default costs and seniority need the 'greatest' engine, not '{engine}'.")
+        if record_iterations and engine not in ('loop', 'vectorized'):
+            raise ValueError(f"Per-iteration records need the 'loop' or 'vectorized' engine, not '{engine}'.")
+
+        if max_iterations is None:
+            max_iterations = self.MAX_ITERATIONS.get(engine, 100)
+
+        self.initial_state = self.network.to_arrays()
+        equity, debtor, creditor, amount = self.initial_state
+        self.iteration_deltas = IterationDeltas(len(debtor)) if record_iterations else None
+        if engine == 'loop':
+            if kernels.USE_KERNELS and not record_iterations:
+                iterations, converged, paid = self.apply_loop_kernel(max_iterations, tolerance)
+            else:
+                iterations, converged, paid = self.apply_loop(max_iterations, tolerance)
+        elif engine == 'vectorized':
+            track = None
+            if record_iterations:
+                liabilities = total_liabilities(len(equity), debtor, amount)
+                track = lambda payments: self.iteration_deltas.add(edge_payments(payments, debtor, amount, liabilities))
+            payments, iterations, converged = clearing_vector(equity, debtor, creditor, amount, max_iterations,
+                                                              tolerance, track)
+            self.check_converged(engine, iterations, converged)
+            paid = self.apply_clearing_vector(payments, equity, debtor, creditor, amount, tolerance)
+        elif engine == 'out_of_core':
+            # A temporary directory is only made when no `chunk_dir` is given
+            directory = tempfile.TemporaryDirectory() if chunk_dir is None else contextlib.nullcontext(chunk_dir)
+            with directory as chunk_path:
+                store = EdgeChunkStore.from_network(self.network, chunk_path, chunk_edges)
+                payments, iterations, converged = store.clearing_vector(equity, max_iterations, tolerance)
+            self.check_converged(engine, iterations, converged)
+            paid = self.apply_clearing_vector(payments, equity, debtor, creditor, amount, tolerance)
+        elif engine == 'distributed':
+            partitioned = PartitionedClearing(len(equity), debtor, creditor, amount, workers)
+            payments, iterations, converged = partitioned.clearing_vector(equity, max_iterations, tolerance)
+            self.check_converged(engine, iterations, converged)
+            paid = self.apply_clearing_vector(payments, equity, debtor, creditor, amount, tolerance)
+        elif engine == 'greatest':
+            seniority = self.edge_seniority(debtor, creditor)
+            payments, iterations, converged = greatest_clearing_vector(
+                equity, debtor, creditor, amount, self.alpha, self.beta, seniority, max_iterations, tolerance)
+            self.check_converged(engine, iterations, converged)
+            paid = self.apply_clearing_vector(payments, equity, debtor, creditor, amount, tolerance, seniority)
+        elif engine == 'exact':
+            iterations, converged, paid = self.apply_exact(unit, max_iterations)
+        else:
+            raise ValueError(f"Unknown Eisenberg-Noe engine: {engine}")
+
+        if record or record_iterations:
+            self.record = PaymentRecord.from_clearing(self.network, self.initial_state, paid, iterations, converged,
+                                                      engine, self.iteration_deltas)
+        self.result = ClearingResult.from_network(self.network, self.initial_equity, self.initial_state, paid,
+                                                  iterations, converged)
+        return self.result
+
+    def check_converged(self, engine, iterations, converged):
+        """Raises `ClearingNotConverged` rather than letting a partial clearing be written back."""
+        if not converged:
+            raise ClearingNotConverged(f"The '{engine}' engine did not reach the clearing vector in {iterations} "
+                                       f"iterations; the network was left unchanged. Raise max_iterations.")
+
+    def replay(self, record):
+        """
+        Writes the end state of a recorded run back to the network without clearing it again.
+
+        The network must be in the pre-clearing state the record was made from (e.g.
+        reset), otherwise a ValueError is raised.
+
+        Returns:
+            ClearingResult: As `apply` returned when the record was made.
+        """
+        self.initial_state = self.network.to_arrays()
+        equity, debtor, creditor, _ = self.initial_state
+        if not record.matches(*self.initial_state):
+            raise ValueError("The payment record was made from a different network state.")
+        self.write_back(record.final_equity, np.zeros(len(equity), dtype=bool), debtor, creditor,
+                        record.remaining_amounts())
+        self.record = record
+        self.result = ClearingResult.from_network(self.network, self.initial_equity, self.initial_state,
+                                                  record.paid_amounts(), record.iterations, record.converged)
+        logging.info(f"Replayed a {record.engine} clearing record on {len(equity)} nodes.")
+        return self.result
+
+    def apply_loop(self, max_iterations=100, tolerance=1e-9):
+        """
+        Settles debts node by node, in place, until equities and debts stop changing.
+
+        Returns:
+            tuple: (iterations, converged, paid) where paid[k] is what was paid on edge k
+            of `self.initial_state`.
         """
         iteration = 0
+        converged = False
+        edges = len(self.initial_state[1])
         while iteration < max_iterations:
             iteration += 1
             equity_changed_significantly = False
             previous_equities = {node.id: node.equity for node in self.network.nodes}
+            previous_debt = self.network.total_network_debt()
 
             for node in self.network.nodes:
                 self.clear_debts_for_node(node)
+            if self.iteration_deltas is not None:
+                self.iteration_deltas.add(self.paid_so_far())
 
             # Check for convergence
             max_change = 0
@@ -38,32 +213,160 @@ class EisenbergNoe:
                 max_change = max(max_change, change)
                 if change > tolerance:
                     equity_changed_significantly = True
+            # Money going round a cycle pays debts down while leaving every equity unchanged
+            if previous_debt - self.network.total_network_debt() > max(tolerance, kernels.PAYMENT_UNIT * edges):
+                equity_changed_significantly = True
 
             if not equity_changed_significantly:
                 logging.info(f"Eisenberg-Noe converged after {iteration} iterations.")
+                converged = True
                 break
         else: # max_iterations reached
              logging.warning(f"Eisenberg-Noe did not converge after {max_iterations} iterations. Max change: {max_change}")
 
+        # Record what was paid on each edge before settled debts are dropped
+        paid = self.paid_so_far()
+
         # Final state update
         logging.info("Finalizing node states post-clearing.")
         for node in self.network.nodes:
-            # Enforce clearing conditions: if node has positive equity, it should have zero debt
-            if node.equity > tolerance:
-                node.debts = {}
+            # Enforce clearing conditions: a node whose equity covers what it still owes has no debt
+            # (what is left is rounding residue), and a defaulted node ends with nothing. Before
+            # convergence a defaulted node's equity is what it received after its last payment
+            # and is still owed to its creditors, so it is kept
+            if node.equity > tolerance and node.total_debt() <= node.equity:
                 # Also remove outgoing edges in the graph
-                for edge in list(self.network.graph.out_edges(node.id)):
-                    self.network.graph.remove_edge(edge[0], edge[1])
-                    
+                for creditor_id in node.debts:
+                    self.network.remove_debt_edge(node.id, creditor_id)
+                node.debts = {}
+            elif node.debts and converged:
+                node.equity = 0
+
             node.equity = round(node.equity, 6)
             node.update_color()
+        return iteration, converged, paid
+
+    def paid_so_far(self):
+        """Returns what has been paid on each edge of `self.initial_state` by the loop engine."""
+        _, debtor, creditor, amount = self.initial_state
+        return amount - np.fromiter((self.network.nodes[u].debts.get(v, 0.0)
+                                     for u, v in zip(debtor.tolist(), creditor.tolist())),
+                                    dtype=np.float64, count=len(debtor))
+
+    def edge_seniority(self, debtor, creditor):
+        """Returns the priority class of every edge, or None when all debts rank equally."""
+        if not self.seniority:
+            return None
+        return np.fromiter((self.seniority.get((u, v), 0) for u, v in zip(debtor.tolist(), creditor.tolist())),
+                           dtype=np.int64, count=len(debtor))
+
+    def apply_loop_kernel(self, max_iterations=100, tolerance=1e-9):
+        """
+        Runs the same node-by-node sweeps as `apply_loop` in a compiled kernel over CSR arrays.
+
+        Returns:
+            tuple: (iterations, converged, paid)
+        """
+        equity, debtor, creditor, amount = self.initial_state
+        final_equity = equity.copy()
+        debt = amount.copy()
+        iterations, converged = kernels.gauss_seidel_clearing(
+            final_equity, kernels.csr_indptr(debtor, len(equity)), creditor, debt, max_iterations, tolerance)
+        if converged:
+            logging.info(f"Eisenberg-Noe converged after {iterations} iterations.")
+        else:
+            logging.warning(f"Eisenberg-Noe did not converge after {max_iterations} iterations.")
+        # Enforce clearing conditions as apply_loop does: a node whose equity covers its debts has none left
+        remaining = np.bincount(debtor, weights=debt, minlength=len(equity))
+        solvent = (final_equity > tolerance) & (remaining <= final_equity)
+        if converged:
+            final_equity[~solvent & (remaining > 0)] = 0.0
+        self.write_back(final_equity, solvent, debtor, creditor, debt)
+        return iterations, converged, amount - debt
+
+    def apply_clearing_vector(self, payments, equity, debtor, creditor, amount, tolerance=1e-9, seniority=None):
+        """
+        Writes a clearing vector back to the network's nodes and graph.
+
+        Args:
+            payments (np.ndarray): Total amount each node pays.
+            equity, debtor, creditor, amount (np.ndarray): The pre-clearing state from `Network.to_arrays`.
+            tolerance (float): Nodes paying within this of their liabilities end up with no debts.
+            seniority (np.ndarray): Priority class per edge (pro rata if None).
+
+        Returns:
+            np.ndarray: The amount paid on each edge.
+        """
+        size = len(equity)
+        liabilities = total_liabilities(size, debtor, amount)
+        paid = edge_payments(payments, debtor, amount, liabilities, seniority)
+        received = np.bincount(creditor, weights=paid, minlength=size)
+        solvent = payments >= liabilities - tolerance
+        # Defaulted nodes end with nothing; anything they could not pay out is lost to default costs
+        final_equity = np.where(solvent, np.maximum(equity + received - payments, 0.0), 0.0)
+        self.write_back(final_equity, solvent, debtor, creditor, amount - paid)
+        return paid
+
+    def apply_exact(self, unit=1e-6, max_iterations=EXACT_MAX_ITERATIONS):
+        """
+        Clears the network in integer minor units and writes the exact result back.
+
+        Raises `ClearingNotConverged`, leaving the network unchanged, if the fixed point
+        is not reached within `max_iterations` sweeps.
+
+        Returns:
+            tuple: (iterations, converged, paid)
+        """
+        equity, debtor, creditor, amount = self.initial_state
+        size = len(equity)
+        payments, paid, iterations, converged = exact_clearing_vector(
+            equity, debtor, creditor, amount, unit, max_iterations)
+        self.check_converged('exact', iterations, converged)
+        amount_units = to_minor_units(amount, unit)
+        received = np.bincount(creditor, weights=paid, minlength=size).astype(np.int64)
+        paid_out = np.bincount(debtor, weights=paid, minlength=size).astype(np.int64)
+        final_equity = (to_minor_units(equity, unit) + received - paid_out) * unit
+        solvent = payments == np.bincount(debtor, weights=amount_units, minlength=size).astype(np.int64)
+        self.write_back(final_equity, solvent, debtor, creditor, (amount_units - paid) * unit)
+        return iterations, converged, paid * unit
+
+    def write_back(self, final_equity, solvent, debtor, creditor, remaining):
+        """Sets every node's final equity and remaining debts; solvent nodes end with no debts."""
+        new_debts = [{} for _ in range(len(final_equity))]
+        for u, v, value in zip(debtor.tolist(), creditor.tolist(), remaining.tolist()):
+            if value > 1e-9:
+                new_debts[u][v] = value
+            else:
+                self.network.remove_debt_edge(u, v)
+
+        logging.info("Finalizing node states post-clearing.")
+        for node, node_equity, node_solvent, debts in zip(self.network.nodes, final_equity.tolist(),
+                                                          solvent.tolist(), new_debts):
+            # Enforce clearing conditions: a node that paid in full has no debt left
+            if node_solvent:
+                for creditor_id in debts:
+                    self.network.remove_debt_edge(node.id, creditor_id)
+                debts = {}
+            node.debts = debts
+            node.equity = round(node_equity, 6)
+
+    def systemic_risk(self, tolerance=1e-9):
+        """
+        Computes per-node systemic-risk metrics of the pre-clearing network.
+
+        Returns:
+            dict: See `systemicrisk.systemic_risk_metrics` (clearing vector, default
+            round per node, DebtRank and the sparse Jacobian of payments w.r.t. equity).
+        """
+        state = self.initial_state if self.initial_state is not None else self.network.to_arrays()
+        return systemic_risk_metrics(*state, tolerance=tolerance)
 
     def is_pareto_improvement(self):
         """Checks if any node's equity decreased compared to its pre-clearing state."""
-        for node in self.network.nodes:
-            if node.equity < self.initial_equities[node.id] - 1e-9:
-                logging.info(f"Node {node.id} worse off: Initial={self.initial_equities[node.id]:.2f}, Final={node.equity:.2f}. Not Pareto Improvement.")
-                return False
+        worse_off = self.current_equity() < self.initial_equity - 1e-9
+        if worse_off.any():
+            logging.info(f"{int(worse_off.sum())} nodes worse off (first: node {int(np.argmax(worse_off))}). Not Pareto Improvement.")
+            return False
         logging.info("No node worse off. Pareto Improvement achieved.")
         return True
 
@@ -98,9 +401,8 @@ class EisenbergNoe:
                     new_debt = node.debts[creditor_id] - actual_payment
                     if new_debt <= 1e-9:
                         del node.debts[creditor_id]
-                        if self.network.graph.has_edge(node.id, creditor_id):
-                            self.network.graph.remove_edge(node.id, creditor_id)
-                            logging.debug(f"Debt cleared: {node.id} -> {creditor_id}. Edge removed.")
+                        self.network.remove_debt_edge(node.id, creditor_id)
+                        logging.debug(f"Debt cleared: {node.id} -> {creditor_id}. Edge removed.")
                     else:
                         node.debts[creditor_id] = new_debt
                 else:
@@ -114,10 +416,14 @@ class EisenbergNoe:
         # Update node's color/status
         node.update_color()
 
-    def node_equity_change(self):
-        """Prints the change in equity for each node compared to its pre-clearing state."""
-        print("\n--- Equity Changes Post Eisenberg-Noe ---")
-        for node in self.network.nodes:
-            change = node.equity - self.initial_equities[node.id]
-            print(f'Node {node.id}: Initial Equity={self.initial_equities[node.id]:.2f}, Final Equity={node.equity:.2f}, Change={change:+.2f}')
-        print("----------------------------------------")
\ No newline at end of file
+    def node_equity_change(self, verbose=False):
+        """
+        Returns the change in equity of every node compared to its pre-clearing state.
+
+        Args:
+            verbose (bool): Also print a per-node table of the changes.
+        """
+        final_equity = self.current_equity()
+        if verbose:
+            print("\n" + format_equity_changes(self.initial_equity, final_equity))
+        return final_equity - self.initial_equity
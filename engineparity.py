@@ -0,0 +1,238 @@
+# Standard libraries
+import argparse
+import copy
+import logging
+import time
+
+# Third-party libraries
+import numpy as np
+
+# Project modules
+from network import Network
+from compression import Compression
+from eisenbergnoe import EisenbergNoe
+from clearing import ClearingNotConverged
+import kernels
+
+# Shapes of the generated debt graphs
+TOPOLOGIES = ('random', 'ring', 'star', 'complete', 'chain', 'isolated')
+# Engines compared with the reference; 'loop_kernel' is the loop engine over CSR arrays
+ENGINES = ('loop', 'loop_kernel', 'out_of_core', 'distributed', 'exact', 'greatest')
+COMPRESSIONS = ('python', 'kernel')
+REFERENCE_ENGINE = 'vectorized'
+
+
+def random_edges(rng, size, topology):
+    """Returns (debtor, creditor) arrays of a debt graph of the given topology."""
+    nodes = np.arange(size)
+    if topology == 'random':
+        pairs = np.array([(u, v) for u in range(size) for v in range(size) if u != v]).reshape(-1, 2)
+        pairs = pairs[rng.random(len(pairs)) < rng.uniform(0.05, 0.6)]
+    elif topology == 'ring':
+        pairs = np.column_stack([nodes, (nodes + 1) % size])
+    elif topology == 'star':
+        # Every node owes the hub and the hub owes a random subset back
+        spokes = nodes[1:]
+        back = spokes[rng.random(len(spokes)) < 0.5]
+        pairs = np.vstack([np.column_stack([spokes, np.zeros_like(spokes)]),
+                           np.column_stack([np.zeros_like(back), back])])
+    elif topology == 'complete':
+        pairs = np.array([(u, v) for u in range(size) for v in range(size) if u != v]).reshape(-1, 2)
+    elif topology == 'chain':
+        pairs = np.column_stack([nodes[:-1], nodes[1:]])
+    elif topology == 'isolated':
+        pairs = np.empty((0, 2), dtype=np.int64)
+    else:
+        raise ValueError(f"Unknown topology: {topology}")
+    pairs = pairs.reshape(-1, 2).astype(np.int64)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]] # A one-node ring would owe itself
+    if topology != 'isolated' and size > 1:
+        # Shuffle the edge order, which the engines must not depend on beyond tolerance
+        pairs = pairs[rng.permutation(len(pairs))]
+    return pairs[:, 0], pairs[:, 1]
+
+
+def random_network(rng, max_size=30):
+    """
+    Draws one network: a size, a topology, integer-cent equities and debts.
+
+    Equity is zero for some nodes, and debts are scaled so that both solvent and
+    defaulting nodes are common.
+
+    Returns:
+        tuple: (network, description)
+    """
+    size = int(rng.integers(1, max_size + 1))
+    topology = TOPOLOGIES[int(rng.integers(len(TOPOLOGIES)))]
+    debtor, creditor = random_edges(rng, size, topology)
+    scale = float(rng.choice([10.0, 100.0, 1000.0]))
+    equity = np.round(rng.uniform(0, scale, size) * (rng.random(size) > 0.1), 2)
+    amount = np.round(rng.uniform(0.01, 2 * scale / max(1, np.sqrt(len(debtor) / size)), len(debtor)), 2)
+    description = {'size': size, 'topology': topology, 'edges': len(debtor), 'scale': scale}
+    return Network.from_arrays(equity, debtor, creditor, amount), description
+
+
+def run_engine(network, engine, max_iterations=None):
+    """
+    Clears a copy of `network` with `engine`, returning (network, result, seconds).
+
+    `max_iterations=None` runs the engine with its own default cap, as production
+    callers do. The result is None when an engine stops before converging.
+    """
+    network = copy.deepcopy(network)
+    use_kernels = engine == 'loop_kernel'
+    saved = kernels.USE_KERNELS
+    kernels.USE_KERNELS = use_kernels
+    start = time.perf_counter()
+    try:
+        result = EisenbergNoe(network).apply(max_iterations=max_iterations,
+                                             engine='loop' if use_kernels else engine)
+    except ClearingNotConverged:
+        result = None
+    finally:
+        kernels.USE_KERNELS = saved
+    seconds = time.perf_counter() - start
+    if result is not None and not result.converged:
+        result = None
+    return network, result, seconds
+
+
+def net_positions(network):
+    """Returns what each node is owed minus what it owes."""
+    _, debtor, creditor, amount = network.to_arrays()
+    size = len(network.nodes)
+    return np.bincount(creditor, weights=amount, minlength=size) - np.bincount(debtor, weights=amount, minlength=size)
+
+
+def check_clearing(network, engines=ENGINES, tolerance=1e-4, max_iterations=None):
+    """
+    Clears `network` with every engine and compares each with the reference engine.
+
+    Every engine runs with its default iteration cap unless `max_iterations` is
+    given, and must converge. The final equities must agree within `tolerance` times the network's scale. The
+    default set must agree on every node not within that margin of the default
+    boundary, and the Pareto flags must agree unless some node's equity change is
+    within the margin of zero.
+
+    Returns:
+        tuple: (failures, seconds) where failures lists messages and seconds maps
+        engine to clearing time.
+    """
+    reference, expected, seconds = run_engine(network, REFERENCE_ENGINE, max_iterations)
+    timings = {REFERENCE_ENGINE: seconds}
+    if expected is None:
+        return [f"{REFERENCE_ENGINE}: did not converge"], timings
+    scale = max(1.0, float(np.abs(expected.initial_equity).max(initial=0.0)),
+                float(expected.payments.max()) if expected.payments.nnz else 0.0)
+    margin = tolerance * scale
+    remaining = np.array([node.total_debt() for node in reference.nodes])
+    # A node is on the boundary when it is nearly exactly able to pay
+    boundary = (np.abs(expected.final_equity) <= margin) & (remaining <= margin)
+    failures = []
+    for engine in engines:
+        _, result, timings[engine] = run_engine(network, engine, max_iterations)
+        if result is None:
+            failures.append(f"{engine}: did not converge")
+            continue
+        error = float(np.max(np.abs(result.final_equity - expected.final_equity), initial=0.0))
+        if error > margin:
+            failures.append(f"{engine}: final equity differs by {error:.3g}")
+        mismatched = (result.defaulted != expected.defaulted) & ~boundary
+        if mismatched.any():
+            failures.append(f"{engine}: default set differs at nodes {np.flatnonzero(mismatched).tolist()}")
+        knife_edge = (np.abs(expected.change) <= margin).any()
+        if result.pareto_improvement != expected.pareto_improvement and not knife_edge:
+            failures.append(f"{engine}: Pareto flag {result.pareto_improvement}, expected {expected.pareto_improvement}")
+    return failures, timings
+
+
+def check_compression(network, tolerance=1e-6):
+    """
+    Compresses copies of `network` with and without the kernel.
+
+    Both must conserve every node's net position and agree on the remaining debts.
+
+    Returns:
+        tuple: (failures, seconds) as `check_clearing`.
+    """
+    before = net_positions(network)
+    failures, timings, states = [], {}, {}
+    for method in COMPRESSIONS:
+        compressed = copy.deepcopy(network)
+        compression = Compression(compressed)
+        start = time.perf_counter()
+        if method == 'kernel':
+            compression.apply_kernel()
+        else:
+            saved = kernels.USE_KERNELS
+            kernels.USE_KERNELS = False
+            try:
+                compression.apply()
+            finally:
+                kernels.USE_KERNELS = saved
+        timings[method] = time.perf_counter() - start
+        error = float(np.max(np.abs(net_positions(compressed) - before), initial=0.0))
+        if error > tolerance:
+            failures.append(f"compression ({method}): net positions change by {error:.3g}")
+        states[method] = compressed.to_arrays()
+    for expected, actual in zip(states['python'][1:], states['kernel'][1:]):
+        if len(expected) != len(actual) or not np.allclose(expected, actual, rtol=0, atol=tolerance):
+            failures.append("compression: kernel and python results differ")
+            break
+    return failures, timings
+
+
+def run_harness(cases=1000, seed=0, max_size=30, engines=ENGINES, tolerance=1e-4):
+    """
+    Checks clearing and compression parity on `cases` random networks.
+
+    Case i is drawn from its own stream of `seed`, so a failing case can be
+    reproduced on its own with `case_network(seed, i)`.
+
+    Returns:
+        dict: 'failures' ([(case, description, messages)]) and 'timing' ({engine:
+        total seconds}, with 'ratio' to the reference engine).
+    """
+    failures = []
+    totals = {}
+    for case in range(cases):
+        network, description = case_network(seed, case, max_size)
+        messages, timings = check_clearing(network, engines, tolerance)
+        compression_messages, compression_timings = check_compression(network)
+        messages += compression_messages
+        for name, seconds in {**timings, **{f"compression_{key}": value for key, value in compression_timings.items()}}.items():
+            totals[name] = totals.get(name, 0.0) + seconds
+        if messages:
+            failures.append((case, description, messages))
+            logging.warning(f"Parity case {case} ({description}) failed: {messages}")
+    timing = {name: {'seconds': seconds, 'ratio': seconds / totals[REFERENCE_ENGINE]}
+              for name, seconds in totals.items()}
+    return {'cases': cases, 'failures': failures, 'timing': timing}
+
+
+def case_network(seed, case, max_size=30):
+    """Returns the (network, description) of case `case` of a harness run with `seed`."""
+    return random_network(np.random.default_rng([seed, case]), max_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the clearing and compression engines agree on random networks.")
+    parser.add_argument('--cases', type=int, default=1000, help="Random networks to check.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the generated cases.")
+    parser.add_argument('--max-size', type=int, default=30, help="Largest network size.")
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), help="Engines to compare with 'vectorized'.")
+    parser.add_argument('--tolerance', type=float, default=1e-4, help="Tolerance relative to the network's scale.")
+    args = parser.parse_args()
+
+    report = run_harness(args.cases, args.seed, args.max_size, args.engines, args.tolerance)
+    print(f"{report['cases']} cases, {len(report['failures'])} failed")
+    for case, description, messages in report['failures'][:20]:
+        print(f"  case {case} {description}: {'; '.join(messages)}")
+    print(f"{'engine':<22}{'seconds':>10}{'ratio':>8}")
+    for name, timing in sorted(report['timing'].items(), key=lambda item: item[1]['seconds']):
+        print(f"{name:<22}{timing['seconds']:>10.3f}{timing['ratio']:>8.2f}")
+    raise SystemExit(1 if report['failures'] else 0)
+
+
+if __name__ == '__main__':
+    main()
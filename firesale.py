@@ -0,0 +1,104 @@
+# Standard libraries
+import logging
+
+# Third-party libraries
+import numpy as np
+
+# Project modules
+from clearing import payment_ratios, received_payments, total_liabilities
+
+
+class FireSale:
+    """
+    Eisenberg-Noe clearing with a common illiquid asset sold at a falling price.
+
+    After Cifuentes, Shin & Ferrucci (2005): every node holds cash and units of one
+    illiquid asset. A node that cannot meet its liabilities from cash and what it
+    receives sells units to cover the shortfall. The asset price falls with total
+    sales as price = initial_price * exp(-impact * units sold). Payments and the price
+    are solved as one fixed point. From full payment and the initial price, each
+    sweep updates the sales, then the price, then every node's payment on arrays.
+    Both only fall, so the sweeps converge to the greatest joint fixed point.
+    """
+    def __init__(self, cash, holdings, debtor, creditor, amount, price=1.0, impact=0.0):
+        """
+        Args:
+            cash (array-like): Liquid external assets of every node.
+            holdings (array-like): Units of the illiquid asset every node holds.
+            debtor, creditor, amount (array-like): Edge k means `debtor[k]` owes `creditor[k]` `amount[k]`.
+            price (float): Asset price before any sales.
+            impact (float): Price impact per unit sold; 0 makes the asset fully liquid.
+        """
+        self.cash = np.asarray(cash, dtype=np.float64)
+        self.holdings = np.asarray(holdings, dtype=np.float64)
+        self.size = len(self.cash)
+        self.debtor = np.asarray(debtor, dtype=np.int64)
+        self.creditor = np.asarray(creditor, dtype=np.int64)
+        self.amount = np.asarray(amount, dtype=np.float64)
+        self.price = price
+        self.impact = impact
+        self.liabilities = total_liabilities(self.size, self.debtor, self.amount)
+
+    @classmethod
+    def from_network(cls, network, illiquid_share=0.5, price=1.0, impact=0.0):
+        """Splits every node's equity into cash and `illiquid_share` of it in the asset, at `price`."""
+        equity, debtor, creditor, amount = network.to_arrays()
+        return cls(equity * (1 - illiquid_share), equity * illiquid_share / price, debtor, creditor, amount,
+                   price, impact)
+
+    def market_price(self, units_sold):
+        """Returns the asset price after `units_sold` units have been sold in total."""
+        return self.price * np.exp(-self.impact * units_sold)
+
+    def sweep(self, payments, price):
+        """
+        Runs one joint update from the current payments and price.
+
+        Returns:
+            tuple: (payments, price, sold, received)
+        """
+        received = received_payments(payment_ratios(payments, self.liabilities), self.debtor, self.creditor,
+                                     self.amount, self.size)
+        shortfall = np.maximum(self.liabilities - self.cash - received, 0.0)
+        sold = np.minimum(self.holdings, shortfall / price)
+        price = self.market_price(sold.sum())
+        payments = np.minimum(self.liabilities, self.cash + received + price * self.holdings)
+        return payments, price, sold, received
+
+    def clear(self, max_iterations=1000, tolerance=1e-9):
+        """
+        Solves for the clearing vector and asset price together.
+
+        Returns:
+            dict: 'payments', 'price', 'sold' (units each node sells), 'equity' (net
+            worth with holdings marked at the final price, 0 in default), 'defaulted',
+            'iterations' and 'converged'.
+        """
+        payments, price = self.liabilities.copy(), self.price
+        sold = received = np.zeros(self.size)
+        converged = False
+        iteration, change = 0, 0.0
+        for iteration in range(1, max_iterations + 1):
+            new_payments, new_price, sold, received = self.sweep(payments, price)
+            change = max(float(np.max(np.abs(new_payments - payments), initial=0.0)), abs(new_price - price))
+            payments, price = new_payments, new_price
+            if change <= tolerance:
+                converged = True
+                break
+        if converged:
+            logging.info(f"Fire-sale clearing converged after {iteration} iterations at price {price:.6f}.")
+        else:
+            logging.warning(f"Fire-sale clearing did not converge after {max_iterations} iterations. "
+                            f"Max change: {change}")
+        defaulted = payments < self.liabilities - tolerance
+        equity = np.where(defaulted, 0.0,
+                          np.maximum(self.cash + received + price * self.holdings - payments, 0.0))
+        return {
+            'payments': payments,
+            'price': price,
+            'sold': sold,
+            'equity': equity,
+            'defaulted': defaulted,
+            'iterations': iteration,
+            'converged': converged,
+        }
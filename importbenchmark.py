@@ -0,0 +1,55 @@
+# Standard libraries
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules timed by default, from the clearing core to the batch tools
+DEFAULT_MODULES = ('clearing', 'network', 'eisenbergnoe', 'compression', 'simulation', 'parametersweep')
+# Dependencies that should only be imported by the code paths that use them
+HEAVY_MODULES = ('networkx', 'pandas', 'matplotlib', 'tkinter', 'scipy.sparse', 'scipy.stats', 'numba')
+
+# Run in a fresh interpreter, so nothing is already imported
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'loaded': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def import_cost(module, repeat=5):
+    """
+    Times importing `module` in `repeat` fresh interpreters.
+
+    Returns:
+        dict: Best and median import time in seconds, and the heavy dependencies
+        the import loaded.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                cwd=directory, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+    seconds = sorted(run['seconds'] for run in runs)
+    return {'module': module, 'best': seconds[0], 'median': seconds[len(seconds) // 2], 'loaded': runs[-1]['loaded']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time importing project modules in fresh interpreters.")
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES, help="Modules to import.")
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters per module.")
+    args = parser.parse_args()
+
+    print(f"{'module':<20}{'best ms':>10}{'median ms':>12}  heavy dependencies loaded")
+    for module in args.modules:
+        cost = import_cost(module, args.repeat)
+        print(f"{module:<20}{cost['best'] * 1000:>10.1f}{cost['median'] * 1000:>12.1f}  "
+              f"{', '.join(cost['loaded']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
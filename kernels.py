@@ -0,0 +1,135 @@
+# Standard libraries
+import functools
+import importlib.util
+import logging
+
+# Third-party libraries
+import numpy as np
+
+# Project modules
+from lazyimport import lazy_import
+
+# Optional dependency: the kernels are compiled on first call when numba is installed
+numba = lazy_import('numba')
+NUMBA_AVAILABLE = importlib.util.find_spec('numba') is not None
+
+# EisenbergNoe and Compression use the kernels when this is True
+USE_KERNELS = NUMBA_AVAILABLE
+# The loop engine rounds every payment to this; once sweeps only pay down about one
+# unit per debt, the remaining payments are rounding residue going round cycles
+PAYMENT_UNIT = 1e-6
+
+
+def jit(function):
+    """
+    Compiles `function` with numba on its first call when numba is installed, otherwise
+    returns it unchanged. numba itself is only imported then.
+    """
+    if not NUMBA_AVAILABLE:
+        return function
+    compiled = None
+
+    @functools.wraps(function)
+    def call(*args):
+        nonlocal compiled
+        if compiled is None:
+            compiled = numba.njit(cache=True)(function)
+        return compiled(*args)
+    return call
+
+
+def csr_indptr(debtor, size):
+    """Returns CSR row pointers for edges grouped by debtor in node order (as `Network.to_arrays` emits them)."""
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(debtor, minlength=size), out=indptr[1:])
+    return indptr
+
+
+@jit
+def gauss_seidel_clearing(equity, indptr, creditor, debt, max_iterations, tolerance):
+    """
+    Runs the node-by-node clearing sweeps of `EisenbergNoe.apply_loop` over CSR arrays.
+
+    `equity` and `debt` are updated in place; a settled debt is set to 0. Payments,
+    rounding and sweep order match `EisenbergNoe.clear_debts_for_node` exactly.
+
+    Returns:
+        tuple: (iterations, converged)
+    """
+    size = len(equity)
+    previous = np.empty(size)
+    for iteration in range(1, max_iterations + 1):
+        previous[:] = equity
+        paid_down = 0.0
+        for node in range(size):
+            total_debt = 0.0
+            for k in range(indptr[node], indptr[node + 1]):
+                total_debt += debt[k]
+            if total_debt <= 1e-9:
+                continue
+            if equity[node] <= 1e-9:
+                equity[node] = 0.0
+                continue
+
+            payment_fraction = min(equity[node] / total_debt, 1.0)
+            total_paid = 0.0
+            for k in range(indptr[node], indptr[node + 1]):
+                if debt[k] <= 0.0:
+                    continue
+                actual_payment = round(debt[k] * payment_fraction, 6)
+                if actual_payment > 1e-9:
+                    total_paid += actual_payment
+                    equity[creditor[k]] += actual_payment
+                    new_debt = debt[k] - actual_payment
+                    settled = 0.0 if new_debt <= 1e-9 else new_debt
+                    paid_down += debt[k] - settled
+                    debt[k] = settled
+            equity[node] -= total_paid
+            if equity[node] < 0:
+                equity[node] = 0.0
+
+        # Money going round a cycle pays debts down while leaving every equity unchanged
+        converged = paid_down <= max(tolerance, PAYMENT_UNIT * len(debt))
+        for node in range(size):
+            if abs(equity[node] - previous[node]) > tolerance:
+                converged = False
+                break
+        if converged:
+            return iteration, True
+    return max_iterations, False
+
+
+@jit
+def bilateral_netting(indptr, creditor, debt):
+    """
+    Nets every pair of mutual debts in place, as `Compression.simplify_mutual_debt` does.
+
+    A debt netted down to (almost) nothing is set to 0.
+
+    Returns:
+        int: Number of pairs netted.
+    """
+    netted = 0
+    for node in range(len(indptr) - 1):
+        for k in range(indptr[node], indptr[node + 1]):
+            other = creditor[k]
+            if other <= node:
+                continue
+            # Find the reverse debt other -> node
+            for r in range(indptr[other], indptr[other + 1]):
+                if creditor[r] == node:
+                    a_owes_b = debt[k]
+                    b_owes_a = debt[r]
+                    if a_owes_b > 1e-9 and b_owes_a > 1e-9:
+                        netting_amount = min(a_owes_b, b_owes_a)
+                        new_a_owes_b = a_owes_b - netting_amount
+                        new_b_owes_a = b_owes_a - netting_amount
+                        debt[k] = 0.0 if new_a_owes_b <= 1e-9 else new_a_owes_b
+                        debt[r] = 0.0 if new_b_owes_a <= 1e-9 else new_b_owes_a
+                        netted += 1
+                    break
+    return netted
+
+
+if NUMBA_AVAILABLE:
+    logging.debug("numba found; clearing and compression kernels will be compiled.")
@@ -0,0 +1,28 @@
+# Standard libraries
+import importlib
+
+
+class LazyModule:
+    """Stands in for a module that is only imported when one of its attributes is first used."""
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    """
+    Returns a module whose import is deferred until first use.
+
+    Heavy dependencies that only some code paths need (networkx, pandas, SciPy)
+    are bound this way, so that importing the clearing modules stays fast.
+    """
+    return LazyModule(name)
@@ -1,29 +1,28 @@
 # Standard libraries
 import logging
-import os # Keep if needed elsewhere
-import tkinter as tk
-
-# Third-party libraries
-import pandas as pd
 
 # Project modules
 from network import Network
 from networkgraph import NetworkGraph
 
-# Configure pandas display options
-try:
-    pd.set_option('display.max_rows', 50)
-    pd.set_option('display.max_columns', 20)
-    pd.set_option('display.width', 120)
-    pd.set_option('display.max_colwidth', 50)
-except Exception as e:
-    logging.warning(f"Could not set pandas display options: {e}")
+
+def configure_pandas():
+    """Sets the display options used when simulation results are printed."""
+    import pandas as pd # Imported here so that importing this module stays cheap
+    try:
+        pd.set_option('display.max_rows', 50)
+        pd.set_option('display.max_columns', 20)
+        pd.set_option('display.width', 120)
+        pd.set_option('display.max_colwidth', 50)
+    except Exception as e:
+        logging.warning(f"Could not set pandas display options: {e}")
 
 if __name__ == '__main__':
     # Configure logging
     logging.basicConfig(filename='default.log',
                         level=logging.INFO,
                         format='%(asctime)s - %(levelname)s - %(message)s')
+    configure_pandas()
 
     logging.info("Application starting...")
 
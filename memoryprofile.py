@@ -0,0 +1,187 @@
+# Standard libraries
+import argparse
+import contextlib
+import logging
+import sys
+import tracemalloc
+import types
+
+# Third-party libraries
+import numpy as np
+
+# Project modules
+from network import Network
+from compression import Compression
+from eisenbergnoe import EisenbergNoe
+
+# Objects whose size is not part of any data structure
+OPAQUE_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def deep_size(obj, seen=None):
+    """
+    Returns the bytes held by `obj` and everything it references that is not in `seen`.
+
+    Every object is counted once per `seen` set, so sharing one set across calls
+    splits memory between structures without counting any object twice. An object
+    shared by two structures counts towards the one measured first.
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen or isinstance(obj, OPAQUE_TYPES):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif isinstance(obj, np.ndarray):
+        pass # getsizeof already includes the data of arrays that own it
+    elif hasattr(obj, '__dict__'):
+        size += deep_size(vars(obj), seen)
+    return size
+
+
+def footprint(network, simulation=None):
+    """
+    Breaks down the memory a network (and optionally a simulation) holds by structure.
+
+    Returns:
+        dict: Bytes per structure. 'debts' and 'initial_debts' are the nodes' current
+        and reset debt dictionaries. 'nodes' is the rest of the `Node` objects.
+        'graph_edge_attributes' is the networkx edge data dicts and 'graph' is the rest
+        of the graph; both are 0 until the graph is first read (`original_graph` is
+        never kept). 'network_other' is everything else the network references.
+        'results_df' is only present with a `Simulation`.
+    """
+    seen = {id(network)}
+    sizes = {
+        'debts': sum(deep_size(node._debts, seen) for node in network.nodes),
+        'initial_debts': sum(deep_size(node.initial_debts, seen) for node in network.nodes),
+        'nodes': deep_size(network.nodes, seen),
+        'graph_edge_attributes': 0,
+        'graph': 0,
+    }
+    graph = network._graph
+    if graph is not None:
+        sizes['graph_edge_attributes'] = sum(deep_size(data, seen) for _, _, data in graph.edges(data=True))
+        sizes['graph'] = deep_size(graph, seen)
+    sizes['network_other'] = deep_size(vars(network), seen)
+    if simulation is not None:
+        sizes['results_df'] = int(simulation.results_df.memory_usage(deep=True).sum())
+    return sizes
+
+
+class MemoryProfile:
+    """
+    Tracks memory per pipeline stage with `tracemalloc`.
+
+    Each `stage` records the bytes it left allocated ('retained') and its peak above
+    the starting point ('peak'). Only allocations made while tracing are seen, so
+    start the profile before the objects to be measured are created.
+    """
+    def __init__(self):
+        self.stages = [] # [{'stage', 'retained', 'peak'}] in the order run
+        self._started = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+
+    def stop(self):
+        """Stops tracing, if this profile started it."""
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Measures the block run inside it as stage `name`."""
+        self.start()
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self.stages.append({'stage': name, 'retained': current - before, 'peak': peak - before})
+            logging.info(f"Memory stage {name}: retained {current - before} bytes, peak {peak - before} bytes.")
+
+
+def profile_pipeline(mini, maxi, seed=None, engine='vectorized', build_graph=False, **network_params):
+    """
+    Generates a network, compresses, clears and resets it, measuring every stage.
+
+    Args:
+        build_graph (bool): Also measure building the networkx graph after generation,
+            as the GUI does.
+        network_params: Passed on to `Network`.
+
+    Returns:
+        tuple: (stages, structures) where stages is the `MemoryProfile.stages` list and
+        structures is {stage: `footprint` after that stage}.
+    """
+    # Run the stages once on a tiny network first, so lazy imports and first-use caches are not measured
+    warm_up = Network(2, 3, seed=0)
+    warm_up.graph
+    Compression(warm_up).apply()
+    EisenbergNoe(warm_up).apply(engine=engine)
+    warm_up.reset()
+
+    structures = {}
+    with MemoryProfile() as profile:
+        with profile.stage('generate'):
+            network = Network(mini, maxi, seed=seed, **network_params)
+        structures['generate'] = footprint(network)
+        if build_graph:
+            with profile.stage('graph'):
+                network.graph
+            structures['graph'] = footprint(network)
+        with profile.stage('compress'):
+            Compression(network).apply()
+        structures['compress'] = footprint(network)
+        with profile.stage('clear'):
+            EisenbergNoe(network).apply(engine=engine)
+        structures['clear'] = footprint(network)
+        with profile.stage('reset'):
+            network.reset()
+        structures['reset'] = footprint(network)
+    return profile.stages, structures
+
+
+def format_report(stages, structures):
+    """Formats `profile_pipeline` results as two tables, in KiB."""
+    lines = [f"{'stage':<10}{'retained KiB':>14}{'peak KiB':>12}"]
+    for stage in stages:
+        lines.append(f"{stage['stage']:<10}{stage['retained'] / 1024:>14.1f}{stage['peak'] / 1024:>12.1f}")
+    names = list(structures)
+    lines.append('')
+    lines.append(f"{'structure':<24}" + ''.join(f"{name:>12}" for name in names))
+    for structure in next(iter(structures.values()), {}):
+        lines.append(f"{structure:<24}" + ''.join(f"{structures[name][structure] / 1024:>12.1f}" for name in names))
+    lines.append(f"{'total':<24}" + ''.join(f"{sum(structures[name].values()) / 1024:>12.1f}" for name in names))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report memory per pipeline stage and per network structure.")
+    parser.add_argument('--mini', type=int, default=200, help="Minimum number of nodes.")
+    parser.add_argument('--maxi', type=int, default=200, help="Maximum number of nodes.")
+    parser.add_argument('--seed', type=int, default=0, help="Network seed.")
+    parser.add_argument('--engine', default='vectorized', help="EisenbergNoe engine for the clear stage.")
+    parser.add_argument('--graph', action='store_true', help="Also build the networkx graph.")
+    args = parser.parse_args()
+    stages, structures = profile_pipeline(args.mini, args.maxi, args.seed, args.engine, args.graph)
+    print(format_report(stages, structures))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,36 +4,156 @@ import logging
 import copy
 
 # Third-party libraries
-import networkx as nx
+import numpy as np
 
 # Project modules
+from lazyimport import lazy_import
 from node import Node
 
+# Only the GUI and graph queries need networkx; the graph is built on first read
+nx = lazy_import('networkx')
+
 class Network:
     """Represents the financial network containing nodes and their debt relationships."""
-    def __init__(self, mini, maxi):
+    # Bump whenever the generator draws differently for the same seed and parameters
+    GENERATOR_VERSION = 2
+    # Independent random streams of a seeded network: the debt network, the external
+    # equities and the equity shocks. Varying one component leaves the others' draws unchanged
+    STREAMS = ('topology', 'equity', 'shock')
+    # When True, every aggregate read is checked against a full recomputation (for testing)
+    check_aggregates = False
+
+    def __init__(self, mini, maxi, seed=None, equity_range=(50, 1000), debt_range=(50, 1000),
+                 debt_fraction=(0.1, 0.5), reciprocity=0.3, shock=0.0, antithetic=False,
+                 defer_graph_updates=False):
         self.mini = mini
         self.maxi = maxi
+        self.seed = seed
+        self.equity_range = tuple(equity_range)
+        self.debt_range = tuple(debt_range)
+        self.debt_fraction = tuple(debt_fraction)
+        self.reciprocity = reciprocity
+        self.shock = shock # Each node loses a uniform fraction in [0, shock) of its equity
+        # The antithetic twin of a seeded network has the same debts but mirrored equity and shock draws
+        self.antithetic = antithetic
+        self.streams = self.make_streams(seed)
+        # When True, edge removals are only recorded and applied the next time `graph` is read
+        self.defer_graph_updates = defer_graph_updates
         self.nodes = []
-        self.graph = nx.DiGraph()
-        self.original_graph = None
         self.init_network()
 
+    @property
+    def graph(self):
+        """Gets the networkx graph, first applying any deferred edge updates."""
+        if self._graph_stale:
+            self.graph = self.build_graph()
+        elif self._dirty_edges:
+            self.sync_graph()
+        return self._graph
+
+    @graph.setter
+    def graph(self, value):
+        """Replaces the graph and discards any pending deferred updates."""
+        self._graph = value
+        self._graph_stale = False
+        self._dirty_edges = set()
+
+    @property
+    def original_graph(self):
+        """Gets a networkx graph of the initial state the network resets to."""
+        return self.build_graph(initial=True)
+
+    def invalidate_graph(self):
+        """Drops the graph so that it is rebuilt from the nodes the next time `graph` is read."""
+        self._graph = None
+        self._graph_stale = True
+        self._dirty_edges = set()
+
+    def build_graph(self, initial=False):
+        """Builds a graph from the nodes' current (or `initial`) equities and debts."""
+        graph = nx.DiGraph()
+        for node in self.nodes:
+            graph.add_node(node.id, equity=node.initial_equity if initial else node.equity)
+        for node in self.nodes:
+            for creditor_id, debt_value in (node.initial_debts if initial else node.debts).items():
+                if debt_value > 1e-9:  # Only add edges for significant debts
+                    graph.add_edge(node.id, creditor_id, debt=debt_value)
+        return graph
+
+    def sync_graph(self):
+        """Patches the graph edges recorded as dirty to match the nodes' debts."""
+        graph = self._graph
+        for debtor_id, creditor_id in self._dirty_edges:
+            debt_value = self.nodes[debtor_id].debts.get(creditor_id, 0)
+            if debt_value > 1e-9:
+                if not graph.has_edge(debtor_id, creditor_id):
+                    graph.add_edge(debtor_id, creditor_id, debt=debt_value)
+            elif graph.has_edge(debtor_id, creditor_id):
+                graph.remove_edge(debtor_id, creditor_id)
+        logging.debug(f"Synchronised {len(self._dirty_edges)} deferred graph edges.")
+        self._dirty_edges = set()
+
+    def remove_debt_edge(self, debtor_id, creditor_id):
+        """Removes the graph edge of a settled debt, or records it when updates are deferred."""
+        if self.defer_graph_updates:
+            self._dirty_edges.add((debtor_id, creditor_id))
+        elif not self._graph_stale and self.graph.has_edge(debtor_id, creditor_id):
+            self.graph.remove_edge(debtor_id, creditor_id)
+
+    @classmethod
+    def make_streams(cls, seed):
+        """
+        Returns {stream name: generator} for `STREAMS`.
+
+        A seeded network gets one `random.Random` per stream, derived from `seed` and
+        the stream's position. An unseeded network has none (see `stream`).
+        """
+        if seed is None:
+            return None
+        return {name: random.Random(int(np.random.SeedSequence(seed, spawn_key=(k,)).generate_state(1)[0]))
+                for k, name in enumerate(cls.STREAMS)}
+
+    def stream(self, name):
+        """Gets the random number generator of stream `name` (the global `random` if unseeded)."""
+        return self.streams[name] if self.streams is not None else random
+
+    @classmethod
+    def describe(cls, mini, maxi, seed=None, equity_range=(50, 1000), debt_range=(50, 1000),
+                 debt_fraction=(0.1, 0.5), reciprocity=0.3, shock=0.0, antithetic=False):
+        """Returns the parameters that fully determine a seeded network, without generating it."""
+        return {
+            'mini': mini,
+            'maxi': maxi,
+            'seed': seed,
+            'equity_range': list(equity_range),
+            'debt_range': list(debt_range),
+            'debt_fraction': list(debt_fraction),
+            'reciprocity': reciprocity,
+            'shock': shock,
+            'antithetic': antithetic,
+            'generator_version': cls.GENERATOR_VERSION,
+        }
+
+    def generator_params(self):
+        """Returns the parameters that fully determine this network, if it is seeded."""
+        return self.describe(self.mini, self.maxi, self.seed, self.equity_range, self.debt_range,
+                             self.debt_fraction, self.reciprocity, self.shock, self.antithetic)
+
     def init_network(self):
         """Creates nodes and edges for a new network."""
-        self.size = random.randint(self.mini, self.maxi)
-        self.graph = nx.DiGraph()
+        topology = self.stream('topology')
+        self.size = topology.randint(self.mini, self.maxi)
+        self.invalidate_graph()
         self.nodes = []
 
         # Step 1: Create node data placeholders
         temp_nodes_data = []
         for i in range(self.size):
-            equity = random.randint(50, 1000)
+            equity = self.draw_equity()
             temp_nodes_data.append({'id': i, 'equity': equity, 'debts': {}})
-            self.graph.add_node(i, equity=equity)
 
         # Step 2: Create Node objects and assign initial debts
-        extra_debts_count = [max(0, int(self.size * random.uniform(0.1, 0.5)) - 1) for _ in range(self.size)]
+        extra_debts_count = [max(0, int(self.size * topology.uniform(*self.debt_fraction)) - 1) for _ in range(self.size)]
 
         for i in range(self.size):
             current_id = i
@@ -44,35 +164,89 @@ class Network:
                 # Check if link creation was successful (found unique debtor)
                 if debtor_id is not None:
                     debts[debtor_id] = debt_value
-                    self.graph.add_edge(current_id, debtor_id, debt=debt_value)
 
             for _ in range(extra_debts_count[i]):
                  if len(debts) < self.size - 1:
                     debtor_id, debt_value = self.create_debt_link(current_id, debts)
                     if debtor_id is not None:
                         debts[debtor_id] = debt_value
-                        self.graph.add_edge(current_id, debtor_id, debt=debt_value)
 
             node = Node(current_id, temp_nodes_data[i]['equity'], debts)
             self.nodes.append(node)
 
-        # Step 3: Add potential reciprocal debts
-        edges_to_consider = list(self.graph.edges())
+        # Step 3: Add potential reciprocal debts (edges in node, then debt order)
+        edges_to_consider = [(node.id, creditor_id) for node in self.nodes for creditor_id in node.debts]
         for u, v in edges_to_consider:
-             if random.random() < 0.3 and not self.graph.has_edge(v, u):
-                reciprocal_debt_value = random.randint(50, 1000)
+             if topology.random() < self.reciprocity and u not in self.nodes[v].debts:
+                reciprocal_debt_value = topology.randint(*self.debt_range)
                 node_v = self.get_node_by_id(v)
                 if node_v:
-                    self.graph.add_edge(v, u, debt=reciprocal_debt_value)
                     node_v.debts[u] = reciprocal_debt_value
                     logging.debug(f"Added reciprocal debt from {v} to {u}: {reciprocal_debt_value}")
                 else:
                      logging.warning(f"Could not find node {v} to add reciprocal debt.")
 
-        # Final Step: Save the initial state for reset
-        self.original_graph = self.graph.copy()
+        self.attach_nodes()
         logging.info(f"Initialized network with {self.size} nodes.")
 
+    def draw_equity(self):
+        """Draws one node's external equity from the equity stream, then applies its shock."""
+        low, high = self.equity_range
+        equity = self.stream('equity').randint(low, high)
+        if self.antithetic:
+            equity = low + high - equity
+        if self.shock:
+            draw = self.stream('shock').random()
+            equity *= 1 - self.shock * (1 - draw if self.antithetic else draw)
+        return equity
+
+    @classmethod
+    def from_arrays(cls, equity, debtor, creditor, amount):
+        """Builds a network from node equities and (debtor, creditor, amount) edge arrays."""
+        network = cls.__new__(cls)
+        network.mini = network.maxi = network.size = len(equity)
+        network.seed = None
+        network.streams = None
+        network.defer_graph_updates = False
+        network.equity_range = (50, 1000)
+        network.debt_range = (50, 1000)
+        network.debt_fraction = (0.1, 0.5)
+        network.reciprocity = 0.3
+        network.shock = 0.0
+        network.antithetic = False
+
+        debts = [{} for _ in range(network.size)]
+        for u, v, value in zip(np.asarray(debtor).tolist(), np.asarray(creditor).tolist(),
+                               np.asarray(amount).tolist()):
+            debts[u][v] = value
+
+        network.invalidate_graph()
+        network.nodes = [Node(i, node_equity, debts[i]) for i, node_equity in enumerate(np.asarray(equity).tolist())]
+        network.attach_nodes()
+        return network
+
+    def to_arrays(self):
+        """
+        Returns the current state as NumPy arrays.
+
+        Returns:
+            tuple: (equity, debtor, creditor, amount) where edge k means `debtor[k]`
+            owes `creditor[k]` the amount `amount[k]`, in node and debt-dict order.
+        """
+        equity = np.array([node.equity for node in self.nodes], dtype=np.float64)
+        edge_count = sum(len(node.debts) for node in self.nodes)
+        debtor = np.empty(edge_count, dtype=np.int64)
+        creditor = np.empty(edge_count, dtype=np.int64)
+        amount = np.empty(edge_count, dtype=np.float64)
+        k = 0
+        for node in self.nodes:
+            for creditor_id, debt_value in node.debts.items():
+                debtor[k] = node.id
+                creditor[k] = creditor_id
+                amount[k] = debt_value
+                k += 1
+        return equity, debtor, creditor, amount
+
     def get_node_by_id(self, node_id):
         """Helper to find a node object by its ID."""
         if 0 <= node_id < len(self.nodes):
@@ -85,16 +259,55 @@ class Network:
         debtor_id = self.get_unique_debtor(current_id, existing_debts, self.size)
         if debtor_id is None:
             return None, None
-        debt_value = random.randint(50, 1000)
+        debt_value = self.stream('topology').randint(*self.debt_range)
         return debtor_id, debt_value
 
+    def __setstate__(self, state):
+        """Restores a copied or unpickled network; its nodes are copied without it, so they are re-attached."""
+        self.__dict__.update(state)
+        for node in self.nodes:
+            node._network = self
+
+    def attach_nodes(self):
+        """Makes the nodes report changes to this network and recomputes the running totals."""
+        for node in self.nodes:
+            node._network = self
+        self.recompute_aggregates()
+
+    def recompute_aggregates(self):
+        """Recomputes the running totals by walking every node."""
+        self._total_equity = sum(node.equity for node in self.nodes)
+        self._total_debt = sum(node.total_debt() for node in self.nodes)
+        self._defaulted_count = sum(1 for node in self.nodes if node.defaulted)
+
+    def verify_aggregates(self, tolerance=1e-6):
+        """Raises AssertionError if a running total differs from a full recomputation."""
+        expected = {
+            'total equity': sum(node.equity for node in self.nodes),
+            'total debt': sum(node.total_debt() for node in self.nodes),
+            'defaulted count': sum(1 for node in self.nodes if node.defaulted),
+        }
+        actual = {
+            'total equity': self._total_equity,
+            'total debt': self._total_debt,
+            'defaulted count': self._defaulted_count,
+        }
+        for name, value in expected.items():
+            if abs(actual[name] - value) > tolerance * max(1.0, abs(value)):
+                raise AssertionError(f"Running {name} {actual[name]} differs from recomputed {value}")
+        return True
+
     def total_network_equity(self):
-        """Calculates the sum of equities of all nodes."""
-        return sum(node.equity for node in self.nodes)
+        """Gets the sum of equities of all nodes."""
+        if self.check_aggregates:
+            self.verify_aggregates()
+        return self._total_equity
 
     def total_network_debt(self):
-        """Calculates the sum of total debts owed by all nodes."""
-        return sum(node.total_debt() for node in self.nodes)
+        """Gets the sum of total debts owed by all nodes."""
+        if self.check_aggregates:
+            self.verify_aggregates()
+        return self._total_debt
 
     def get_unique_debtor(self, current_id, debts, size):
         """Finds a node ID (debtor) that `current_id` does not already owe money to."""
@@ -102,12 +315,14 @@ class Network:
         if not possible_debtors:
             logging.warning(f"Node {current_id} cannot find a unique debtor among {size} nodes.")
             return None
-        debtor_id = random.choice(possible_debtors)
+        debtor_id = self.stream('topology').choice(possible_debtors)
         return debtor_id
 
     def defaulted_nodes_count(self):
-        """Counts the number of nodes currently marked as defaulted."""
-        return sum(1 for node in self.nodes if node.defaulted)
+        """Gets the number of nodes currently marked as defaulted."""
+        if self.check_aggregates:
+            self.verify_aggregates()
+        return self._defaulted_count
 
     def reset(self):
         """Resets all nodes to their initial state and reconstructs the graph structure."""
@@ -117,22 +332,15 @@ class Network:
         for node in self.nodes:
             node.reset()
         
-        # Step 2: Rebuild the graph from the reset nodes' debts
-        self.graph = nx.DiGraph()
-        
-        # First add all nodes
-        for node in self.nodes:
-            self.graph.add_node(node.id, equity=node.equity)
-        
-        # Then add all edges based on node debts
-        for node in self.nodes:
-            for creditor_id, debt_value in node.debts.items():
-                if debt_value > 1e-9:  # Only add edges for significant debts
-                    self.graph.add_edge(node.id, creditor_id, debt=debt_value)
+        # Step 2: Rebuild the graph from the reset nodes' debts on its next read
+        self.invalidate_graph()
+
+        # Step 3: Resynchronise the running totals, which pick up float drift from incremental updates
+        self.recompute_aggregates()
         
         logging.info("Network has been reset to its initial state.")
         return True
 
     def survived_nodes_count(self):
-        """Counts the number of nodes currently not marked as defaulted."""
-        return sum(1 for node in self.nodes if not node.defaulted)
\ No newline at end of file
+        """Gets the number of nodes currently not marked as defaulted."""
+        return len(self.nodes) - self.defaulted_nodes_count()
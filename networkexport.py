@@ -0,0 +1,231 @@
+# Standard libraries
+import argparse
+import logging
+import os
+
+# Third-party libraries
+import numpy as np
+
+# Project modules
+from network import Network
+from compression import Compression
+from eisenbergnoe import EisenbergNoe
+
+# Rows formatted and written at a time
+CHUNK_SIZE = 100_000
+# Node colours as the GUI draws them, indexed by the default flag
+COLOURS = ('green', 'red')
+COLOUR_RGB = ((0, 128, 0), (255, 0, 0))
+FORMATS = ('graphml', 'gexf', 'arrow')
+
+GRAPHML_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<graphml xmlns="http://graphml.graphdrawing.org/xmlns" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">
+<key id="equity" for="node" attr.name="equity" attr.type="double"/>
+<key id="defaulted" for="node" attr.name="defaulted" attr.type="boolean"/>
+<key id="colour" for="node" attr.name="colour" attr.type="string"/>
+<key id="debt" for="edge" attr.name="debt" attr.type="double"/>
+<key id="paid" for="edge" attr.name="paid" attr.type="double"/>
+<graph id="network" edgedefault="directed">
+"""
+GRAPHML_NODE = ('<node id="%d"><data key="equity">%r</data><data key="defaulted">%s</data>'
+                '<data key="colour">%s</data></node>\n')
+GRAPHML_EDGE = '<edge source="%d" target="%d"><data key="debt">%r</data><data key="paid">%r</data></edge>\n'
+GRAPHML_FOOTER = "</graph>\n</graphml>\n"
+
+GEXF_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<gexf xmlns="http://www.gexf.net/1.2draft" xmlns:viz="http://www.gexf.net/1.2draft/viz" version="1.2">
+<graph defaultedgetype="directed" mode="static">
+<attributes class="node">
+<attribute id="equity" title="equity" type="double"/>
+<attribute id="defaulted" title="defaulted" type="boolean"/>
+</attributes>
+<attributes class="edge">
+<attribute id="debt" title="debt" type="double"/>
+<attribute id="paid" title="paid" type="double"/>
+</attributes>
+"""
+GEXF_NODE = ('<node id="%d"><attvalues><attvalue for="equity" value="%r"/><attvalue for="defaulted" value="%s"/>'
+             '</attvalues><viz:color r="%d" g="%d" b="%d"/></node>\n')
+GEXF_EDGE = ('<edge id="%d" source="%d" target="%d"><attvalues><attvalue for="debt" value="%r"/>'
+             '<attvalue for="paid" value="%r"/></attvalues></edge>\n')
+GEXF_FOOTER = "</edges>\n</graph>\n</gexf>\n"
+
+
+def network_tables(network, result=None):
+    """
+    Collects the current state of a network as node and edge arrays.
+
+    An edge is listed when its debt is still owed or something was paid on it, so
+    debts settled in full by clearing are kept with their payment.
+
+    Args:
+        result (ClearingResult): The clearing run whose payments to include; without
+            it every edge is exported with 0 paid.
+
+    Returns:
+        tuple: (nodes, edges) where nodes is {'equity', 'defaulted'} indexed by node id
+        and edges is {'source', 'target', 'debt', 'paid'}, source owing target.
+    """
+    equity, debtor, creditor, amount = network.to_arrays()
+    size = len(equity)
+    defaulted = np.fromiter((node.defaulted for node in network.nodes), dtype=bool, count=size)
+    nodes = {'equity': equity, 'defaulted': defaulted}
+    if result is None:
+        return nodes, {'source': debtor, 'target': creditor, 'debt': amount, 'paid': np.zeros(len(amount))}
+
+    payments = result.payments.tocoo()
+    # Edges keyed as debtor * size + creditor, each key appearing once per side
+    owed_keys = debtor * size + creditor
+    paid_keys = payments.row.astype(np.int64) * size + payments.col
+    keys = np.union1d(owed_keys, paid_keys)
+    debt = np.zeros(len(keys))
+    paid = np.zeros(len(keys))
+    debt[np.searchsorted(keys, owed_keys)] = amount
+    np.add.at(paid, np.searchsorted(keys, paid_keys), payments.data)
+    return nodes, {'source': keys // size, 'target': keys % size, 'debt': debt, 'paid': paid}
+
+
+def chunks(length, chunk_size):
+    """Yields slices covering range(length) in steps of `chunk_size`."""
+    for start in range(0, length, chunk_size):
+        yield slice(start, min(start + chunk_size, length))
+
+
+def write_rows(file, template, columns, chunk_size):
+    """Writes `template` filled with one row of `columns` per line, a chunk at a time."""
+    length = len(columns[0]) if columns else 0
+    for part in chunks(length, chunk_size):
+        file.write(''.join(map(template.__mod__, zip(*(column[part].tolist() for column in columns)))))
+
+
+def write_graphml(path, nodes, edges, chunk_size=CHUNK_SIZE):
+    """
+    Writes node and edge tables (as `network_tables`) to a GraphML file.
+
+    Nodes carry 'equity', 'defaulted' and 'colour', edges 'debt' and 'paid'. Node ids
+    are the node indices.
+    """
+    defaulted = nodes['defaulted']
+    flags = np.array(['false', 'true'])[defaulted.astype(np.int8)]
+    colours = np.array(COLOURS)[defaulted.astype(np.int8)]
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(GRAPHML_HEADER)
+        write_rows(file, GRAPHML_NODE, (np.arange(len(defaulted)), nodes['equity'], flags, colours), chunk_size)
+        write_rows(file, GRAPHML_EDGE, (edges['source'], edges['target'], edges['debt'], edges['paid']), chunk_size)
+        file.write(GRAPHML_FOOTER)
+    logging.info(f"Wrote {len(defaulted)} nodes and {len(edges['source'])} edges to {path}.")
+
+
+def write_gexf(path, nodes, edges, chunk_size=CHUNK_SIZE):
+    """
+    Writes node and edge tables (as `network_tables`) to a GEXF 1.2 file.
+
+    Nodes carry 'equity' and 'defaulted' and are coloured with `viz:color`, edges
+    carry 'debt' and 'paid'.
+    """
+    defaulted = nodes['defaulted']
+    index = defaulted.astype(np.int8)
+    flags = np.array(['false', 'true'])[index]
+    rgb = np.array(COLOUR_RGB)[index]
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(GEXF_HEADER)
+        file.write('<nodes>\n')
+        write_rows(file, GEXF_NODE, (np.arange(len(defaulted)), nodes['equity'], flags, rgb[:, 0], rgb[:, 1], rgb[:, 2]),
+                   chunk_size)
+        file.write('</nodes>\n<edges>\n')
+        write_rows(file, GEXF_EDGE, (np.arange(len(edges['source'])), edges['source'], edges['target'], edges['debt'],
+                                     edges['paid']), chunk_size)
+        file.write(GEXF_FOOTER)
+    logging.info(f"Wrote {len(defaulted)} nodes and {len(edges['source'])} edges to {path}.")
+
+
+def require_pyarrow():
+    """Imports pyarrow, which only the Arrow export needs."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError as error:
+        raise ImportError("Arrow export needs pyarrow, which is not installed (pip install pyarrow).") from error
+    return pyarrow
+
+
+def write_arrow(nodes_path, edges_path, nodes, edges, chunk_size=CHUNK_SIZE):
+    """
+    Writes node and edge tables (as `network_tables`) to two Arrow IPC files.
+
+    The node file has columns 'id', 'equity', 'defaulted' and 'colour' (dictionary
+    encoded), the edge file 'source', 'target', 'debt' and 'paid'. Each chunk is one
+    record batch.
+    """
+    pa = require_pyarrow()
+    defaulted = nodes['defaulted']
+    colours = pa.array(COLOURS)
+    node_columns = {
+        'id': np.arange(len(defaulted), dtype=np.int64),
+        'equity': nodes['equity'],
+        'defaulted': defaulted,
+    }
+    edge_columns = {name: edges[name] for name in ('source', 'target', 'debt', 'paid')}
+    node_schema = pa.schema([('id', pa.int64()), ('equity', pa.float64()), ('defaulted', pa.bool_()),
+                             ('colour', pa.dictionary(pa.int8(), pa.string()))])
+    edge_schema = pa.schema([('source', pa.int64()), ('target', pa.int64()), ('debt', pa.float64()),
+                             ('paid', pa.float64())])
+    with pa.OSFile(nodes_path, 'wb') as sink, pa.ipc.new_file(sink, node_schema) as writer:
+        for part in chunks(len(defaulted), chunk_size):
+            arrays = [pa.array(column[part]) for column in node_columns.values()]
+            arrays.append(pa.DictionaryArray.from_arrays(pa.array(defaulted[part].astype(np.int8)), colours))
+            writer.write_batch(pa.record_batch(arrays, schema=node_schema))
+    with pa.OSFile(edges_path, 'wb') as sink, pa.ipc.new_file(sink, edge_schema) as writer:
+        for part in chunks(len(edge_columns['source']), chunk_size):
+            writer.write_batch(pa.record_batch([pa.array(np.asarray(column[part])) for column in edge_columns.values()],
+                                               schema=edge_schema))
+    logging.info(f"Wrote {len(defaulted)} nodes to {nodes_path} and {len(edges['source'])} edges to {edges_path}.")
+
+
+def export_network(network, path, result=None, chunk_size=CHUNK_SIZE):
+    """
+    Writes the current state of `network` in the format given by the extension of `path`.
+
+    '.graphml' and '.gexf' write one file. '.arrow' writes '<name>.nodes.arrow' and
+    '<name>.edges.arrow' next to `path`.
+
+    Returns:
+        list: The paths written.
+    """
+    root, extension = os.path.splitext(path)
+    kind = extension.lstrip('.').lower()
+    if kind not in FORMATS:
+        raise ValueError(f"Unknown export format: {extension!r}. Expected one of {FORMATS}.")
+    nodes, edges = network_tables(network, result)
+    if kind == 'graphml':
+        write_graphml(path, nodes, edges, chunk_size)
+        return [path]
+    if kind == 'gexf':
+        write_gexf(path, nodes, edges, chunk_size)
+        return [path]
+    paths = [f"{root}.nodes.arrow", f"{root}.edges.arrow"]
+    write_arrow(*paths, nodes, edges, chunk_size)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate, compress and clear a network and export it for graph tools.")
+    parser.add_argument('path', help="Output file: .graphml, .gexf or .arrow.")
+    parser.add_argument('--mini', type=int, default=200, help="Minimum number of nodes.")
+    parser.add_argument('--maxi', type=int, default=200, help="Maximum number of nodes.")
+    parser.add_argument('--seed', type=int, default=0, help="Network seed.")
+    parser.add_argument('--engine', default='vectorized', help="EisenbergNoe engine.")
+    parser.add_argument('--compress', action='store_true', help="Compress the network before clearing.")
+    parser.add_argument('--no-clear', action='store_true', help="Export the generated network without clearing it.")
+    args = parser.parse_args()
+
+    network = Network(args.mini, args.maxi, seed=args.seed)
+    if args.compress:
+        Compression(network).apply()
+    result = None if args.no_clear else EisenbergNoe(network).apply(engine=args.engine)
+    for path in export_network(network, args.path, result):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,17 +2,85 @@
 import logging
 import copy
 
+
+class DebtDict(dict):
+    """Debts dictionary (creditor_id: amount_owed) that reports every change to its owner node."""
+    def __init__(self, items=(), owner=None):
+        super().__init__(items)
+        self.owner = owner
+
+    def __reduce__(self):
+        # Copies and pickles carry the debts only; the owner re-attaches itself
+        return (DebtDict, (dict(self),))
+
+    def _changed(self, delta):
+        if self.owner is not None and delta:
+            self.owner._debt_changed(delta)
+
+    def __setitem__(self, key, value):
+        old = self.get(key, 0)
+        super().__setitem__(key, value)
+        self._changed(value - old)
+
+    def __delitem__(self, key):
+        old = self[key]
+        super().__delitem__(key)
+        self._changed(-old)
+
+    def pop(self, key, *default):
+        had_key = key in self
+        value = super().pop(key, *default)
+        if had_key:
+            self._changed(-value)
+        return value
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._changed(-value)
+        return key, value
+
+    def setdefault(self, key, default=0):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        total = sum(self.values())
+        super().clear()
+        self._changed(-total)
+
+
 class Node:
     """Represents a single financial entity (node) in the network."""
     # Constructor of the class, called when an object of the class is initialized
     def __init__(self, id, equity, debts):
         self.id = id  # Assigns the provided id to the instance
+        self._network = None # Network whose running totals this node keeps up to date
         self._equity = equity # Use protected attribute
         self.initial_equity = equity  # Stores the initial equity value for reset
-        self._debts = debts # Use protected attribute
+        self._debts = DebtDict(debts, owner=self) # Use protected attribute
         self.initial_debts = copy.deepcopy(debts)  # Stores a deep copy of initial debts for reset
         self.update_color() # Initial calculation of defaulted status and color
 
+    def __getstate__(self):
+        """Copies and pickles the node without its network; a copied `Network` re-attaches its nodes."""
+        state = self.__dict__.copy()
+        state['_network'] = None
+        return state
+
+    def __setstate__(self, state):
+        """Restores a copied or unpickled node and re-attaches its debts dictionary."""
+        self.__dict__.update(state)
+        self._debts.owner = self
+
     # Creates a getter for the private variable _equity
     @property
     def equity(self):
@@ -23,6 +91,8 @@ class Node:
     @equity.setter
     def equity(self, value):
         """Sets the equity and updates node status."""
+        if self._network is not None:
+            self._network._total_equity += value - self._equity
         self._equity = value
         self.update_color()  # Calls the update_color method after the equity is changed
 
@@ -39,9 +109,17 @@ class Node:
         # Ensure value is a dictionary if setting directly
         if not isinstance(value, dict):
              raise TypeError("Debts must be a dictionary.")
-        self._debts = value
+        old_total = self.total_debt()
+        self._debts.owner = None
+        self._debts = DebtDict(value, owner=self)
+        self._debt_changed(self.total_debt() - old_total)
         self.update_color()  # Calls the update_color method after the debts are changed
 
+    def _debt_changed(self, delta):
+        """Forwards a change in this node's total debt to its network's running total."""
+        if self._network is not None:
+            self._network._total_debt += delta
+
     # Calculates and returns the total debt
     def total_debt(self):
         """Calculates the total amount owed by this node."""
@@ -59,5 +137,8 @@ class Node:
         """Updates the node's defaulted status and color based on current equity and debt."""
         current_equity = self.equity
         current_total_debt = self.total_debt()
+        was_defaulted = getattr(self, 'defaulted', None)
         self.defaulted = current_equity < current_total_debt
-        self.colour = 'red' if self.defaulted else 'green'
\ No newline at end of file
+        self.colour = 'red' if self.defaulted else 'green'
+        if self._network is not None and was_defaulted is not None and was_defaulted != self.defaulted:
+            self._network._defaulted_count += 1 if self.defaulted else -1
@@ -0,0 +1,326 @@
+# Standard libraries
+import argparse
+import itertools
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Third-party libraries
+import numpy as np
+
+# Project modules
+from simulation import METRIC_NAMES, simulation_trial
+from runningstatistics import RunningStatistics
+from lazyimport import lazy_import
+
+# Loaded when tables and intervals are first built, not in every sweep worker
+pd = lazy_import('pandas')
+stats = lazy_import('scipy.stats')
+
+# Network generator parameters a sweep can vary; the pairs are (low, high) ranges
+INTEGER_PARAMS = ('mini', 'maxi')
+PAIR_PARAMS = ('equity_range', 'debt_range', 'debt_fraction')
+# Ranges that `Network` draws integers from
+INTEGER_PAIR_PARAMS = ('equity_range', 'debt_range')
+SWEEP_PARAMS = INTEGER_PARAMS + PAIR_PARAMS + ('reciprocity', 'shock')
+# Pipelines compared in the results table, and the name of their paired difference
+PIPELINES = ('EN', 'Compression+EN')
+DIFFERENCE = 'Compression+EN - EN'
+
+
+def grid(**axes):
+    """
+    Returns every combination of the given parameter values.
+
+    Example:
+        grid(maxi=[20, 50], reciprocity=[0.1, 0.3, 0.5]) gives 6 parameter dicts.
+    """
+    for name in axes:
+        check_param(name)
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+def latin_hypercube(samples, seed=None, **ranges):
+    """
+    Returns `samples` parameter dicts from a Latin hypercube over the given ranges.
+
+    A scalar parameter takes (low, high). A range parameter such as `equity_range`
+    takes ((low_min, low_max), (high_min, high_max)), and each bound is its own
+    dimension. `mini`, `maxi` and the bounds of integer ranges are rounded to
+    integers. Every sampled range, and `mini`/`maxi` when both are sampled, is
+    sorted so that low <= high, as `Network` needs.
+    """
+    dimensions = []
+    for name, bounds in ranges.items():
+        check_param(name)
+        if name in PAIR_PARAMS:
+            dimensions += [(name, 0, bounds[0]), (name, 1, bounds[1])]
+        else:
+            dimensions.append((name, None, bounds))
+
+    rng = np.random.default_rng(seed)
+    # One stratum per sample in every dimension, strata shuffled independently
+    strata = np.argsort(rng.random((len(dimensions), samples)), axis=1)
+    unit = (strata + rng.random((len(dimensions), samples))) / samples
+
+    points = []
+    for j in range(samples):
+        point = {}
+        for d, (name, position, (low, high)) in enumerate(dimensions):
+            value = float(low + unit[d, j] * (high - low))
+            if name in INTEGER_PARAMS or name in INTEGER_PAIR_PARAMS:
+                value = int(round(value))
+            if position is None:
+                point[name] = value
+            else:
+                point.setdefault(name, [None, None])[position] = value
+        for name in PAIR_PARAMS:
+            if name in point:
+                point[name] = sorted(point[name])
+        if 'mini' in point and 'maxi' in point:
+            point['mini'], point['maxi'] = sorted((point['mini'], point['maxi']))
+        points.append(point)
+    return points
+
+
+def check_param(name):
+    if name not in SWEEP_PARAMS:
+        raise ValueError(f"Cannot sweep '{name}'. Expected one of {SWEEP_PARAMS}.")
+
+
+def check_point(point):
+    """Raises ValueError if `point`, merged with the base parameters, is not a valid `Network`."""
+    if 'mini' not in point or 'maxi' not in point:
+        raise ValueError(f"Point {point} needs both mini and maxi.")
+    if point['mini'] > point['maxi']:
+        raise ValueError(f"Point {point} has mini > maxi; sample both or adjust the base parameters.")
+    for name in PAIR_PARAMS:
+        if name in point and point[name][0] > point[name][1]:
+            raise ValueError(f"Point {point} has {name} low > high.")
+
+
+def mean_interval(values, confidence=0.95):
+    """Returns (n, mean, std, ci_low, ci_high) of `values` with a Student-t interval on the mean."""
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    mean = float(values.mean()) if n else np.nan
+    if n < 2:
+        return n, mean, np.nan, np.nan, np.nan
+    std = float(values.std(ddof=1))
+    half_width = stats.t.ppf(0.5 + confidence / 2, n - 1) * std / np.sqrt(n)
+    return n, mean, std, mean - half_width, mean + half_width
+
+
+class ParameterSweep:
+    """
+    Runs seeded `Simulation` trials over a list of network parameter points.
+
+    Every point runs the trials seeded `seed`, ..., `seed + trials - 1`, so points are
+    compared on common random numbers. Each finished trial is appended to a JSON-lines
+    `checkpoint`. A restarted sweep with the same checkpoint only runs the trials
+    still missing.
+
+    With `precision` set, `trials` is a budget. Trials run in batches of `min_trials`
+    per point, and a point stops as soon as the confidence half-widths of its results
+    columns are within `precision`.
+    """
+    def __init__(self, points, trials=10, seed=0, workers=None, checkpoint=None, cache_directory=None,
+                 base_params=None, precision=None, min_trials=5, confidence=0.95):
+        """
+        Args:
+            points (list): Parameter dicts, e.g. from `grid` or `latin_hypercube`.
+            trials (int): Seeded trials per point.
+            seed (int): Seed of the first trial.
+            workers (int): Worker processes; None uses the CPU count, 1 runs in this process.
+            checkpoint (str): JSON-lines file of finished trials (no checkpointing if None).
+            cache_directory (str): `ResultCache` directory shared by the trials.
+            base_params (dict): Network parameters every point starts from.
+            precision (dict or float): Target half-width per results column, as in `Simulation`.
+            min_trials (int): Trials a point runs before it can stop, and the batch size after that.
+            confidence (float): Confidence level of the intervals.
+
+        Raises:
+            ValueError: If a point merged with `base_params` has mini > maxi or a range with low > high.
+        """
+        self.base_params = base_params if base_params is not None else {'mini': 5, 'maxi': 20}
+        self.points = [{**self.base_params, **point} for point in points]
+        for point in self.points:
+            check_point(point)
+        self.trials = trials
+        self.seed = seed
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.checkpoint = checkpoint
+        self.cache_directory = cache_directory
+        self.precision = precision
+        self.min_trials = min_trials
+        self.confidence = confidence
+        self.rows = {} # (point index, trial seed) -> results row
+
+    @staticmethod
+    def point_key(point):
+        return json.dumps(point, sort_keys=True)
+
+    def load_checkpoint(self):
+        """Loads the finished trials of this sweep's points from the checkpoint; returns how many."""
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return 0
+        index = {self.point_key(point): i for i, point in enumerate(self.points)}
+        with open(self.checkpoint) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError: # A line cut short by an interruption
+                    continue
+                i = index.get(self.point_key(record['params']))
+                if i is not None:
+                    self.rows[(i, record['seed'])] = record['row']
+        logging.info(f"Loaded {len(self.rows)} finished trials from {self.checkpoint}")
+        return len(self.rows)
+
+    def pending(self, batch=None):
+        """Returns the (point index, trial seed) pairs still to run, at most `batch` per point."""
+        tasks = []
+        for i in range(len(self.points)):
+            if self.precision_reached(i):
+                continue
+            missing = [seed for seed in range(self.seed, self.seed + self.trials) if (i, seed) not in self.rows]
+            tasks += [(i, seed) for seed in missing[:batch]]
+        return tasks
+
+    def precision_reached(self, i):
+        """Returns True if point `i` can stop early: enough trials and every half-width on target."""
+        if self.precision is None:
+            return False
+        statistics = RunningStatistics()
+        for seed in range(self.seed, self.seed + self.trials):
+            if (i, seed) in self.rows:
+                statistics.update(self.rows[(i, seed)])
+        return statistics.count >= self.min_trials and statistics.reached(self.precision, self.confidence)
+
+    def open_checkpoint(self):
+        """Opens the checkpoint for appending, ending any line an interruption cut short."""
+        with open(self.checkpoint, 'ab+') as file:
+            if file.tell():
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    file.write(b'\n')
+        return open(self.checkpoint, 'a')
+
+    def record(self, i, seed, row, file):
+        self.rows[(i, seed)] = row
+        if file is not None:
+            file.write(json.dumps({'params': self.points[i], 'seed': seed, 'row': row}) + "\n")
+            file.flush()
+
+    def run(self, output=None):
+        """
+        Runs the missing trials and returns the tidy results table.
+
+        Args:
+            output (str): Optional path to write the table to (.csv or .xlsx).
+        """
+        self.load_checkpoint()
+        logging.info(f"Sweep: {len(self.points)} points x {self.trials} trials, {len(self.pending())} to run")
+        # Adaptive sweeps re-check every point's precision after each batch
+        batch = self.min_trials if self.precision is not None else None
+
+        file = self.open_checkpoint() if self.checkpoint is not None else None
+        executor = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        try:
+            while tasks := self.pending(batch):
+                if executor is None:
+                    for i, seed in tasks:
+                        self.record(i, seed, simulation_trial(seed, self.points[i], self.cache_directory), file)
+                else:
+                    futures = {executor.submit(simulation_trial, seed, self.points[i], self.cache_directory): (i, seed)
+                               for i, seed in tasks}
+                    for future in as_completed(futures):
+                        self.record(*futures[future], future.result(), file)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            if file is not None:
+                file.close()
+
+        table = self.results_table()
+        if output is not None:
+            if output.endswith('.xlsx'):
+                table.to_excel(output, index=False)
+            else:
+                table.to_csv(output, index=False)
+            logging.info(f"Sweep results saved to {output}")
+        return table
+
+    def trials_frame(self):
+        """Returns one row per finished trial: point index, seed and both pipelines' metrics (Pareto as 1/0)."""
+        records = []
+        for (i, seed), row in sorted(self.rows.items()):
+            record = {'point': i, 'seed': seed}
+            for key, value in row.items():
+                record[key] = float(value == 'Yes') if key.endswith('Pareto Improvement') else value
+            records.append(record)
+        return pd.DataFrame(records)
+
+    def results_table(self, confidence=None):
+        """
+        Returns the tidy results table.
+
+        It has one row per point, metric and pipeline: EN, Compression+EN, and their
+        paired per-trial difference. Each row holds the trial count, mean, standard
+        deviation and a `confidence` Student-t interval (the sweep's own `confidence`
+        by default). Pareto Improvement is the fraction of trials answering Yes.
+        """
+        confidence = self.confidence if confidence is None else confidence
+        trials = self.trials_frame()
+        records = []
+        for i, point in enumerate(self.points):
+            point_trials = trials[trials['point'] == i] if len(trials) else trials
+            if not len(point_trials):
+                continue
+            for metric in METRIC_NAMES:
+                columns = {pipeline: point_trials[f'{pipeline} {metric}'] for pipeline in PIPELINES}
+                columns[DIFFERENCE] = columns['Compression+EN'] - columns['EN']
+                for pipeline, values in columns.items():
+                    n, mean, std, low, high = mean_interval(values, confidence)
+                    records.append({'point': i, **flatten_params(point), 'metric': metric, 'pipeline': pipeline,
+                                    'n': n, 'mean': mean, 'std': std, 'ci_low': low, 'ci_high': high})
+        return pd.DataFrame(records)
+
+
+def flatten_params(point):
+    """Spreads (low, high) range parameters over `<name>_low` and `<name>_high` columns."""
+    flat = {}
+    for name, value in point.items():
+        if name in PAIR_PARAMS:
+            flat[f'{name}_low'], flat[f'{name}_high'] = value
+        else:
+            flat[name] = value
+    return flat
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a parameter sweep of EN versus Compression+EN.")
+    parser.add_argument('spec', help="JSON file: {'grid': {param: [values]}} or "
+                                     "{'latin_hypercube': {param: bounds}, 'samples': n}")
+    parser.add_argument('--trials', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--checkpoint', default='sweep_checkpoint.jsonl')
+    parser.add_argument('--cache', default=None, help="Result cache directory.")
+    parser.add_argument('--output', default='sweep_results.csv')
+    parser.add_argument('--precision', type=float, default=None,
+                        help="Stop a point early once every confidence half-width is below this.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    with open(args.spec) as spec_file:
+        spec = json.load(spec_file)
+    if 'grid' in spec:
+        points = grid(**spec['grid'])
+    else:
+        points = latin_hypercube(spec['samples'], seed=args.seed, **spec['latin_hypercube'])
+    sweep = ParameterSweep(points, args.trials, args.seed, args.workers, args.checkpoint, args.cache,
+                           spec.get('base_params'), spec.get('precision', args.precision))
+    print(sweep.run(args.output).to_string())
@@ -0,0 +1,170 @@
+# Standard libraries
+import hashlib
+import json
+
+# Third-party libraries
+import numpy as np
+
+# Project modules
+from lazyimport import lazy_import
+
+# Only the matrix views need SciPy
+sp = lazy_import('scipy.sparse')
+
+
+def state_fingerprint(equity, debtor, creditor, amount):
+    """Returns a hash of a pre-clearing (equity, debtor, creditor, amount) state."""
+    digest = hashlib.sha256()
+    for array, dtype in ((equity, np.float64), (debtor, np.int64), (creditor, np.int64), (amount, np.float64)):
+        array = np.ascontiguousarray(array, dtype=dtype)
+        digest.update(str(len(array)).encode('utf-8'))
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def sparse_entries(values, tolerance=0.0):
+    """Returns (indices, values) of the entries of `values` whose magnitude exceeds `tolerance`."""
+    indices = np.flatnonzero(np.abs(values) > tolerance)
+    return indices.astype(np.int64), values[indices]
+
+
+class IterationDeltas:
+    """
+    Collects how the amount paid on each edge changes, one iteration at a time.
+
+    Only the previous iteration's payments are kept dense. Each iteration is stored
+    as the sparse (edge, change) entries of its difference from the one before.
+    """
+    def __init__(self, edge_count):
+        self.previous = np.zeros(edge_count)
+        self.indptr = [0]
+        self.indices = []
+        self.values = []
+
+    def add(self, paid):
+        """Records an iteration that ends with `paid` paid on every edge."""
+        changed, change = sparse_entries(paid - self.previous)
+        self.indices.append(changed)
+        self.values.append(change)
+        self.indptr.append(self.indptr[-1] + len(changed))
+        self.previous = paid
+
+    def arrays(self):
+        """Returns (indptr, edge indices, amounts) as `PaymentRecord` stores them."""
+        return (np.array(self.indptr, dtype=np.int64), np.concatenate(self.indices or [np.empty(0, np.int64)]),
+                np.concatenate(self.values or [np.empty(0)]))
+
+
+class PaymentRecord:
+    """
+    Record of one clearing run that can be saved and replayed without iterating.
+
+    It holds the pre-clearing edges, what was paid and what is still owed on each of
+    them (only the non-zero entries), the final equities, and optionally how the
+    payment on each edge changed in every iteration. `EisenbergNoe.replay` writes the
+    end state back to a network in the same pre-clearing state.
+    """
+    VERSION = 1
+
+    def __init__(self, fingerprint, equity_size, debtor, creditor, paid, remaining, final_equity,
+                 iterations, converged, engine, deltas=None):
+        """
+        Args:
+            fingerprint (str): `state_fingerprint` of the pre-clearing state.
+            equity_size (int): Number of nodes.
+            debtor, creditor (np.ndarray): The pre-clearing edges.
+            paid, remaining (tuple): (edge indices, amounts) paid and still owed.
+            final_equity (np.ndarray): Equity of every node after clearing.
+            deltas (tuple): (indptr, edge indices, amounts), the change of the amount paid
+                on each edge in iteration t being entries indptr[t] to indptr[t + 1].
+        """
+        self.fingerprint = fingerprint
+        self.size = equity_size
+        self.debtor = debtor
+        self.creditor = creditor
+        self.paid = paid
+        self.remaining = remaining
+        self.final_equity = final_equity
+        self.iterations = iterations
+        self.converged = converged
+        self.engine = engine
+        self.deltas = deltas
+
+    @classmethod
+    def from_clearing(cls, network, initial_state, paid, iterations, converged, engine, iteration_deltas=None):
+        """
+        Records a network that has just been cleared from `initial_state`.
+
+        Args:
+            paid (np.ndarray): Amount paid on every edge of `initial_state`.
+            iteration_deltas (IterationDeltas): The payment changes of every iteration, if tracked.
+        """
+        equity, debtor, creditor, amount = initial_state
+        index_type = np.int32 if len(equity) < 2 ** 31 else np.int64
+        remaining = np.fromiter((network.nodes[u].debts.get(v, 0.0) for u, v in zip(debtor.tolist(), creditor.tolist())),
+                                dtype=np.float64, count=len(debtor))
+        final_equity = np.fromiter((node.equity for node in network.nodes), dtype=np.float64, count=len(equity))
+        deltas = iteration_deltas.arrays() if iteration_deltas is not None else None
+        return cls(state_fingerprint(*initial_state), len(equity), debtor.astype(index_type), creditor.astype(index_type),
+                   sparse_entries(paid), sparse_entries(remaining), final_equity, iterations, converged, engine, deltas)
+
+    def matches(self, equity, debtor, creditor, amount):
+        """Checks whether a pre-clearing state is the one this record was made from."""
+        return state_fingerprint(equity, debtor, creditor, amount) == self.fingerprint
+
+    def dense(self, entries):
+        """Expands (edge indices, amounts) to one amount per edge."""
+        values = np.zeros(len(self.debtor))
+        values[entries[0]] = entries[1]
+        return values
+
+    def paid_amounts(self):
+        """Returns the amount paid on every pre-clearing edge."""
+        return self.dense(self.paid)
+
+    def remaining_amounts(self):
+        """Returns the amount still owed on every pre-clearing edge after clearing."""
+        return self.dense(self.remaining)
+
+    def payment_matrix(self):
+        """Returns the sparse (debtor x creditor) matrix of amounts paid."""
+        indices, values = self.paid
+        return sp.csr_matrix((values, (self.debtor[indices], self.creditor[indices])), shape=(self.size, self.size))
+
+    def iteration_matrix(self, iteration):
+        """Returns the sparse (debtor x creditor) change in payments made by iteration `iteration` (from 1)."""
+        if self.deltas is None:
+            raise ValueError("This payment record was made without per-iteration deltas.")
+        indptr, indices, values = self.deltas
+        start, stop = indptr[iteration - 1], indptr[iteration]
+        edges = indices[start:stop]
+        return sp.csr_matrix((values[start:stop], (self.debtor[edges], self.creditor[edges])),
+                             shape=(self.size, self.size))
+
+    def save(self, path):
+        """Saves the record as a compressed .npz file."""
+        arrays = {
+            'debtor': self.debtor, 'creditor': self.creditor,
+            'paid_edges': self.paid[0], 'paid': self.paid[1],
+            'remaining_edges': self.remaining[0], 'remaining': self.remaining[1],
+            'final_equity': self.final_equity,
+        }
+        if self.deltas is not None:
+            arrays.update(delta_indptr=self.deltas[0], delta_edges=self.deltas[1], delta_values=self.deltas[2])
+        meta = {'version': self.VERSION, 'fingerprint': self.fingerprint, 'size': self.size,
+                'iterations': int(self.iterations), 'converged': bool(self.converged), 'engine': self.engine}
+        np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Loads a record written by `save`."""
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['version'] != cls.VERSION:
+                raise ValueError(f"Unsupported payment record version: {meta['version']}")
+            deltas = None
+            if 'delta_indptr' in data:
+                deltas = (data['delta_indptr'], data['delta_edges'], data['delta_values'])
+            return cls(meta['fingerprint'], meta['size'], data['debtor'], data['creditor'],
+                       (data['paid_edges'], data['paid']), (data['remaining_edges'], data['remaining']),
+                       data['final_equity'], meta['iterations'], meta['converged'], meta['engine'], deltas)
@@ -0,0 +1,109 @@
+# Standard libraries
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import zipfile
+
+# Third-party libraries
+import numpy as np
+
+
+class ResultCache:
+    """On-disk, content-addressed cache of generated networks and their clearing outcomes."""
+    def __init__(self, directory='.network_cache', max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(**parts):
+        """Hashes the given key parts (seed, generator parameters, algorithm versions) into a cache key."""
+        canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def path_for(self, key):
+        """Returns the file path that stores the entry for `key`."""
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        """Returns the cached dict of arrays for `key`, or None on a miss."""
+        path = self.path_for(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+        except (OSError, ValueError, EOFError, zipfile.BadZipFile) as e:
+            if os.path.exists(path):
+                logging.warning(f"Discarding unreadable cache entry {path}: {e}")
+                self._remove(path)
+            return None
+        # Refresh the modification time so eviction is least-recently-used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        logging.debug(f"Cache hit for {key}")
+        return arrays
+
+    def put(self, key, arrays):
+        """Stores a dict of NumPy arrays under `key` and evicts old entries beyond the size limit."""
+        path = self.path_for(key)
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        logging.debug(f"Cached {key} at {path}")
+        self.evict(keep=path)
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached arrays for `key`, calling `compute()` and storing its result on a miss."""
+        arrays = self.get(key)
+        if arrays is None:
+            arrays = compute()
+            self.put(key, arrays)
+        return arrays
+
+    def entries(self):
+        """Returns (mtime, size, path) for every cache entry, oldest first."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.npz'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        return entries
+
+    def size_bytes(self):
+        """Returns the total size of all cache entries."""
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """Removes least-recently-used entries until the cache fits in `max_bytes`, never removing `keep`."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            self._remove(path)
+            total -= size
+            logging.debug(f"Evicted cache entry {path}")
+
+    def clear(self):
+        """Removes every entry from the cache."""
+        for _, _, path in self.entries():
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
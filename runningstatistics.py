@@ -0,0 +1,152 @@
+# Third-party libraries
+import numpy as np
+
+# Project modules
+from lazyimport import lazy_import
+
+# Only confidence intervals need scipy.stats, which is slow to import
+stats = lazy_import('scipy.stats')
+
+
+class P2Quantile:
+    """
+    Streaming estimate of one quantile with the P-squared algorithm (Jain & Chlamtac, 1985).
+
+    Five markers track the minimum, the p/2, p and (1+p)/2 quantiles and the maximum,
+    so memory is constant however many values are added.
+    """
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self.heights = [] # Marker heights; the first five values until the markers start
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def update(self, x):
+        self.count += 1
+        q = self.heights
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Move the middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if q[i - 1] < parabolic < q[i + 1]:
+                    q[i] = parabolic
+                else:
+                    q[i] += d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    def value(self):
+        """Returns the current estimate (exact while at most five values have been added)."""
+        if not self.count:
+            return np.nan
+        if self.count <= 5:
+            return float(np.quantile(self.heights, self.p))
+        return self.heights[2]
+
+
+class RunningStatistics:
+    """
+    Running count, mean and variance of the numeric columns of a stream of rows.
+
+    Each row updates the columns in O(1) with Welford's algorithm, so no rows are kept.
+    'Yes'/'No' values count as 1/0, so their mean is the fraction of Yes; their exact
+    Yes/No counts are kept as well. Optional `quantiles` are tracked per column with P-squared.
+    """
+    def __init__(self, quantiles=()):
+        self.columns = None # Column names, fixed by the first row
+        self.count = 0
+        self._mean = None
+        self._m2 = None # Sum of squared deviations from the running mean
+        self.quantile_levels = tuple(quantiles)
+        self._quantiles = None # {column: [P2Quantile per level]}
+        self._yes = {} # {Yes/No column: number of Yes}
+
+    @staticmethod
+    def as_number(value):
+        if value in ('Yes', 'No'):
+            return float(value == 'Yes')
+        return float(value)
+
+    def update(self, row):
+        """Adds one row (a dict of column: value)."""
+        if self.columns is None:
+            self.columns = list(row)
+            self._mean = np.zeros(len(self.columns))
+            self._m2 = np.zeros(len(self.columns))
+            self._quantiles = {column: [P2Quantile(p) for p in self.quantile_levels] for column in self.columns}
+            self._yes = {column: 0 for column in self.columns if row[column] in ('Yes', 'No')}
+        values = np.array([self.as_number(row[column]) for column in self.columns])
+        self.count += 1
+        delta = values - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (values - self._mean)
+        for column, value in zip(self.columns, values.tolist()):
+            for estimator in self._quantiles[column]:
+                estimator.update(value)
+        for column in self._yes:
+            self._yes[column] += row[column] == 'Yes'
+
+    def mean(self):
+        """Returns {column: running mean}."""
+        return dict(zip(self.columns or [], (self._mean if self.count else []).tolist()))
+
+    def counts(self):
+        """Returns {column: {'Yes': count, 'No': count}} for the Yes/No columns."""
+        return {column: {'Yes': yes, 'No': self.count - yes} for column, yes in self._yes.items()}
+
+    def quantiles(self):
+        """Returns {column: {level: streaming quantile estimate}}."""
+        return {column: {estimator.p: estimator.value() for estimator in estimators}
+                for column, estimators in (self._quantiles or {}).items()}
+
+    def variance(self):
+        """Returns {column: sample variance} (NaN before two rows)."""
+        if self.count < 2:
+            return {column: np.nan for column in self.columns or []}
+        return dict(zip(self.columns, (self._m2 / (self.count - 1)).tolist()))
+
+    def half_width(self, confidence=0.95):
+        """Returns {column: half-width of the Student-t confidence interval on the mean}."""
+        if self.count < 2:
+            return {column: np.inf for column in self.columns or []}
+        quantile = stats.t.ppf(0.5 + confidence / 2, self.count - 1)
+        widths = quantile * np.sqrt(self._m2 / (self.count - 1) / self.count)
+        return dict(zip(self.columns, widths.tolist()))
+
+    def reached(self, precision, confidence=0.95):
+        """
+        Returns True once every confidence half-width is within its target.
+
+        Args:
+            precision (dict or float): Target half-width per column; a number applies
+                to every column. Columns not listed are not checked.
+        """
+        if self.count < 2:
+            return False
+        widths = self.half_width(confidence)
+        targets = precision if isinstance(precision, dict) else dict.fromkeys(widths, precision)
+        return all(widths[column] <= target for column, target in targets.items())
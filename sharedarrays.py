@@ -0,0 +1,69 @@
+# Standard libraries
+from multiprocessing import shared_memory
+
+# Third-party libraries
+import numpy as np
+
+
+class SharedArrays:
+    """
+    Named NumPy arrays held in `multiprocessing.shared_memory` blocks.
+
+    The creating process owns the blocks and unlinks them on `close`. Its child
+    processes `attach` with the picklable `specs` and get views of the same memory
+    without copying. Views must be dropped before `close`.
+    """
+    def __init__(self, blocks, specs, owner):
+        self.blocks = blocks # {name: SharedMemory}
+        self._specs = specs # {name: (block name, shape, dtype string)}
+        self.owner = owner
+        self.arrays = {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=blocks[name].buf)
+                       for name, (_, shape, dtype) in specs.items()}
+
+    @classmethod
+    def create(cls, arrays):
+        """Copies `arrays` ({name: array}) into new shared memory blocks."""
+        blocks, specs = {}, {}
+        try:
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                blocks[name] = block
+                specs[name] = (block.name, array.shape, array.dtype.str)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        except BaseException:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+            raise
+        return cls(blocks, specs, owner=True)
+
+    @classmethod
+    def attach(cls, specs):
+        """Attaches to arrays created in another process from their `specs`."""
+        blocks = {}
+        for name, (block_name, _, _) in specs.items():
+            blocks[name] = shared_memory.SharedMemory(name=block_name)
+        return cls(blocks, specs, owner=False)
+
+    def specs(self):
+        """Returns what another process needs to `attach` to these arrays."""
+        return dict(self._specs)
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def close(self):
+        """Releases the views and this process's mappings; the owner also frees the memory."""
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            if self.owner:
+                block.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -4,16 +4,171 @@ import os
 import copy
 
 # Third-party libraries
-import pandas as pd
-import tkinter as tk
-import networkx as nx
+import numpy as np
+
 # Project modules
-from networkgraph import NetworkGraph
+from network import Network
+from eisenbergnoe import EisenbergNoe
+from compression import Compression
+from lazyimport import lazy_import
+from resultcache import ResultCache
+from runningstatistics import RunningStatistics
+
+# Only results tables need pandas; workers running single trials never load it
+pd = lazy_import('pandas')
+
+# Order of the per-pipeline metrics when a trial is stored as an array
+METRIC_NAMES = ['Change in Debt', 'Survived Nodes Change', 'Defaulted Nodes Change', 'Pareto Improvement']
+# Quantiles a Simulation tracks for every results column
+SUMMARY_QUANTILES = (0.05, 0.5, 0.95)
+
+
+def network_state(network):
+    """Records the metrics that trial changes are measured against."""
+    return {
+        'Total Debt': network.total_network_debt(),
+        'Survived Nodes': network.survived_nodes_count(),
+        'Defaulted Nodes': network.defaulted_nodes_count()
+    }
+
+
+def change_metrics(network, initial_data, pareto_status):
+    """Computes the change of `network` relative to `initial_data` after a pipeline has run."""
+    return {
+        'Change in Debt': network.total_network_debt() - initial_data['Total Debt'],
+        'Survived Nodes Change': network.survived_nodes_count() - initial_data['Survived Nodes'],
+        'Defaulted Nodes Change': network.defaulted_nodes_count() - initial_data['Defaulted Nodes'],
+        'Pareto Improvement': 'Yes' if pareto_status else 'No'
+    }
+
+
+def run_trial(network):
+    """
+    Runs EN and Compression+EN on `network` without a GUI.
+
+    Returns:
+        dict: The trial's arrays: the initial network, the final equities of both
+        pipelines and their metrics in `METRIC_NAMES` order (Pareto stored as 1/0).
+    """
+    # Nothing reads the graph during a headless trial, so its upkeep is deferred
+    deferred = network.defer_graph_updates
+    network.defer_graph_updates = True
+    try:
+        network.reset()
+        equity, debtor, creditor, amount = network.to_arrays()
+        initial_data = network_state(network)
+
+        result = EisenbergNoe(network).apply()
+        en_data = change_metrics(network, initial_data, result.pareto_improvement)
+        en_equity = result.final_equity
+
+        network.reset()
+        Compression(network).apply()
+        result = EisenbergNoe(network).apply()
+        compression_en_data = change_metrics(network, initial_data, result.pareto_improvement)
+        compression_en_equity = result.final_equity
+    finally:
+        network.defer_graph_updates = deferred
+
+    return {
+        'equity': equity, 'debtor': debtor, 'creditor': creditor, 'amount': amount,
+        'en_equity': en_equity,
+        'compression_en_equity': compression_en_equity,
+        'en_metrics': metrics_to_array(en_data),
+        'compression_en_metrics': metrics_to_array(compression_en_data),
+    }
+
+
+def metrics_to_array(data):
+    """Packs a pipeline's metrics dict into a float array in `METRIC_NAMES` order."""
+    return np.array([data[name] if name != 'Pareto Improvement' else float(data[name] == 'Yes')
+                     for name in METRIC_NAMES], dtype=np.float64)
+
+
+def metrics_from_array(values):
+    """Unpacks a float array produced by `metrics_to_array`."""
+    data = dict(zip(METRIC_NAMES, values.tolist()))
+    data['Survived Nodes Change'] = int(data['Survived Nodes Change'])
+    data['Defaulted Nodes Change'] = int(data['Defaulted Nodes Change'])
+    data['Pareto Improvement'] = 'Yes' if data['Pareto Improvement'] else 'No'
+    return data
+
+
+def results_row(en_data, compression_en_data):
+    """Builds one results row from the metrics of both pipelines."""
+    return {
+        **{'EN ' + k: v for k, v in en_data.items()},
+        **{'Compression+EN ' + k: v for k, v in compression_en_data.items()}
+    }
+
+
+def summary_metrics(results_df):
+    """Averages the per-trial changes and counts the Pareto outcomes of a results table."""
+    return {
+        'Avrg EN Change in Debt': results_df[
+            'EN Change in Debt'].mean(),
+        'Avrg EN+C Change in Debt': results_df[
+            'Compression+EN Change in Debt'].mean(),
+
+        'Avrg EN Survived Nodes Change': results_df[
+            'EN Survived Nodes Change'].mean(),
+        'Avrg EN+C Survived Nodes Change': results_df[
+            'Compression+EN Survived Nodes Change'].mean(),
+
+        'Avrg EN Defaulted Nodes Change': results_df[
+            'EN Defaulted Nodes Change'].mean(),
+        'Avrg EN+C Defaulted Nodes Change': results_df[
+            'Compression+EN Defaulted Nodes Change'].mean(),
+
+        'EN Pareto Improvement Yes': results_df[
+            'EN Pareto Improvement'].value_counts().get('Yes', 0),
+        'EN+C Pareto Improvement Yes': results_df[
+            'Compression+EN Pareto Improvement'].value_counts().get('Yes',
+                                                                    0),
+
+        'EN Pareto Improvement No': results_df[
+            'EN Pareto Improvement'].value_counts().get('No', 0),
+        'EN+C Pareto Improvement No': results_df[
+            'Compression+EN Pareto Improvement'].value_counts().get('No', 0)
+    }
+
+
+def summary_from_statistics(statistics):
+    """Builds the `summary_metrics` dict from running statistics of the results rows."""
+    mean = statistics.mean()
+    counts = statistics.counts()
+    summary = {}
+    for metric in METRIC_NAMES[:-1]:
+        summary[f'Avrg EN {metric}'] = mean.get(f'EN {metric}', np.nan)
+        summary[f'Avrg EN+C {metric}'] = mean.get(f'Compression+EN {metric}', np.nan)
+    for outcome in ('Yes', 'No'):
+        summary[f'EN Pareto Improvement {outcome}'] = counts.get('EN Pareto Improvement', {}).get(outcome, 0)
+        summary[f'EN+C Pareto Improvement {outcome}'] = (
+            counts.get('Compression+EN Pareto Improvement', {}).get(outcome, 0))
+    return summary
 
 
 class Simulation:
-    def __init__(self, app):
+    def __init__(self, app, trials=10, seed=None, cache=None, network_params=None,
+                 precision=None, min_trials=5, confidence=0.95, antithetic=False, keep_rows=True):
         self.app = app # The NetworkGraph application instance
+        self.trials = trials # With `precision` set, the most trials run
+        self.trials_run = 0
+        # With a seed, trial i runs headless on Network(seed=seed + i) and can be served from `cache`
+        self.seed = seed
+        self.cache = cache
+        self.network_params = network_params if network_params is not None else {'mini': 5, 'maxi': 20}
+        # Adaptive mode: stop once every results column's confidence half-width is within
+        # `precision` (a number, or {column: half-width}), after at least `min_trials`
+        self.precision = precision
+        self.min_trials = min_trials
+        self.confidence = confidence
+        # Summaries come from these running statistics over the trials of the last run;
+        # the rows themselves are only kept in `results_df` when `keep_rows` is True
+        self.statistics = RunningStatistics(quantiles=SUMMARY_QUANTILES)
+        self.keep_rows = keep_rows
+        # Antithetic design: trials 2k and 2k + 1 run on the network seeded `seed + k` and its antithetic twin
+        self.antithetic = antithetic
         self.results_df = pd.DataFrame(columns=[
             'EN Change in Debt',
             'EN Survived Nodes Change', 'EN Defaulted Nodes Change',
@@ -24,87 +179,84 @@ class Simulation:
             'Compression+EN Pareto Improvement'
         ])
 
+    def trial_key(self, trial_seed, antithetic=False):
+        """Returns the cache key of the seeded trial `trial_seed`."""
+        return self.cache.make_key(
+            network=Network.describe(seed=trial_seed, **{**self.network_params, 'antithetic': antithetic}),
+            eisenberg_noe_version=EisenbergNoe.VERSION,
+            compression_version=Compression.VERSION)
+
+    def seeded_trial(self, trial_seed, antithetic=False):
+        """Runs (or loads from the cache) the trial on the network generated from `trial_seed`."""
+        def compute():
+            return run_trial(Network(seed=trial_seed, **{**self.network_params, 'antithetic': antithetic}))
+
+        if self.cache is None:
+            arrays = compute()
+        else:
+            arrays = self.cache.get_or_compute(self.trial_key(trial_seed, antithetic), compute)
+        return results_row(metrics_from_array(arrays['en_metrics']),
+                           metrics_from_array(arrays['compression_en_metrics']))
+
+    def precision_reached(self):
+        """Returns True when adaptive mode can stop: enough trials and every half-width on target."""
+        return (self.precision is not None and self.statistics.count >= self.min_trials
+                and self.statistics.reached(self.precision, self.confidence))
+
+    def app_trial(self):
+        """Runs both pipelines on the app's current graph, then generates a new graph."""
+        # --- Get initial state of the current graph ---
+        current_network = self.app.network
+        initial_data = network_state(current_network)
+
+        # --- Run Eisenberg-Noe Only ---
+        self.app.reset() # Reset to initial state of the current graph
+        self.app.eisenberg_noe_apply() # Apply EN
+        en_data = change_metrics(current_network, initial_data, self.app.last_pareto_status)
+
+        # --- Run Compression + Eisenberg-Noe ---
+        self.app.reset() # Reset to initial state of the current graph
+        self.app.compression_apply() # Apply Compression
+        self.app.eisenberg_noe_apply() # Apply EN after Compression
+        compression_en_data = change_metrics(current_network, initial_data, self.app.last_pareto_status)
+
+        # --- Generate a new graph for the next iteration ---
+        self.app.new_graph()
+        return results_row(en_data, compression_en_data)
+
     def run(self):
-        results_list = []  # Accumulate rows for concat
-        for _ in range(10): # Run 10 iterations/graphs
-            # --- Get initial state of the current graph ---
-            current_network = self.app.network
-            initial_data = {
-                'Total Debt': current_network.total_network_debt(),
-                'Survived Nodes': current_network.survived_nodes_count(),
-                'Defaulted Nodes': current_network.defaulted_nodes_count()
-            }
-
-            # --- Run Eisenberg-Noe Only ---
-            self.app.reset() # Reset to initial state of the current graph
-            self.app.eisenberg_noe_apply() # Apply EN
-            en_data = {
-                'Change in Debt': current_network.total_network_debt() -
-                                  initial_data['Total Debt'],
-                'Survived Nodes Change': current_network.survived_nodes_count() -
-                                         initial_data['Survived Nodes'],
-                'Defaulted Nodes Change': current_network.defaulted_nodes_count() -
-                                          initial_data['Defaulted Nodes'],
-                'Pareto Improvement': 'Yes' if self.app.last_pareto_status else 'No'
-            }
-
-            # --- Run Compression + Eisenberg-Noe ---
-            self.app.reset() # Reset to initial state of the current graph
-            self.app.compression_apply() # Apply Compression
-            self.app.eisenberg_noe_apply() # Apply EN after Compression
-            compression_en_data = {
-                'Change in Debt': current_network.total_network_debt() -
-                                  initial_data['Total Debt'],
-                'Survived Nodes Change': current_network.survived_nodes_count() -
-                                         initial_data['Survived Nodes'],
-                'Defaulted Nodes Change': current_network.defaulted_nodes_count() -
-                                          initial_data['Defaulted Nodes'],
-                'Pareto Improvement': 'Yes' if self.app.last_pareto_status else 'No'
-            }
-
-            # --- Store results for this iteration ---
-            row_data = {
-                **{'EN ' + k: v for k, v in en_data.items()},
-                **{'Compression+EN ' + k: v for k, v in
-                   compression_en_data.items()}
-            }
-            results_list.append(row_data) # Add row data to list
-
-            # --- Generate a new graph for the next iteration ---
-            self.app.new_graph()
+        """
+        Runs the trials and saves their summary.
+
+        Every run starts afresh: a seeded run repeats the same trials, so counting an
+        earlier run's trials again would stop adaptive runs early and narrow the
+        intervals with samples that are not independent.
+        """
+        results_list = []  # Rows of this run, kept only with `keep_rows`
+        self.trials_run = 0
+        self.statistics = RunningStatistics(quantiles=SUMMARY_QUANTILES)
+        self.results_df = self.results_df.iloc[0:0]
+        for i in range(self.trials):
+            if self.seed is None:
+                row = self.app_trial()
+            elif self.antithetic:
+                row = self.seeded_trial(self.seed + i // 2, antithetic=i % 2 == 1)
+            else:
+                row = self.seeded_trial(self.seed + i)
+            self.statistics.update(row)
+            self.trials_run += 1
+            if self.keep_rows:
+                results_list.append(row)
+            if self.precision_reached():
+                logging.info(f"Target precision reached after {self.statistics.count} trials.")
+                break
 
         # --- Aggregate results after all iterations ---
-        new_results_df = pd.DataFrame(results_list)
-        self.results_df = pd.concat([self.results_df, new_results_df], ignore_index=True)
-
-        # --- Calculate summary metrics over the 10 runs ---
-        summary_data = {
-            'Avrg EN Change in Debt': self.results_df[
-                'EN Change in Debt'].mean(),
-            'Avrg EN+C Change in Debt': self.results_df[
-                'Compression+EN Change in Debt'].mean(),
-
-            'Avrg EN Survived Nodes Change': self.results_df[
-                'EN Survived Nodes Change'].mean(),
-            'Avrg EN+C Survived Nodes Change': self.results_df[
-                'Compression+EN Survived Nodes Change'].mean(),
-
-            'Avrg EN Defaulted Nodes Change': self.results_df[
-                'EN Defaulted Nodes Change'].mean(),
-            'Avrg EN+C Defaulted Nodes Change': self.results_df[
-                'Compression+EN Defaulted Nodes Change'].mean(),
-
-            'EN Pareto Improvement Yes': self.results_df[
-                'EN Pareto Improvement'].value_counts().get('Yes', 0),
-            'EN+C Pareto Improvement Yes': self.results_df[
-                'Compression+EN Pareto Improvement'].value_counts().get('Yes',
-                                                                        0),
-
-            'EN Pareto Improvement No': self.results_df[
-                'EN Pareto Improvement'].value_counts().get('No', 0),
-            'EN+C Pareto Improvement No': self.results_df[
-                'Compression+EN Pareto Improvement'].value_counts().get('No', 0)
-        }
+        if results_list:
+            self.results_df = pd.DataFrame(results_list)
+
+        # --- Calculate summary metrics over the runs ---
+        summary_data = summary_from_statistics(self.statistics)
 
         summary_df = pd.DataFrame([summary_data])
 
@@ -126,7 +278,15 @@ class Simulation:
             logging.error(f"Failed to save summary results to Excel: {e}")
 
         # --- Print results to console ---
-        print("\nPrinting Individual Run Data (Last 10 Runs) -------------------")
-        print(self.results_df.tail(10).to_string())
+        if self.keep_rows:
+            print(f"\nPrinting Individual Run Data (Last {self.trials_run} Runs) -------------------")
+            print(self.results_df.tail(self.trials_run).to_string())
         print("\nPrinting Summary Data (From Excel File) --------------------------")
-        print(summary_df.to_string())
\ No newline at end of file
+        print(summary_df.to_string())
+
+
+def simulation_trial(trial_seed, network_params, cache_directory=None):
+    """Runs one seeded `Simulation` trial in a worker process and returns its results row."""
+    cache = ResultCache(cache_directory) if cache_directory else None
+    simulation = Simulation(None, trials=1, seed=trial_seed, cache=cache, network_params=network_params)
+    return simulation.seeded_trial(trial_seed)
@@ -0,0 +1,425 @@
+# Standard libraries
+import argparse
+import asyncio
+import ipaddress
+import itertools
+import json
+import logging
+import socket
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+# Third-party libraries
+import numpy as np
+
+# Project modules
+from network import Network
+from eisenbergnoe import EisenbergNoe
+from compression import Compression
+from lazyimport import lazy_import
+from simulation import simulation_trial, summary_metrics
+
+# Only finished simulation jobs build a results table
+pd = lazy_import('pandas')
+
+# Job kinds the service accepts
+JOB_KINDS = ('clearing', 'simulation')
+# States after which a job produces no further events
+FINAL_STATES = ('done', 'failed', 'cancelled')
+# Clearing-job parameters giving the network as arrays
+ARRAY_PARAMS = ('equity', 'debtor', 'creditor', 'amount')
+# Clearing-job parameters passed on to `Network` when the network is generated
+NETWORK_PARAMS = ('mini', 'maxi', 'seed', 'equity_range', 'debt_range', 'debt_fraction', 'reciprocity')
+# `network_params` a simulation job may set; every trial sets its own seed
+TRIAL_NETWORK_PARAMS = tuple(name for name in NETWORK_PARAMS if name != 'seed')
+# Network size used when a job does not give 'mini' or 'maxi'
+DEFAULT_NETWORK = {'mini': 5, 'maxi': 20}
+# Largest 'mini' or 'maxi' a job may ask for
+MAX_NODES = 100_000
+# Clearing-job parameters passed on to `EisenbergNoe.apply`; no other client input reaches it
+CLEARING_OPTIONS = ('engine', 'max_iterations', 'tolerance', 'unit')
+# Every parameter each job kind accepts; anything else is refused with 400
+JOB_PARAMS = {
+    'clearing': ARRAY_PARAMS + NETWORK_PARAMS + ('compression', 'alpha', 'beta') + CLEARING_OPTIONS,
+    'simulation': ('trials', 'seed', 'network_params'),
+}
+# Largest request body accepted, in bytes
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+def is_number(value, integer=False):
+    """Returns whether a decoded JSON value is a number (a whole number if `integer`)."""
+    return not isinstance(value, bool) and isinstance(value, int if integer else (int, float))
+
+
+def check_network_params(params, allowed=NETWORK_PARAMS):
+    """
+    Checks client-sent `Network` parameters before they reach a worker process.
+
+    Raises:
+        ValueError: If `params` is not a dict of `allowed` keys, 'mini' and 'maxi' are not
+            whole numbers with 1 <= mini <= maxi <= MAX_NODES, or a range or fraction
+            is out of bounds.
+    """
+    if not isinstance(params, dict):
+        raise ValueError("Network params must be a JSON object.")
+    unknown = sorted(set(params) - set(allowed))
+    if unknown:
+        raise ValueError(f"Unknown network parameters {unknown}. Expected some of {allowed}.")
+    mini, maxi = (params.get(name, DEFAULT_NETWORK[name]) for name in ('mini', 'maxi'))
+    if not (is_number(mini, integer=True) and is_number(maxi, integer=True) and 1 <= mini <= maxi <= MAX_NODES):
+        raise ValueError(f"'mini' and 'maxi' must be whole numbers with 1 <= mini <= maxi <= {MAX_NODES}.")
+    for name, integer, upper in (('equity_range', True, None), ('debt_range', True, None), ('debt_fraction', False, 1)):
+        if name not in params:
+            continue
+        value = params[name]
+        if not (isinstance(value, list) and len(value) == 2 and all(is_number(v, integer) for v in value)
+                and 0 <= value[0] <= value[1] and (upper is None or value[1] <= upper)):
+            raise ValueError(f"'{name}' must be a [low, high] pair of non-negative numbers.")
+    if 'reciprocity' in params and not (is_number(params['reciprocity']) and 0 <= params['reciprocity'] <= 1):
+        raise ValueError("'reciprocity' must be a number between 0 and 1.")
+    if params.get('seed') is not None and not is_number(params['seed'], integer=True):
+        raise ValueError("'seed' must be a whole number.")
+
+
+def is_loopback(host):
+    """Returns whether `host`, an address or a name such as 'localhost', only resolves to loopback addresses."""
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except socket.gaierror:
+        return False
+    # IPv6 addresses may carry a '%<interface>' scope
+    return bool(addresses) and all(ipaddress.ip_address(address.split('%')[0]).is_loopback for address in addresses)
+
+
+def clearing_job(params):
+    """
+    Clears one network in a worker process.
+
+    The network is either given as arrays ('equity', 'debtor', 'creditor', 'amount')
+    or generated from 'seed', 'mini', 'maxi' and the other `Network` parameters.
+    With 'compression' set, `Compression` runs before `EisenbergNoe`, and only the
+    `CLEARING_OPTIONS` are passed on to `EisenbergNoe.apply`.
+
+    Returns:
+        dict: The result summary, final equities and defaulted flags (JSON-ready).
+    """
+    params = dict(params)
+    if 'equity' in params:
+        network = Network.from_arrays(*(np.asarray(params.pop(name)) for name in ARRAY_PARAMS))
+    else:
+        network_params = {name: params.pop(name) for name in NETWORK_PARAMS if name in params}
+        network = Network(**{**DEFAULT_NETWORK, **network_params})
+    network.defer_graph_updates = True
+
+    if params.pop('compression', False):
+        Compression(network).apply()
+    eisenberg_noe = EisenbergNoe(network, alpha=params.pop('alpha', 1.0), beta=params.pop('beta', 1.0))
+    result = eisenberg_noe.apply(**{name: params[name] for name in CLEARING_OPTIONS if name in params})
+    return {
+        'summary': {k: v.item() if isinstance(v, np.generic) else v for k, v in result.summary().items()},
+        'final_equity': result.final_equity.tolist(),
+        'defaulted': result.defaulted.tolist(),
+    }
+
+
+class Job:
+    """A submitted job, its state and the events streamed to clients."""
+    def __init__(self, id, kind, params):
+        self.id = id
+        self.kind = kind
+        self.params = params
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.events = [] # (event name, data) in the order they happened
+        self.task = None # asyncio task while the job is running
+        self.future = None # Process-pool future of the computation the job is waiting for
+        self.changed = asyncio.Condition()
+
+    async def emit(self, event, data):
+        """Records an event and wakes every client streaming this job."""
+        async with self.changed:
+            self.events.append((event, data))
+            self.changed.notify_all()
+
+    def describe(self):
+        """Returns the job's state as a JSON-ready dict."""
+        return {'id': self.id, 'kind': self.kind, 'status': self.status,
+                'result': self.result, 'error': self.error}
+
+
+class SimulationService:
+    """
+    Local HTTP/JSON service that runs clearing and simulation jobs in a process pool.
+
+    Endpoints:
+        POST   /jobs             Submit {"kind": "clearing" | "simulation", "params": {...}}.
+        GET    /jobs             List every job.
+        GET    /jobs/<id>        State and, when done, result of a job.
+        GET    /jobs/<id>/events Server-Sent Events stream of the job's progress and result.
+        DELETE /jobs/<id>        Cancel a queued or running job.
+
+    At most `workers` jobs run at once; up to `max_queue` more wait, and submissions
+    beyond that are refused with 503. A cancelled queued job frees its place at once.
+    Cancelling a running job is best-effort: the job is marked cancelled and its
+    result discarded, but a computation already running in a worker process cannot
+    be interrupted, so its pool slot is only reused once it finishes.
+    """
+    def __init__(self, host='127.0.0.1', port=8765, workers=2, max_queue=16, cache_directory=None):
+        if not is_loopback(host):
+            raise ValueError(f"The service only listens on localhost, not {host}.")
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.cache_directory = cache_directory # Shared by simulation trials when set
+        self.max_queue = max_queue
+        self.queue = asyncio.Queue()
+        self.jobs = {}
+        self.ids = itertools.count(1)
+        self.executor = None
+        self.server = None
+        self.dispatchers = []
+
+    async def start(self):
+        """Starts the process pool, the job dispatchers and the HTTP server."""
+        self.executor = ProcessPoolExecutor(self.workers)
+        self.dispatchers = [asyncio.create_task(self.dispatch()) for _ in range(self.workers)]
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logging.info(f"Simulation service listening on http://{self.host}:{self.port}")
+
+    async def stop(self):
+        """Cancels every unfinished job and shuts the server and the process pool down."""
+        for job in self.jobs.values():
+            if job.status not in FINAL_STATES:
+                await self.cancel(job.id)
+        await asyncio.gather(*(job.task for job in self.jobs.values() if job.task is not None),
+                             return_exceptions=True)
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+        logging.info("Simulation service stopped.")
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    # --- Jobs ---
+
+    def submit(self, kind, params=None):
+        """
+        Queues a job.
+
+        Raises:
+            ValueError: If `kind` is unknown, `params` is not a dict of its `JOB_PARAMS`,
+                or the network parameters fail `check_network_params`.
+            asyncio.QueueFull: If `max_queue` jobs are already waiting.
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind '{kind}'. Expected one of {JOB_KINDS}.")
+        params = {} if params is None else params
+        if not isinstance(params, dict):
+            raise ValueError("Job params must be a JSON object.")
+        unknown = sorted(set(params) - set(JOB_PARAMS[kind]))
+        if unknown:
+            raise ValueError(f"Unknown {kind} job parameters {unknown}. Expected some of {JOB_PARAMS[kind]}.")
+        if kind == 'simulation':
+            check_network_params(params.get('network_params', {}), allowed=TRIAL_NETWORK_PARAMS)
+        elif 'equity' not in params:
+            check_network_params({name: params[name] for name in NETWORK_PARAMS if name in params})
+        if self.queued_count() >= self.max_queue:
+            raise asyncio.QueueFull()
+        job = Job(str(next(self.ids)), kind, params)
+        self.queue.put_nowait(job)
+        self.jobs[job.id] = job
+        logging.info(f"Queued {kind} job {job.id}.")
+        return job
+
+    def queued_count(self):
+        """Returns the number of jobs waiting to run; cancelled jobs no longer count."""
+        return sum(1 for job in self.jobs.values() if job.status == 'queued')
+
+    async def cancel(self, job_id):
+        """Cancels a job; returns False if it had already finished."""
+        job = self.jobs[job_id]
+        if job.status in FINAL_STATES:
+            return False
+        if job.task is not None:
+            job.task.cancel() # The running job records its own cancellation; see the class docstring
+        else:
+            job.status = 'cancelled' # Still queued, the dispatcher will skip it
+            await job.emit('cancelled', job.describe())
+        logging.info(f"Cancelled job {job_id}.")
+        return True
+
+    async def dispatch(self):
+        """Takes jobs off the queue and runs them one at a time."""
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.status == 'queued':
+                    job.task = asyncio.create_task(self.run(job))
+                    await asyncio.wait([job.task])
+                    if job.status not in FINAL_STATES: # Cancelled before it started running
+                        job.status = 'cancelled'
+                        await job.emit('cancelled', job.describe())
+                    if job.future is not None and not job.future.done():
+                        # A cancelled job's computation keeps its worker busy; wait for it
+                        # so that no more than `workers` computations run at once
+                        await asyncio.wait([asyncio.wrap_future(job.future)])
+            finally:
+                self.queue.task_done()
+
+    async def run(self, job):
+        """Runs `job` in the process pool, emitting its progress and outcome."""
+        job.status = 'running'
+        await job.emit('status', job.describe())
+        try:
+            if job.kind == 'clearing':
+                job.result = await self.in_pool(job, clearing_job, job.params)
+            else:
+                job.result = await self.run_simulation(job)
+            job.status = 'done'
+            await job.emit('result', job.describe())
+        except asyncio.CancelledError:
+            job.status = 'cancelled'
+            await job.emit('cancelled', job.describe())
+        except Exception as e:
+            logging.exception(f"Job {job.id} failed:")
+            job.status = 'failed'
+            job.error = f"{type(e).__name__}: {e}"
+            await job.emit('error', job.describe())
+        finally:
+            job.task = None
+
+    async def run_simulation(self, job):
+        """Runs the seeded trials of a simulation job one by one, reporting each as progress."""
+        trials = int(job.params.get('trials', 10))
+        seed = int(job.params.get('seed', 0))
+        network_params = {**DEFAULT_NETWORK, **job.params.get('network_params', {})}
+        rows = []
+        for i in range(trials):
+            row = await self.in_pool(job, simulation_trial, seed + i, network_params, self.cache_directory)
+            rows.append(row)
+            await job.emit('progress', {'id': job.id, 'trial': i + 1, 'trials': trials, 'row': row})
+        summary = summary_metrics(pd.DataFrame(rows))
+        return {'rows': rows,
+                'summary': {k: v.item() if isinstance(v, np.generic) else v for k, v in summary.items()}}
+
+    async def in_pool(self, job, function, *args):
+        """Runs `function(*args)` in the process pool, keeping its future on `job`."""
+        job.future = self.executor.submit(function, *args)
+        return await asyncio.wrap_future(job.future)
+
+    # --- HTTP ---
+
+    async def handle(self, reader, writer):
+        """Serves one HTTP request on a connection, then closes it."""
+        try:
+            method, path, body = await self.read_request(reader)
+            await self.route(method, path, body, writer)
+        except ValueError as e:
+            await self.respond(writer, HTTPStatus.BAD_REQUEST, {'error': str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        """Returns the method, path and decoded JSON body (or None) of a request."""
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) != 3:
+            raise ValueError("Malformed request line.")
+        method, path, _ = request_line
+        headers = {}
+        while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length > MAX_BODY_BYTES:
+            raise ValueError(f"Request body larger than {MAX_BODY_BYTES} bytes.")
+        body = json.loads(await reader.readexactly(length)) if length else None
+        return method, path.split('?')[0].rstrip('/'), body
+
+    async def route(self, method, path, body, writer):
+        parts = path.strip('/').split('/')
+        if parts[0] != 'jobs' or len(parts) > 3:
+            return await self.respond(writer, HTTPStatus.NOT_FOUND, {'error': f"No route for {path}."})
+
+        if len(parts) == 1:
+            if method == 'GET':
+                return await self.respond(writer, HTTPStatus.OK, [job.describe() for job in self.jobs.values()])
+            if method == 'POST':
+                body = {} if body is None else body
+                if not isinstance(body, dict):
+                    return await self.respond(writer, HTTPStatus.BAD_REQUEST,
+                                              {'error': "Request body must be a JSON object."})
+                try:
+                    job = self.submit(body.get('kind'), body.get('params'))
+                except asyncio.QueueFull:
+                    return await self.respond(writer, HTTPStatus.SERVICE_UNAVAILABLE, {'error': "Job queue is full."})
+                return await self.respond(writer, HTTPStatus.ACCEPTED, job.describe())
+            return await self.respond(writer, HTTPStatus.METHOD_NOT_ALLOWED, {'error': f"{method} not allowed."})
+
+        job = self.jobs.get(parts[1])
+        if job is None:
+            return await self.respond(writer, HTTPStatus.NOT_FOUND, {'error': f"No job {parts[1]}."})
+        if len(parts) == 3:
+            if parts[2] == 'events' and method == 'GET':
+                return await self.stream_events(job, writer)
+            return await self.respond(writer, HTTPStatus.NOT_FOUND, {'error': f"No route for {path}."})
+        if method == 'GET':
+            return await self.respond(writer, HTTPStatus.OK, job.describe())
+        if method == 'DELETE':
+            cancelled = await self.cancel(job.id)
+            return await self.respond(writer, HTTPStatus.OK if cancelled else HTTPStatus.CONFLICT, job.describe())
+        return await self.respond(writer, HTTPStatus.METHOD_NOT_ALLOWED, {'error': f"{method} not allowed."})
+
+    async def respond(self, writer, status, data):
+        body = json.dumps(data).encode()
+        writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                     f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def stream_events(self, job, writer):
+        """Streams the job's past and future events as Server-Sent Events until it finishes."""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        sent = 0
+        while True:
+            async with job.changed:
+                await job.changed.wait_for(lambda: len(job.events) > sent)
+                pending = job.events[sent:]
+            for event, data in pending:
+                writer.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+            sent += len(pending)
+            await writer.drain()
+            if pending[-1][0] in ('result', 'error', 'cancelled'):
+                return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve clearing and simulation jobs over a local HTTP/JSON API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--max-queue', type=int, default=16)
+    parser.add_argument('--cache', default=None, help="Result cache directory for simulation trials.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    service = SimulationService(args.host, args.port, args.workers, args.max_queue, args.cache)
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
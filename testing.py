@@ -1,12 +1,20 @@
 # Standard libraries
 import unittest
+import asyncio
+import json
 import random
 import copy
+import os
+import pickle
+import sys
+import tempfile
 import tkinter as tk
 from unittest.mock import Mock, patch, MagicMock
 
 # Third-party libraries
 import networkx as nx
+import numpy as np
+import pandas as pd
 # Import the class we need to patch method on
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import matplotlib.pyplot as plt
@@ -17,6 +25,28 @@ from network import Network
 from eisenbergnoe import EisenbergNoe
 from compression import Compression
 from networkgraph import NetworkGraph
+from resultcache import ResultCache
+from clearing import (ClearingNotConverged, clearing_vector, edge_payments, exact_clearing_vector, exact_edge_payments,
+                      fictitious_default, greatest_clearing_vector, total_liabilities)
+from systemicrisk import clearing_jacobian, debt_rank
+import kernels
+from edgechunkstore import EdgeChunkStore
+from simulation import METRIC_NAMES, Simulation, run_trial, simulation_trial, summary_from_statistics, summary_metrics
+from simulationservice import SimulationService
+from dynamicclearing import DynamicClearing
+from partitionedclearing import PartitionedClearing, partition_nodes
+from sharedarrays import SharedArrays
+from clearingpool import ClearingPool
+from importbenchmark import import_cost
+from lazyimport import lazy_import
+from paymentrecord import IterationDeltas, PaymentRecord
+from cascade import Cascade
+from firesale import FireSale
+from engineparity import ENGINES, TOPOLOGIES, case_network, check_clearing, run_engine, run_harness
+from networkexport import export_network, network_tables, write_arrow
+from memoryprofile import deep_size, footprint, format_report, profile_pipeline
+from parametersweep import ParameterSweep, grid, latin_hypercube, mean_interval
+from runningstatistics import P2Quantile, RunningStatistics
 
 
 # Objective 1 - Point 1 - Checking Node Initialisation
@@ -486,6 +516,1120 @@ class TestInteractionsAndGUI(unittest.TestCase):
         result = eisenberg_noe.is_pareto_improvement()
         self.assertIsInstance(result, bool)
 
+# Cached simulation trials
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.cache = ResultCache(self.tmp_dir.name)
+
+    def test_seeded_network_is_reproducible(self):
+        first = Network(5, 20, seed=7).to_arrays()
+        second = Network(5, 20, seed=7).to_arrays()
+        for a, b in zip(first, second):
+            np.testing.assert_array_equal(a, b)
+
+    def test_from_arrays_round_trip(self):
+        network = Network(5, 10, seed=3)
+        rebuilt = Network.from_arrays(*network.to_arrays())
+        self.assertEqual([n.debts for n in rebuilt.nodes], [n.debts for n in network.nodes])
+        self.assertEqual(set(rebuilt.graph.edges()), set(network.graph.edges()))
+
+    def test_put_get_round_trip(self):
+        key = ResultCache.make_key(seed=1, mini=5)
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, {'values': np.arange(5.0)})
+        np.testing.assert_array_equal(self.cache.get(key)['values'], np.arange(5.0))
+
+    def test_lru_eviction(self):
+        self.cache.put('old', {'values': np.random.default_rng(0).random(2000)})
+        os.utime(self.cache.path_for('old'), (0, 0))
+        self.cache.put('new', {'values': np.random.default_rng(1).random(2000)})
+        self.cache.max_bytes = os.path.getsize(self.cache.path_for('new'))
+        self.cache.evict()
+        self.assertIsNone(self.cache.get('old'))
+        self.assertIsNotNone(self.cache.get('new'))
+
+    def test_put_keeps_new_entry_beyond_limit(self):
+        self.cache.put('old', {'values': np.random.default_rng(0).random(2000)})
+        self.cache.max_bytes = 1
+        self.cache.put('new', {'values': np.random.default_rng(1).random(2000)})
+        self.assertIsNone(self.cache.get('old'))
+        self.assertIsNotNone(self.cache.get('new'))
+
+    def test_truncated_entry_is_a_miss(self):
+        self.cache.put('entry', {'values': np.arange(1000.0)})
+        path = self.cache.path_for('entry')
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) // 2)
+        self.assertIsNone(self.cache.get('entry'))
+        self.assertFalse(os.path.exists(path))
+
+    def test_seeded_trials_are_served_from_cache(self):
+        sim = Simulation(None, trials=2, seed=11, cache=self.cache, network_params={'mini': 5, 'maxi': 8})
+        first = sim.seeded_trial(11)
+        with patch('simulation.run_trial') as mock_run_trial:
+            second = sim.seeded_trial(11)
+            mock_run_trial.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertNotEqual(sim.trial_key(11), sim.trial_key(12))
+
+
+# Array and out-of-core clearing engines
+class TestClearingEngines(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.network = Network(20, 40, seed=5)
+
+    def final_state(self, engine, **kwargs):
+        network = copy.deepcopy(self.network)
+        EisenbergNoe(network).apply(max_iterations=500, engine=engine, **kwargs)
+        return np.array([n.equity for n in network.nodes]), network
+
+    def test_engines_agree(self):
+        loop_equity, _ = self.final_state('loop')
+        vectorized_equity, vectorized_network = self.final_state('vectorized')
+        out_of_core_equity, out_of_core_network = self.final_state('out_of_core', chunk_edges=7)
+        np.testing.assert_allclose(vectorized_equity, loop_equity, atol=1e-4)
+        np.testing.assert_allclose(out_of_core_equity, vectorized_equity, atol=1e-6)
+        self.assertEqual([n.defaulted for n in out_of_core_network.nodes],
+                         [n.defaulted for n in vectorized_network.nodes])
+        self.assertEqual(set(out_of_core_network.graph.edges()), set(vectorized_network.graph.edges()))
+
+    def test_out_of_core_clearing_vector_matches_in_memory(self):
+        equity, debtor, creditor, amount = self.network.to_arrays()
+        # Split the edges into several batches to exercise the two-pass spill
+        batches = [(debtor[k:k + 25], creditor[k:k + 25], amount[k:k + 25]) for k in range(0, len(debtor), 25)]
+        store = EdgeChunkStore.create(self.tmp_dir.name, len(equity), batches, chunk_edges=10)
+        self.assertGreater(len(store.chunk_bounds), 1)
+        self.assertEqual(store.edge_count, len(debtor))
+        for lo, hi, _, chunk_creditor, _ in store.chunks():
+            self.assertTrue(np.all(np.diff(chunk_creditor) >= 0))
+            self.assertTrue(np.all((chunk_creditor >= lo) & (chunk_creditor < hi)))
+
+        expected, _, _ = clearing_vector(equity, debtor, creditor, amount, max_iterations=500)
+        payments, _, converged = store.clearing_vector(equity, max_iterations=500)
+        self.assertTrue(converged)
+        np.testing.assert_allclose(payments, expected, rtol=0, atol=1e-9)
+
+    def test_out_of_core_uses_given_chunk_dir(self):
+        with patch('eisenbergnoe.tempfile.TemporaryDirectory') as temporary:
+            equity, _ = self.final_state('out_of_core', chunk_dir=self.tmp_dir.name, chunk_edges=7)
+        temporary.assert_not_called()
+        self.assertTrue(os.listdir(self.tmp_dir.name))
+        np.testing.assert_allclose(equity, self.final_state('vectorized')[0], atol=1e-6)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            EisenbergNoe(self.network).apply(engine='gpu')
+
+    def test_default_cap_converges(self):
+        for seed in range(5):
+            network = Network(50, 150, seed=seed)
+            self.assertTrue(EisenbergNoe(network).apply(engine='vectorized').converged)
+
+    def test_unconverged_clearing_is_not_written_back(self):
+        network = Network(50, 150, seed=0)
+        before = network.to_arrays()
+        with self.assertRaises(ClearingNotConverged):
+            EisenbergNoe(network).apply(engine='vectorized', max_iterations=2)
+        for expected, actual in zip(before, network.to_arrays()):
+            np.testing.assert_array_equal(actual, expected)
+
+
+# Systemic-risk metrics from the clearing solution
+class TestSystemicRisk(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(15, 30, seed=9)
+        self.state = self.network.to_arrays()
+        self.payments, self.default_round = fictitious_default(*self.state)
+
+    def test_fictitious_default_matches_iteration(self):
+        expected, _, _ = clearing_vector(*self.state, max_iterations=2000, tolerance=1e-12)
+        np.testing.assert_allclose(self.payments, expected, atol=1e-7)
+
+    def test_default_rounds_mark_default_set(self):
+        equity, debtor, _, amount = self.state
+        liabilities = total_liabilities(len(equity), debtor, amount)
+        defaulted = self.payments < liabilities - 1e-9
+        self.assertTrue(defaulted.any())
+        np.testing.assert_array_equal(self.default_round >= 0, defaulted)
+
+    def test_jacobian_matches_finite_difference(self):
+        equity, debtor, creditor, amount = self.state
+        jacobian = clearing_jacobian(*self.state, payments=self.payments).toarray()
+        node = int(np.flatnonzero(self.default_round >= 0)[0])
+        bumped = equity.copy()
+        bumped[node] += 1e-3
+        bumped_payments, _ = fictitious_default(bumped, debtor, creditor, amount)
+        np.testing.assert_allclose((bumped_payments - self.payments) / 1e-3, jacobian[:, node], atol=1e-5)
+
+    def test_debt_rank_two_nodes(self):
+        # Node 0 owes node 1 100 and stays solvent; node 1 ends with a buffer of 150
+        ranks = debt_rank(np.array([200.0, 50.0]), np.array([0]), np.array([1]), np.array([100.0]))
+        np.testing.assert_allclose(ranks, [2 / 3, 0.0])
+
+    def test_eisenberg_noe_systemic_risk(self):
+        eisenberg_noe = EisenbergNoe(copy.deepcopy(self.network))
+        eisenberg_noe.apply()
+        metrics = eisenberg_noe.systemic_risk()
+        np.testing.assert_allclose(metrics['payments'], self.payments)
+        self.assertEqual(metrics['jacobian'].shape, (len(self.network.nodes),) * 2)
+        self.assertTrue(np.all(metrics['debt_rank'] >= -1e-12))
+
+
+# Structured clearing results
+class TestClearingResult(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(10, 20, seed=4)
+        self.eisenberg_noe = EisenbergNoe(copy.deepcopy(self.network))
+        self.result = self.eisenberg_noe.apply()
+
+    def test_arrays_match_network(self):
+        nodes = self.eisenberg_noe.network.nodes
+        np.testing.assert_array_equal(self.result.final_equity, [n.equity for n in nodes])
+        np.testing.assert_array_equal(self.result.initial_equity, [n.equity for n in self.network.nodes])
+        np.testing.assert_array_equal(self.result.defaulted, [n.defaulted for n in nodes])
+        np.testing.assert_allclose(self.result.change, self.result.final_equity - self.result.initial_equity)
+        self.assertEqual(self.result.pareto_improvement, self.eisenberg_noe.is_pareto_improvement())
+        self.assertTrue(self.result.converged)
+
+    def test_payments_matrix_conserves_cash(self):
+        paid = np.asarray(self.result.payments.sum(axis=1)).ravel()
+        received = np.asarray(self.result.payments.sum(axis=0)).ravel()
+        np.testing.assert_allclose(self.result.initial_equity + received - paid, self.result.final_equity, atol=1e-4)
+
+    def test_summary_and_printing(self):
+        summary = self.result.summary()
+        self.assertEqual(summary['defaulted'] + summary['survived'], len(self.network.nodes))
+        self.assertIn('Pareto improvement', str(self.result))
+        self.assertEqual(len(self.result.format_changes(limit=3).splitlines()), 6)
+        with patch('builtins.print') as mock_print:
+            change = self.eisenberg_noe.node_equity_change()
+            mock_print.assert_not_called()
+        np.testing.assert_allclose(change, self.result.change)
+
+
+# Default costs and seniority classes
+class TestGreatestClearingVector(unittest.TestCase):
+    def setUp(self):
+        self.state = Network(15, 30, seed=12).to_arrays()
+
+    def test_without_frictions_matches_eisenberg_noe(self):
+        expected, _, _ = clearing_vector(*self.state, max_iterations=2000, tolerance=1e-12)
+        payments, _, converged = greatest_clearing_vector(*self.state)
+        self.assertTrue(converged)
+        np.testing.assert_allclose(payments, expected, atol=1e-7)
+        # A single seniority class takes the iterative path and must agree
+        single_class = np.zeros(len(self.state[1]), dtype=np.int64)
+        tiered, _, _ = greatest_clearing_vector(*self.state, seniority=single_class, tolerance=1e-12)
+        np.testing.assert_allclose(tiered, expected, atol=1e-6)
+
+    def test_default_costs_reduce_payments(self):
+        full, _, _ = greatest_clearing_vector(*self.state)
+        costly, _, _ = greatest_clearing_vector(*self.state, alpha=0.6, beta=0.8)
+        self.assertTrue(np.all(costly <= full + 1e-9))
+        self.assertLess(costly.sum(), full.sum())
+        with self.assertRaises(ValueError):
+            greatest_clearing_vector(*self.state, alpha=0.0)
+
+    def test_rogers_veraart_recovery(self):
+        payments, _, _ = greatest_clearing_vector(np.array([50.0, 0.0]), np.array([0]), np.array([1]),
+                                                  np.array([100.0]), alpha=0.5)
+        np.testing.assert_allclose(payments, [25.0, 0.0])
+
+    def test_seniority_pays_senior_class_first(self):
+        debtor, creditor, amount = np.array([0, 0]), np.array([1, 2]), np.array([50.0, 50.0])
+        seniority = np.array([0, 1])
+        payments, _, _ = greatest_clearing_vector(np.array([60.0, 0.0, 0.0]), debtor, creditor, amount,
+                                                  seniority=seniority)
+        np.testing.assert_allclose(payments, [60.0, 0.0, 0.0])
+        np.testing.assert_allclose(edge_payments(payments, debtor, amount, np.array([100.0, 0.0, 0.0]), seniority),
+                                   [50.0, 10.0])
+
+    def test_eisenberg_noe_with_frictions(self):
+        network = Network.from_arrays(np.array([60.0, 0.0, 0.0]), np.array([0, 0]), np.array([1, 2]),
+                                      np.array([50.0, 50.0]))
+        eisenberg_noe = EisenbergNoe(network, alpha=0.5, seniority={(0, 2): 1})
+        result = eisenberg_noe.apply()
+        np.testing.assert_allclose(result.final_equity, [0.0, 30.0, 0.0])
+        self.assertEqual(network.nodes[0].debts, {1: 20.0, 2: 50.0})
+        with self.assertRaises(ValueError):
+            EisenbergNoe(network, alpha=0.5).apply(engine='loop')
+
+    def test_seniority_uses_engine_iteration_cap(self):
+        network = Network(50, 150, seed=3)
+        _, debtor, creditor, _ = network.to_arrays()
+        seniority = {(u, v): k % 2 for k, (u, v) in enumerate(zip(debtor.tolist(), creditor.tolist()))}
+        self.assertTrue(EisenbergNoe(network, seniority=seniority).apply().converged)
+        with self.assertRaises(ClearingNotConverged):
+            EisenbergNoe(Network(50, 150, seed=3), seniority=seniority).apply(max_iterations=2)
+
+
+# Exact, order-independent clearing
+class TestExactClearing(unittest.TestCase):
+    def setUp(self):
+        self.state = Network(20, 40, seed=21).to_arrays()
+
+    def test_matches_float_clearing_vector(self):
+        payments, paid, _, converged = exact_clearing_vector(*self.state)
+        expected, _ = fictitious_default(*self.state)
+        self.assertTrue(converged)
+        self.assertEqual(payments.dtype, np.int64)
+        np.testing.assert_allclose(payments * 1e-6, expected, atol=1e-3)
+        # Nobody pays more than it can, in whole units
+        paid_out = np.bincount(self.state[1], weights=paid, minlength=len(payments))
+        self.assertTrue(np.all(paid_out <= payments))
+
+    def test_independent_of_node_and_edge_order(self):
+        equity, debtor, creditor, amount = self.state
+        rng = np.random.default_rng(0)
+        relabel = rng.permutation(len(equity))
+        edge_order = rng.permutation(len(debtor))
+        permuted_equity = np.empty_like(equity)
+        permuted_equity[relabel] = equity
+        payments, paid, _, _ = exact_clearing_vector(*self.state)
+        permuted_payments, permuted_paid, _, _ = exact_clearing_vector(
+            permuted_equity, relabel[debtor][edge_order], relabel[creditor][edge_order], amount[edge_order])
+        np.testing.assert_array_equal(permuted_payments[relabel], payments)
+        np.testing.assert_array_equal(permuted_paid, paid[edge_order])
+
+    def test_eisenberg_noe_exact_engine(self):
+        network = Network.from_arrays(*self.state)
+        result = EisenbergNoe(network).apply(engine='exact', max_iterations=1000)
+        self.assertTrue(result.converged)
+        # Cash is conserved exactly up to the final rounding of equities
+        self.assertAlmostEqual(result.final_equity.sum(), self.state[0].sum(), delta=1e-6 * len(network.nodes))
+        for node in network.nodes:
+            if node.debts:
+                self.assertTrue(node.defaulted)
+
+    def test_exact_engine_default_cap(self):
+        for seed in range(5):
+            network = Network(50, 150, seed=seed)
+            self.assertTrue(EisenbergNoe(network).apply(engine='exact').converged)
+        network = Network(50, 150, seed=0)
+        before = network.to_arrays()
+        with self.assertRaises(ClearingNotConverged):
+            EisenbergNoe(network).apply(engine='exact', max_iterations=2)
+        np.testing.assert_array_equal(network.to_arrays()[0], before[0])
+
+    def test_edge_shares_are_exact_integer_floors(self):
+        rng = np.random.default_rng(4)
+        liabilities = rng.integers(2 ** 50, 2 ** 52, 200)
+        debtor = np.arange(200)
+        amount = rng.integers(1, liabilities)
+        payments = rng.integers(0, liabilities)
+        shares = exact_edge_payments(payments, liabilities, debtor, amount)
+        expected = [a * p // l for a, p, l in zip(amount.tolist(), payments.tolist(), liabilities.tolist())]
+        self.assertEqual(shares.tolist(), expected)
+
+
+# Deferred graph synchronisation
+class TestDeferredGraph(unittest.TestCase):
+    def setUp(self):
+        random.seed(8)
+        self.network = Network(10, 20)
+
+    def run_pipeline(self, defer, engine):
+        network = copy.deepcopy(self.network)
+        network.defer_graph_updates = defer
+        Compression(network).apply()
+        EisenbergNoe(network).apply(engine=engine)
+        return network
+
+    def test_deferred_graph_matches_eager_graph(self):
+        for engine in ('loop', 'vectorized'):
+            eager = self.run_pipeline(False, engine)
+            deferred = self.run_pipeline(True, engine)
+            self.assertTrue(deferred._dirty_edges, "Deferred mode should only record edge changes.")
+            self.assertEqual(set(deferred.graph.edges()), set(eager.graph.edges()))
+            self.assertFalse(deferred._dirty_edges)
+
+    def test_deferred_reset_rebuilds_on_read(self):
+        network = self.run_pipeline(True, 'loop')
+        network.reset()
+        self.assertTrue(network._graph_stale)
+        eager = self.run_pipeline(False, 'loop')
+        eager.reset()
+        self.assertEqual(set(network.graph.edges()), set(eager.graph.edges()))
+        self.assertFalse(network._graph_stale)
+
+    def test_failed_trial_restores_deferral(self):
+        network = copy.deepcopy(self.network)
+        with patch('simulation.Compression.apply', side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                run_trial(network)
+        self.assertFalse(network.defer_graph_updates)
+
+
+# Compiled kernels (run interpreted when numba is not installed)
+class TestKernelParity(unittest.TestCase):
+    def run_pipeline(self, network, use_kernels, compress):
+        network = copy.deepcopy(network)
+        with patch.object(kernels, 'USE_KERNELS', use_kernels):
+            if compress:
+                Compression(network).apply()
+            result = EisenbergNoe(network).apply()
+        return network, result
+
+    def test_kernels_match_existing_implementation(self):
+        for seed in range(5):
+            network = Network(5, 30, seed=seed)
+            for compress in (False, True):
+                expected, expected_result = self.run_pipeline(network, False, compress)
+                actual, actual_result = self.run_pipeline(network, True, compress)
+                self.assertEqual([n.equity for n in actual.nodes], [n.equity for n in expected.nodes])
+                self.assertEqual([n.debts for n in actual.nodes], [n.debts for n in expected.nodes])
+                self.assertEqual(set(actual.graph.edges()), set(expected.graph.edges()))
+                self.assertEqual(actual_result.iterations, expected_result.iterations)
+
+    def test_jit_falls_back_to_python(self):
+        if kernels.NUMBA_AVAILABLE:
+            self.skipTest("numba is installed")
+        self.assertIs(kernels.jit(len), len)
+        self.assertFalse(kernels.USE_KERNELS)
+
+
+# Running network aggregates
+class TestRunningAggregates(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(10, 20, seed=17)
+        patcher = patch.object(Network, 'check_aggregates', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_aggregates_follow_pipelines(self):
+        for engine in ('loop', 'vectorized', 'exact', 'greatest'):
+            network = copy.deepcopy(self.network)
+            Compression(network).apply()
+            network.total_network_debt()
+            EisenbergNoe(network).apply(engine=engine)
+            self.assertTrue(network.verify_aggregates())
+            network.reset()
+            self.assertTrue(network.verify_aggregates())
+            self.assertEqual(network.survived_nodes_count() + network.defaulted_nodes_count(), len(network.nodes))
+
+    def test_direct_node_mutations(self):
+        node = self.network.nodes[0]
+        node.equity += 123.5
+        node.debts[1] = node.debts.get(1, 0) + 10
+        node.debts.pop(1)
+        node.debts.update({2: 5.0})
+        node.debts = {3: 2000.0}
+        node.update_color()
+        self.assertTrue(node.defaulted)
+        self.assertTrue(self.network.verify_aggregates())
+
+    def test_copies_keep_separate_totals(self):
+        copied = copy.deepcopy(self.network)
+        copied.nodes[0].equity += 1000
+        self.assertAlmostEqual(copied.total_network_equity(), self.network.total_network_equity() + 1000)
+        self.assertTrue(self.network.verify_aggregates())
+
+    def test_node_copies_leave_the_network_behind(self):
+        node = self.network.nodes[0]
+        for copied in (copy.deepcopy(node), pickle.loads(pickle.dumps(node))):
+            self.assertIsNone(copied._network)
+            self.assertEqual(copied.debts, node.debts)
+            copied.equity += 1000
+        self.assertTrue(self.network.verify_aggregates())
+        restored = pickle.loads(pickle.dumps(self.network))
+        self.assertTrue(all(node._network is restored for node in restored.nodes))
+        self.assertTrue(restored.verify_aggregates())
+
+    def test_reset_resynchronises_totals(self):
+        self.network._total_equity += 1.0
+        self.network._total_debt -= 1.0
+        self.network.reset()
+        self.assertTrue(self.network.verify_aggregates(tolerance=0.0))
+
+    def test_verify_detects_drift(self):
+        self.network._total_equity += 1.0
+        with self.assertRaises(AssertionError):
+            self.network.total_network_equity()
+
+
+# Local HTTP/JSON simulation service
+class TestSimulationService(unittest.IsolatedAsyncioTestCase):
+    async def request(self, service, method, path, data=None):
+        """Sends one request and returns (status, raw body)."""
+        reader, writer = await asyncio.open_connection(service.host, service.port)
+        body = json.dumps(data).encode() if data is not None else b''
+        writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.partition(b'\r\n\r\n')
+        return int(head.split()[1]), body.decode()
+
+    def test_rejects_non_local_host(self):
+        with self.assertRaises(ValueError):
+            SimulationService(host='0.0.0.0')
+        self.assertEqual(SimulationService(host='localhost').host, 'localhost')
+
+    async def test_bounded_queue_and_cancellation(self):
+        service = SimulationService(max_queue=2)  # Not started: jobs stay queued
+        first = service.submit('clearing', {'seed': 1})
+        service.submit('clearing', {'seed': 2})
+        with self.assertRaises(asyncio.QueueFull):
+            service.submit('clearing', {'seed': 3})
+        with self.assertRaises(ValueError):
+            service.submit('unknown')
+        self.assertTrue(await service.cancel(first.id))
+        self.assertEqual(first.status, 'cancelled')
+        self.assertFalse(await service.cancel(first.id))
+        # The cancelled job no longer holds a place in the queue
+        service.submit('clearing', {'seed': 3})
+
+    def test_rejects_unknown_params(self):
+        service = SimulationService()
+        for params in ({'seed': 1, 'chunk_dir': '/tmp'}, {'record': True}, ['seed']):
+            with self.assertRaises(ValueError):
+                service.submit('clearing', params)
+        with self.assertRaises(ValueError):
+            service.submit('simulation', {'trials': 2, 'engine': 'loop'})
+        service.submit('clearing', {'seed': 1, 'engine': 'vectorized', 'max_iterations': 500, 'tolerance': 1e-9})
+
+    def test_checks_network_params_before_queueing(self):
+        service = SimulationService()
+        for network_params in ({'mini': 5, 'maxi': 10, 'size': 3}, [5, 10], {'maxi': 10 ** 9}, {'mini': 30},
+                               {'seed': 1}, {'equity_range': [500, 50]}, {'debt_fraction': [0.1, 2]},
+                               {'reciprocity': 'high'}, {'mini': 5.5}):
+            with self.assertRaises(ValueError):
+                service.submit('simulation', {'trials': 1, 'network_params': network_params})
+        with self.assertRaises(ValueError):
+            service.submit('clearing', {'mini': 10, 'maxi': 4})
+        self.assertEqual(service.queued_count(), 0)
+        service.submit('simulation', {'network_params': {'maxi': 8, 'equity_range': [10, 100], 'reciprocity': 0.5}})
+
+    async def test_jobs_over_http(self):
+        service = SimulationService(port=0, workers=1)
+        await service.start()
+        try:
+            network = Network(5, 10, seed=4)
+            status, body = await self.request(service, 'POST', '/jobs', {'kind': 'clearing', 'params': {'seed': 4, 'mini': 5, 'maxi': 10, 'compression': True}})
+            self.assertEqual(status, 202)
+            clearing_id = json.loads(body)['id']
+            status, body = await self.request(service, 'POST', '/jobs', {'kind': 'simulation', 'params': {'trials': 2, 'seed': 7}})
+            simulation_id = json.loads(body)['id']
+
+            status, stream = await self.request(service, 'GET', f'/jobs/{simulation_id}/events')
+            self.assertEqual(status, 200)
+            self.assertEqual(stream.count('event: progress'), 2)
+            self.assertIn('event: result', stream)
+
+            status, body = await self.request(service, 'GET', f'/jobs/{clearing_id}')
+            job = json.loads(body)
+            self.assertEqual(job['status'], 'done')
+            Compression(network).apply()
+            expected = EisenbergNoe(network).apply()
+            np.testing.assert_allclose(job['result']['final_equity'], expected.final_equity)
+
+            expected_rows = [Simulation(None, seed=7).seeded_trial(seed) for seed in (7, 8)]
+            status, body = await self.request(service, 'GET', f'/jobs/{simulation_id}')
+            self.assertEqual(json.loads(body)['result']['rows'], expected_rows)
+
+            self.assertEqual((await self.request(service, 'DELETE', f'/jobs/{clearing_id}'))[0], 409)
+            self.assertEqual((await self.request(service, 'GET', '/jobs/99'))[0], 404)
+            self.assertEqual((await self.request(service, 'POST', '/jobs', {'kind': 'x'}))[0], 400)
+            self.assertEqual((await self.request(service, 'POST', '/jobs', [1, 2]))[0], 400)
+            status, body = await self.request(service, 'POST', '/jobs',
+                                              {'kind': 'clearing', 'params': {'chunk_dir': '/tmp/elsewhere'}})
+            self.assertEqual(status, 400)
+            self.assertIn('chunk_dir', json.loads(body)['error'])
+        finally:
+            await service.stop()
+
+
+# Multi-period clearing
+class TestDynamicClearing(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(10, 20, seed=3)
+        self.equity, self.debtor, self.creditor, self.amount = self.network.to_arrays()
+
+    def test_first_period_matches_eisenberg_noe(self):
+        dynamic = DynamicClearing.from_network(self.network)
+        outcome = dynamic.step(self.amount)
+        result = EisenbergNoe(self.network).apply(engine='vectorized')
+        np.testing.assert_allclose(outcome['equity'], result.final_equity, atol=1e-5)
+        np.testing.assert_array_equal(outcome['defaulted'], result.defaulted)
+
+    def test_warm_started_periods_match_cold_clearing(self):
+        dynamic = DynamicClearing(self.equity, self.debtor, self.creditor)
+        rng = np.random.default_rng(1)
+        for _ in range(15):
+            amount = self.amount * rng.uniform(0.5, 1.5, len(self.amount))
+            income = rng.normal(0, 200, len(self.equity))
+            expected, _ = fictitious_default(np.maximum(dynamic.equity + income, 0), self.debtor, self.creditor, amount)
+            np.testing.assert_allclose(dynamic.step(amount, income)['payments'], expected, atol=1e-6)
+        self.assertEqual(dynamic.period, 15)
+        self.assertEqual(dynamic.stats['warm_starts'], 15)
+
+    def test_factorisation_is_reused(self):
+        dynamic = DynamicClearing(self.equity / 4, self.debtor, self.creditor)
+        with patch('scipy.sparse.linalg.bicgstab', return_value=(None, 1)):
+            history = dynamic.run([self.amount] * 3)
+        self.assertGreater(history['defaults'][0], 0)
+        self.assertGreater(dynamic.stats['factor_reuses'], 0)
+        reference = DynamicClearing(self.equity / 4, self.debtor, self.creditor).run([self.amount] * 3)
+        np.testing.assert_allclose(history['total_equity'], reference['total_equity'])
+
+
+# Parameter sweeps
+class TestParameterSweep(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.checkpoint = os.path.join(self.directory.name, 'sweep.jsonl')
+        self.points = grid(maxi=[8, 12], reciprocity=[0.3], equity_range=[(50, 500)])
+
+    def test_latin_hypercube_is_stratified(self):
+        points = latin_hypercube(8, seed=1, maxi=(10, 30), reciprocity=(0.1, 0.5), debt_fraction=((0.05, 0.1), (0.3, 0.6)))
+        self.assertEqual(len(points), 8)
+        strata = sorted(int((point['reciprocity'] - 0.1) / 0.4 * 8) for point in points)
+        self.assertEqual(strata, list(range(8)))
+        self.assertTrue(all(isinstance(point['maxi'], int) for point in points))
+        self.assertTrue(all(0.05 <= point['debt_fraction'][0] <= 0.1 for point in points))
+        with self.assertRaises(ValueError):
+            grid(density=[1])
+
+    def test_latin_hypercube_points_build_networks(self):
+        points = latin_hypercube(20, seed=2, mini=(2, 25), maxi=(5, 30), equity_range=((10, 200), (100, 1000)),
+                                 debt_range=((10, 200), (100, 1000)), debt_fraction=((0.05, 0.3), (0.1, 0.6)))
+        for point in points:
+            self.assertLessEqual(point['mini'], point['maxi'])
+            self.assertTrue(all(isinstance(bound, int) for bound in point['equity_range'] + point['debt_range']))
+            network = Network(seed=0, **point)
+            self.assertGreaterEqual(len(network.nodes), point['mini'])
+
+    def test_sweep_rejects_points_invalid_after_merging(self):
+        points = latin_hypercube(4, seed=0, maxi=(2, 6))
+        with self.assertRaisesRegex(ValueError, 'mini > maxi'):
+            ParameterSweep(points, workers=1)
+        with self.assertRaisesRegex(ValueError, 'equity_range'):
+            ParameterSweep([{'equity_range': (500, 50)}], workers=1)
+        self.assertEqual(len(ParameterSweep(points, workers=1, base_params={'mini': 2}).points), 4)
+
+    def test_results_table_uses_sweep_confidence(self):
+        sweep = ParameterSweep(self.points[:1], trials=4, seed=5, workers=1, confidence=0.99)
+        table = sweep.run()
+        np.testing.assert_allclose(table['ci_low'], sweep.results_table(0.99)['ci_low'])
+        self.assertTrue((table['ci_low'] <= sweep.results_table(0.95)['ci_low']).all())
+        self.assertTrue((table['ci_low'] < sweep.results_table(0.95)['ci_low']).any())
+
+    def test_results_table(self):
+        table = ParameterSweep(self.points, trials=3, seed=5, workers=1).run()
+        self.assertEqual(len(table), 2 * len(METRIC_NAMES) * 3)
+        self.assertIn('equity_range_high', table.columns)
+        row = table[(table['point'] == 1) & (table['metric'] == 'Change in Debt') & (table['pipeline'] == 'EN')].iloc[0]
+        expected = [simulation_trial(seed, {'mini': 5, **self.points[1]})['EN Change in Debt'] for seed in (5, 6, 7)]
+        self.assertAlmostEqual(row['mean'], np.mean(expected))
+        self.assertLessEqual(row['ci_low'], row['mean'])
+        self.assertGreaterEqual(row['ci_high'], row['mean'])
+
+    def test_resumes_from_checkpoint(self):
+        complete = ParameterSweep(self.points, trials=3, workers=2, checkpoint=self.checkpoint).run()
+        with open(self.checkpoint) as file:
+            lines = file.readlines()
+        self.assertEqual(len(lines), 6)
+        # Interrupted after two trials, mid-way through writing the third
+        with open(self.checkpoint, 'w') as file:
+            file.writelines(lines[:2] + [lines[2][:10]])
+        with patch('parametersweep.simulation_trial', wraps=simulation_trial) as trial:
+            resumed = ParameterSweep(self.points, trials=3, workers=1, checkpoint=self.checkpoint).run()
+        self.assertEqual(trial.call_count, 4)
+        pd.testing.assert_frame_equal(resumed, complete)
+        self.assertEqual(ParameterSweep(self.points, trials=3, checkpoint=self.checkpoint).load_checkpoint(), 6)
+
+
+# Welford statistics and early stopping
+class TestEarlyStopping(unittest.TestCase):
+    def test_running_statistics_match_batch(self):
+        rng = np.random.default_rng(2)
+        rows = [{'x': value, 'Pareto': 'Yes' if value > 0 else 'No'} for value in rng.normal(3, 2, 50)]
+        statistics = RunningStatistics()
+        for row in rows:
+            statistics.update(row)
+        values = np.array([row['x'] for row in rows])
+        self.assertAlmostEqual(statistics.mean()['x'], values.mean())
+        self.assertAlmostEqual(statistics.variance()['x'], values.var(ddof=1))
+        self.assertAlmostEqual(statistics.mean()['Pareto'], np.mean(values > 0))
+        self.assertAlmostEqual(statistics.half_width()['x'], mean_interval(values)[4] - values.mean())
+        self.assertTrue(statistics.reached({'x': 1.0}))
+        self.assertFalse(statistics.reached(0.01))
+
+    @patch('simulation.pd.DataFrame.to_excel')
+    def test_simulation_stops_at_target_precision(self, to_excel):
+        simulation = Simulation(None, trials=30, seed=3, precision=1e9, min_trials=4)
+        simulation.run()
+        self.assertEqual(simulation.trials_run, 4)
+        self.assertEqual(len(simulation.results_df), 4)
+
+        simulation = Simulation(None, trials=6, seed=3, precision={'EN Change in Debt': 1e-9})
+        simulation.run()
+        self.assertEqual(simulation.trials_run, 6)
+
+    @patch('simulation.pd.DataFrame.to_excel')
+    def test_repeated_runs_start_afresh(self, to_excel):
+        simulation = Simulation(None, trials=30, seed=3, precision=1e9, min_trials=4)
+        simulation.run()
+        first = simulation.statistics.mean()
+        simulation.run()
+        self.assertEqual(simulation.trials_run, 4)
+        self.assertEqual(simulation.statistics.count, 4)
+        self.assertEqual(len(simulation.results_df), 4)
+        self.assertEqual(simulation.statistics.mean(), first)
+
+    def test_sweep_stops_points_early(self):
+        points = grid(maxi=[8, 10])
+        sweep = ParameterSweep(points, trials=20, workers=1, precision={'EN Survived Nodes Change': 1e9}, min_trials=3)
+        table = sweep.run()
+        self.assertEqual(len(sweep.rows), 6)
+        self.assertTrue((table['n'] == 3).all())
+
+
+# Common random numbers
+class TestRandomStreams(unittest.TestCase):
+    def test_streams_are_independent(self):
+        base = Network(10, 20, seed=5).to_arrays()
+        for params in ({'equity_range': (10, 100)}, {'shock': 0.3}, {'antithetic': True}):
+            varied = Network(10, 20, seed=5, **params).to_arrays()
+            for k in (1, 2, 3):  # Same debts on every variant
+                np.testing.assert_array_equal(varied[k], base[k])
+        twin = Network(10, 20, seed=5, antithetic=True).to_arrays()
+        np.testing.assert_array_equal(base[0] + twin[0], 1050)
+        shocked = Network(10, 20, seed=5, shock=0.3).to_arrays()[0]
+        self.assertTrue(np.all(shocked <= base[0]) and np.all(shocked > 0.7 * base[0] - 1e-9))
+
+    def test_paired_studies_reduce_variance(self):
+        column = 'EN Defaulted Nodes Change'
+        def study(shock, seeds):
+            return np.array([simulation_trial(seed, {'mini': 10, 'maxi': 20, 'shock': shock})[column] for seed in seeds])
+        low = study(0.2, range(30))
+        paired = study(0.5, range(30)) - low
+        independent = study(0.5, range(100, 130)) - low
+        self.assertLess(paired.var(), independent.var())
+
+    @patch('simulation.pd.DataFrame.to_excel')
+    def test_antithetic_simulation(self, to_excel):
+        simulation = Simulation(None, trials=4, seed=9, antithetic=True)
+        simulation.run()
+        expected = [Simulation(None).seeded_trial(seed, antithetic) for seed, antithetic in
+                    ((9, False), (9, True), (10, False), (10, True))]
+        self.assertEqual(simulation.results_df.to_dict('records'), expected)
+
+
+# Streaming aggregation of results
+class TestStreamingSummary(unittest.TestCase):
+    def test_p2_quantiles(self):
+        values = np.random.default_rng(4).exponential(1.0, 20000)
+        estimators = [P2Quantile(p) for p in (0.05, 0.5, 0.95)]
+        for value in values.tolist():
+            for estimator in estimators:
+                estimator.update(value)
+        for estimator in estimators:
+            self.assertAlmostEqual(estimator.value(), np.quantile(values, estimator.p), delta=0.02)
+        few = P2Quantile(0.5)
+        for value in (3.0, 1.0, 2.0):
+            few.update(value)
+        self.assertEqual(few.value(), 2.0)
+
+    @patch('simulation.pd.DataFrame.to_excel')
+    def test_summary_without_rows(self, to_excel):
+        kept = Simulation(None, trials=3, seed=2)
+        kept.run()
+        kept.run()  # Summaries cover the last run, as the rows do
+        streamed = Simulation(None, trials=3, seed=2, keep_rows=False)
+        streamed.run()
+        streamed.run()
+        self.assertTrue(streamed.results_df.empty)
+        self.assertEqual(len(kept.results_df), 3)
+
+        expected = summary_metrics(kept.results_df)
+        summary = summary_from_statistics(streamed.statistics)
+        self.assertEqual(list(summary), list(expected))
+        for key, value in expected.items():
+            self.assertAlmostEqual(summary[key], value)
+        median = streamed.statistics.quantiles()['EN Change in Debt'][0.5]
+        self.assertAlmostEqual(median, kept.results_df['EN Change in Debt'].median())
+
+
+# Distributed clearing over partitions
+class TestPartitionedClearing(unittest.TestCase):
+    def test_partitions_are_balanced(self):
+        equity, debtor, creditor, amount = Network(30, 60, seed=2).to_arrays()
+        partition = partition_nodes(len(equity), debtor, creditor, 3)
+        self.assertEqual(set(partition.tolist()), {0, 1, 2})
+        load = np.bincount(partition, weights=1 + np.bincount(creditor, minlength=len(equity)))
+        self.assertLess(load.max() / load.min(), 1.5)
+
+    def test_matches_single_process(self):
+        for seed in (0, 1):
+            equity, debtor, creditor, amount = Network(30, 60, seed=seed).to_arrays()
+            expected, expected_iterations, _ = clearing_vector(equity, debtor, creditor, amount)
+            for workers in (1, 3):
+                payments, iterations, converged = PartitionedClearing(
+                    len(equity), debtor, creditor, amount, workers).clearing_vector(equity)
+                np.testing.assert_array_equal(payments, expected)
+                self.assertEqual(iterations, expected_iterations)
+                self.assertTrue(converged)
+
+    def test_distributed_engine(self):
+        network = Network(20, 40, seed=6)
+        vectorized = EisenbergNoe(copy.deepcopy(network)).apply(engine='vectorized')
+        distributed = EisenbergNoe(network).apply(engine='distributed', workers=2)
+        np.testing.assert_array_equal(distributed.final_equity, vectorized.final_equity)
+        self.assertEqual((distributed.payments != vectorized.payments).nnz, 0)
+
+    def test_zero_iterations(self):
+        equity, debtor, creditor, amount = Network(10, 20, seed=1).to_arrays()
+        payments, iterations, converged = PartitionedClearing(
+            len(equity), debtor, creditor, amount, 2).clearing_vector(equity, max_iterations=0)
+        np.testing.assert_array_equal(payments, total_liabilities(len(equity), debtor, amount))
+        self.assertEqual(iterations, 0)
+        self.assertFalse(converged)
+
+    def test_shared_arrays_round_trip(self):
+        with SharedArrays.create({'values': np.arange(5.0), 'empty': np.zeros(0)}) as shared:
+            attached = SharedArrays.attach(shared.specs())
+            attached['values'][0] = 42.0
+            self.assertEqual(shared['values'][0], 42.0)
+            self.assertEqual(attached['empty'].shape, (0,))
+            attached.close()
+
+
+# Shared-memory clearing pool
+class TestClearingPool(unittest.TestCase):
+    def test_scenarios_match_serial_clearing(self):
+        network = Network(15, 30, seed=8)
+        equity, debtor, creditor, amount = network.to_arrays()
+        scenarios = equity * np.random.default_rng(3).uniform(0.2, 1.0, (7, len(equity)))
+        with ClearingPool.from_network(network, scenarios, workers=2) as pool:
+            payments, iterations, converged = pool.clear(batch_size=3)
+            greatest, _, _ = pool.clear(engine='greatest', alpha=0.5, beta=0.8)
+            block_names = [block.name for block in pool.shared.blocks.values()]
+        self.assertEqual(payments.shape, (7, len(equity)))
+        self.assertTrue(converged.all())
+        for k, scenario in enumerate(scenarios):
+            expected, expected_iterations, _ = clearing_vector(scenario, debtor, creditor, amount)
+            np.testing.assert_array_equal(payments[k], expected)
+            self.assertEqual(iterations[k], expected_iterations)
+            expected, _, _ = greatest_clearing_vector(scenario, debtor, creditor, amount, 0.5, 0.8)
+            np.testing.assert_array_equal(greatest[k], expected)
+        # The shared memory is freed with the pool
+        with self.assertRaises(FileNotFoundError):
+            SharedArrays.attach({'debtor': (block_names[0], (0,), '<i8')})
+
+
+# Import-time cost of the clearing core
+class TestLazyImports(unittest.TestCase):
+    def test_core_modules_skip_heavy_dependencies(self):
+        for module in ('eisenbergnoe', 'simulation', 'dynamicclearing'):
+            cost = import_cost(module, repeat=1)
+            self.assertEqual(cost['loaded'], [], f"Importing {module} should not load {cost['loaded']}")
+
+    def test_numba_is_not_imported_with_the_kernels(self):
+        # A stand-in numba package makes the kernels think numba is installed
+        with tempfile.TemporaryDirectory() as directory:
+            os.makedirs(os.path.join(directory, 'numba'))
+            with open(os.path.join(directory, 'numba', '__init__.py'), 'w') as file:
+                file.write("def njit(**options):\n    return lambda function: function\n")
+            path = os.pathsep.join(filter(None, (directory, os.environ.get('PYTHONPATH'))))
+            with patch.dict(os.environ, {'PYTHONPATH': path}):
+                cost = import_cost('eisenbergnoe', repeat=1)
+        self.assertEqual(cost['loaded'], [])
+
+    def test_kernels_compile_on_first_call(self):
+        numba = Mock()
+        numba.njit.return_value = lambda function: function
+        with patch.object(kernels, 'NUMBA_AVAILABLE', True), patch.object(kernels, 'numba', numba):
+            double = kernels.jit(lambda value: 2 * value)
+            numba.njit.assert_not_called()
+            self.assertEqual(double(3), 6)
+            self.assertEqual(double(4), 8)
+        numba.njit.assert_called_once_with(cache=True)
+
+    def test_lazy_module_loads_on_first_use(self):
+        module = lazy_import('json')
+        self.assertIn('not loaded', repr(module))
+        self.assertEqual(module.dumps([1]), '[1]')
+        self.assertIn("'json' (loaded)", repr(module))
+
+    def test_lazy_graph_matches_eager_construction(self):
+        network = Network(10, 20, seed=5)
+        self.assertTrue(network._graph_stale)
+        expected = nx.DiGraph()
+        for node in network.nodes:
+            expected.add_node(node.id, equity=node.equity)
+            for creditor_id, debt_value in node.debts.items():
+                expected.add_edge(node.id, creditor_id, debt=debt_value)
+        self.assertEqual(set(network.graph.edges(data='debt')), set(expected.edges(data='debt')))
+        self.assertEqual(dict(network.graph.nodes(data='equity')), dict(expected.nodes(data='equity')))
+
+
+# Memory footprint report
+class TestMemoryProfile(unittest.TestCase):
+    def test_footprint_splits_structures(self):
+        network = Network(10, 20, seed=2)
+        sizes = footprint(network)
+        self.assertGreater(sizes['debts'], 0)
+        self.assertGreater(sizes['initial_debts'], 0)
+        self.assertEqual(sizes['graph'], 0, "The graph is not built until it is read.")
+        network.graph
+        built = footprint(network)
+        self.assertGreater(built['graph'], 0)
+        self.assertGreater(built['graph_edge_attributes'], 0)
+        self.assertEqual(built['debts'], sizes['debts'])
+
+    def test_shared_objects_count_once(self):
+        shared = list(range(100))
+        seen = set()
+        self.assertGreater(deep_size(shared, seen), 0)
+        wrapper = [shared]
+        self.assertEqual(deep_size(wrapper, seen), sys.getsizeof(wrapper))
+
+    def test_pipeline_stages(self):
+        stages, structures = profile_pipeline(5, 10, seed=1, build_graph=True)
+        names = ['generate', 'graph', 'compress', 'clear', 'reset']
+        self.assertEqual([stage['stage'] for stage in stages], names)
+        self.assertEqual(list(structures), names)
+        self.assertGreater(stages[0]['retained'], 0)
+        self.assertTrue(all(stage['peak'] >= max(stage['retained'], 0) for stage in stages))
+        self.assertIn('reset', format_report(stages, structures))
+
+
+# Payment records and replay
+class TestPaymentRecord(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(15, 30, seed=4)
+        self.network.reset()
+
+    def test_replay_reproduces_end_state(self):
+        for engine in ('loop', 'vectorized', 'greatest', 'exact'):
+            cleared = copy.deepcopy(self.network)
+            clearing = EisenbergNoe(cleared)
+            result = clearing.apply(engine=engine, record=True)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = os.path.join(tmp_dir, 'record.npz')
+                clearing.record.save(path)
+                record = PaymentRecord.load(path)
+            replayed = copy.deepcopy(self.network)
+            replay_result = EisenbergNoe(replayed).replay(record)
+            self.assertEqual([node.equity for node in replayed.nodes], [node.equity for node in cleared.nodes])
+            self.assertEqual([dict(node.debts) for node in replayed.nodes], [dict(node.debts) for node in cleared.nodes])
+            self.assertEqual(set(replayed.graph.edges()), set(cleared.graph.edges()))
+            self.assertEqual((replay_result.payments != result.payments).nnz, 0)
+            self.assertEqual((record.payment_matrix() != result.payments).nnz, 0)
+
+    def test_iteration_deltas_sum_to_payments(self):
+        for engine in ('loop', 'vectorized'):
+            clearing = EisenbergNoe(copy.deepcopy(self.network))
+            result = clearing.apply(engine=engine, record_iterations=True)
+            record = clearing.record
+            total = sum(record.iteration_matrix(t) for t in range(1, record.iterations + 1))
+            self.assertAlmostEqual(abs(total - result.payments).max(), 0.0, places=6)
+
+    def test_iteration_deltas_are_kept_sparse(self):
+        deltas = IterationDeltas(1000)
+        paid = np.zeros(1000)
+        for step in range(5):
+            paid = paid.copy()
+            paid[step] = 1.0 + step
+            deltas.add(paid)
+        indptr, indices, values = deltas.arrays()
+        self.assertEqual(indptr.tolist(), [0, 1, 2, 3, 4, 5])
+        self.assertEqual(indices.tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(sum(part.nbytes for part in deltas.values), 5 * 8)
+
+    def test_replay_rejects_other_state(self):
+        clearing = EisenbergNoe(copy.deepcopy(self.network))
+        clearing.apply(engine='vectorized', record=True)
+        other = Network(15, 30, seed=5)
+        with self.assertRaises(ValueError):
+            EisenbergNoe(other).replay(clearing.record)
+        with self.assertRaises(ValueError):
+            EisenbergNoe(copy.deepcopy(self.network)).apply(engine='exact', record_iterations=True)
+
+
+# Engine parity on random networks
+class TestEngineParity(unittest.TestCase):
+    def test_engines_agree_on_random_networks(self):
+        report = run_harness(cases=60, seed=0)
+        self.assertEqual(report['failures'], [])
+        self.assertEqual(report['timing']['vectorized']['ratio'], 1.0)
+        self.assertIn('compression_kernel', report['timing'])
+
+    def test_loop_engine_pays_round_cycles(self):
+        # Node 1 pays node 0, which pays it straight back: equities repeat while debts shrink
+        network = Network.from_arrays([0.0, 3.8], [0, 1], [1, 0], [18.22, 7.72])
+        for engine in ('loop', 'loop_kernel'):
+            failures, _ = check_clearing(network, engines=(engine,))
+            self.assertEqual(failures, [])
+            _, result, _ = run_engine(network, engine, 100)
+            self.assertEqual(result.defaulted.tolist(), [True, False])
+            self.assertAlmostEqual(result.final_equity[1], 3.8, places=6)
+
+    def test_unconverged_loop_keeps_received_equity(self):
+        # Node 1 receives 40 in the first sweep, after its own (zero) payment
+        network = Network.from_arrays([100.0, 0.0, 0.0], [0, 1], [1, 2], [40.0, 60.0])
+        for engine in ('loop', 'loop_kernel'):
+            _, result, _ = run_engine(network, engine, 1)
+            self.assertIsNone(result)
+            copied = copy.deepcopy(network)
+            with patch.object(kernels, 'USE_KERNELS', engine == 'loop_kernel'):
+                result = EisenbergNoe(copied).apply(engine='loop', max_iterations=1)
+            self.assertFalse(result.converged)
+            self.assertAlmostEqual(result.final_equity.sum(), 100.0, places=6)
+
+    def test_harness_checks_convergence(self):
+        network = Network(20, 40, seed=5)
+        failures, _ = check_clearing(network, max_iterations=1)
+        self.assertEqual(failures, ['vectorized: did not converge'])
+        failures, _ = check_clearing(network, engines=('distributed',))
+        self.assertEqual(failures, [])
+        self.assertIn('distributed', ENGINES)
+
+    def test_generated_cases_are_reproducible(self):
+        first, description = case_network(3, 7)
+        second, _ = case_network(3, 7)
+        for a, b in zip(first.to_arrays(), second.to_arrays()):
+            np.testing.assert_array_equal(a, b)
+        self.assertIn(description['topology'], TOPOLOGIES)
+
+
+# Batched default cascades
+class TestCascade(unittest.TestCase):
+    def setUp(self):
+        self.state = Network(20, 40, seed=3).to_arrays()
+        self.cascade = Cascade(*self.state)
+
+    def test_unshocked_cascade_reaches_clearing_vector(self):
+        result = self.cascade.run(max_rounds=1000)
+        expected, _, _ = clearing_vector(*self.state, max_iterations=1000)
+        np.testing.assert_allclose(result['payments'][0], expected, atol=1e-6)
+        defaulted = expected < self.cascade.liabilities - 1e-6
+        self.assertEqual((result['default_round'][0] >= 0).tolist(), defaulted.tolist())
+        self.assertAlmostEqual(result['losses'][0].sum(), self.cascade.liabilities.sum() - expected.sum(), places=5)
+
+    def test_single_node_failures_match_separate_runs(self):
+        equity, debtor, creditor, amount = self.state
+        result = self.cascade.single_node_failures(batch_size=7, keep_payments=True)
+        self.assertTrue(result['converged'].all())
+        summary = self.cascade.single_node_failures(batch_size=7)
+        self.assertNotIn('payments', summary)
+        np.testing.assert_array_equal(summary['default_round'], result['default_round'])
+        for node in range(self.cascade.size):
+            # A failed node pays nothing, as if its debts were never paid
+            expected, _, _ = clearing_vector(equity, debtor, creditor, amount * (debtor != node), max_iterations=1000)
+            others = np.arange(self.cascade.size) != node
+            np.testing.assert_allclose(result['payments'][node][others], expected[others], atol=1e-6)
+            self.assertEqual(result['default_round'][node][node], 0 if self.cascade.liabilities[node] > 0 else -1)
+        self.assertEqual(result['cascade_size'].tolist(), (result['default_round'] >= 0).sum(axis=1).tolist())
+
+    def test_equity_shocks_deepen_the_cascade(self):
+        shocks = np.outer([0.0, 0.5, 1.0], self.state[0])
+        result = self.cascade.run(shocks=shocks, max_rounds=1000)
+        sizes = result['cascade_size'].tolist()
+        self.assertEqual(sizes, sorted(sizes))
+        with self.assertRaises(ValueError):
+            self.cascade.run(shocks=np.zeros((2, 3)))
+
+
+# Fire sales of a common illiquid asset
+class TestFireSale(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(20, 40, seed=3)
+        self.state = self.network.to_arrays()
+
+    def test_liquid_asset_gives_clearing_vector(self):
+        result = FireSale.from_network(self.network, illiquid_share=0.5, price=2.0, impact=0.0).clear()
+        expected, _, _ = clearing_vector(*self.state, max_iterations=1000)
+        np.testing.assert_allclose(result['payments'], expected, atol=1e-6)
+        self.assertEqual(result['price'], 2.0)
+
+    def test_sales_lower_price_and_payments(self):
+        liquid = FireSale.from_network(self.network).clear()
+        fire_sale = FireSale.from_network(self.network, impact=1e-4)
+        result = fire_sale.clear()
+        self.assertTrue(result['converged'])
+        self.assertLess(result['price'], 1.0)
+        self.assertTrue((result['payments'] <= liquid['payments'] + 1e-9).all())
+        self.assertGreaterEqual(result['defaulted'].sum(), liquid['defaulted'].sum())
+        self.assertTrue((result['sold'] <= fire_sale.holdings).all())
+        # A joint fixed point: one more sweep changes neither payments nor price
+        payments, price, _, _ = fire_sale.sweep(result['payments'], result['price'])
+        np.testing.assert_allclose(payments, result['payments'], atol=1e-8)
+        self.assertAlmostEqual(price, result['price'], places=8)
+        self.assertAlmostEqual(price, fire_sale.market_price(result['sold'].sum()), places=12)
+
+    def test_zero_iterations(self):
+        result = FireSale.from_network(self.network, impact=1e-4).clear(max_iterations=0)
+        self.assertEqual(result['iterations'], 0)
+        self.assertFalse(result['converged'])
+        self.assertEqual(result['price'], 1.0)
+
+
+# Exporting networks to graph tools
+class TestNetworkExport(unittest.TestCase):
+    def setUp(self):
+        # Node 0 settles its debt to 1 in full, node 2 defaults on its debt to 0
+        self.network = Network.from_arrays([100.0, 0.0, 10.0], [0, 1, 2], [1, 2, 0], [50.0, 30.0, 40.0])
+        self.result = EisenbergNoe(self.network).apply(engine='vectorized')
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_network_tables_keep_settled_edges(self):
+        nodes, edges = network_tables(self.network, self.result)
+        np.testing.assert_array_equal(nodes['defaulted'], [node.defaulted for node in self.network.nodes])
+        paid = self.result.payments.toarray()
+        for source, target, debt, amount_paid in zip(edges['source'], edges['target'], edges['debt'], edges['paid']):
+            self.assertAlmostEqual(amount_paid, paid[source, target])
+            self.assertAlmostEqual(debt, self.network.nodes[source].debts.get(target, 0.0))
+        self.assertAlmostEqual(edges['paid'].sum(), paid.sum())
+        self.assertEqual(len(edges['source']), 3)
+
+    def test_graphml_and_gexf_match_network(self):
+        nodes, edges = network_tables(self.network, self.result)
+        for extension, reader in (('graphml', nx.read_graphml), ('gexf', nx.read_gexf)):
+            path = os.path.join(self.directory.name, f"network.{extension}")
+            self.assertEqual(export_network(self.network, path, self.result, chunk_size=2), [path])
+            graph = reader(path, node_type=int)
+            self.assertEqual(graph.number_of_nodes(), 3)
+            self.assertEqual(graph.number_of_edges(), len(edges['source']))
+            for node in self.network.nodes:
+                self.assertAlmostEqual(graph.nodes[node.id]['equity'], node.equity)
+                self.assertEqual(graph.nodes[node.id]['defaulted'], node.defaulted)
+            for source, target, debt, paid in zip(edges['source'], edges['target'], edges['debt'], edges['paid']):
+                self.assertEqual(graph.edges[source, target]['debt'], debt)
+                self.assertEqual(graph.edges[source, target]['paid'], paid)
+        graphml = nx.read_graphml(os.path.join(self.directory.name, "network.graphml"), node_type=int)
+        self.assertEqual([graphml.nodes[node.id]['colour'] for node in self.network.nodes],
+                         [node.colour for node in self.network.nodes])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            export_network(self.network, os.path.join(self.directory.name, "network.csv"))
+
+    def test_arrow(self):
+        try:
+            import pyarrow
+        except ImportError:
+            with self.assertRaises(ImportError):
+                export_network(self.network, os.path.join(self.directory.name, "network.arrow"), self.result)
+            self.skipTest("pyarrow is not installed")
+        nodes, edges = network_tables(self.network, self.result)
+        paths = export_network(self.network, os.path.join(self.directory.name, "network.arrow"), self.result,
+                               chunk_size=2)
+        node_table = pyarrow.ipc.open_file(paths[0]).read_all()
+        edge_table = pyarrow.ipc.open_file(paths[1]).read_all()
+        np.testing.assert_array_equal(node_table.column('defaulted').to_numpy(), nodes['defaulted'])
+        self.assertEqual(node_table.column('colour').to_pylist(), [node.colour for node in self.network.nodes])
+        np.testing.assert_array_equal(edge_table.column('paid').to_numpy(), edges['paid'])
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)